@@ -3,6 +3,7 @@ import uuid
 import logging
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.models.database import SupplementaryDocument, EquipmentAlias, EquipmentProfile, Equipment
@@ -201,7 +202,7 @@ async def reprocess_supplementary(
 def get_equipment_by_tag(tag: str, db: Session) -> Equipment:
     """Get equipment by tag with case-insensitive lookup"""
     equipment = db.query(Equipment).filter(
-        Equipment.tag.ilike(tag)
+        func.upper(Equipment.tag) == tag.upper()
     ).first()
     if not equipment:
         raise HTTPException(status_code=404, detail=f"Equipment '{tag}' not found")
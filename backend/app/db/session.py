@@ -1,5 +1,6 @@
+import json
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from app.models.database import Base
 
@@ -8,13 +9,35 @@ DATABASE_URL = os.environ.get("DATABASE_URL")
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# Sized for parallel search fan-out (multi-agent map phase plus per-tag
+# worker sessions inside the agents)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+
 engine = create_engine(
     DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     pool_pre_ping=True,
+    # JSONB columns take the extracted dicts as-is; cell values that are not
+    # JSON-native (dates, decimals) are stored as strings
+    json_serializer=lambda obj: json.dumps(obj, default=str),
 )
 
+# Candidate list size for HNSW index scans (pgvector default 40). Search
+# filters by project after the index scan, so a wider list keeps recall up.
+HNSW_EF_SEARCH = int(os.environ.get("HNSW_EF_SEARCH", "100"))
+
+
+@event.listens_for(engine, "connect")
+def _set_hnsw_ef_search(dbapi_connection, connection_record):
+    """Apply hnsw.ef_search once per pooled connection."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"SET hnsw.ef_search = {HNSW_EF_SEARCH}")
+    cursor.close()
+    dbapi_connection.commit()  # A rolled-back SET would be undone
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -28,8 +51,9 @@ def get_db():
 
 
 def init_db():
-    """Initialize database tables, ensuring pgvector extension exists"""
+    """Initialize database tables, ensuring the pgvector and pg_trgm extensions exist"""
     with engine.connect() as conn:
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))  # Trigram indexes on text columns
         conn.commit()
     Base.metadata.create_all(bind=engine)
@@ -1,5 +1,7 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Index, UniqueConstraint
+from typing import Optional
+from sqlalchemy import event, BigInteger, DDL, Column, Computed, Integer, String, Text, DateTime, ForeignKey, Float, Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.orm import relationship, declarative_base
 from pgvector.sqlalchemy import Vector
 
@@ -89,6 +91,20 @@ class Document(Base):
     equipment = relationship("Equipment", back_populates="document")
     project = relationship("Project", back_populates="documents")
 
+    __table_args__ = (
+        Index('idx_documents_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+        Index('idx_documents_drawing_number_trgm', 'drawing_number', postgresql_using='gin',
+              postgresql_ops={'drawing_number': 'gin_trgm_ops'}),
+    )
+
+
+# All searchable page text as one string, newline-separated so a match never
+# spans two columns. Indexed by idx_pages_search_text_trgm; queries must use
+# this exact expression for the planner to pick the index.
+PAGE_SEARCH_TEXT_SQL = (
+    "coalesce(ocr_text, '') || E'\\n' || coalesce(ai_analysis, '') || E'\\n' || coalesce(ai_equipment_list, '')"
+)
+
 
 class Page(Base):
     """Represents a single page from a drawing"""
@@ -110,6 +126,17 @@ class Page(Base):
 
     __table_args__ = (
         Index('idx_page_document_number', 'document_id', 'page_number'),
+        Index('idx_pages_search_text_trgm', text(f"({PAGE_SEARCH_TEXT_SQL}) gin_trgm_ops"), postgresql_using='gin'),
+        # ANN index over a halfvec expression; KNN queries must ORDER BY
+        # embedding::halfvec(384) <=> ... and filter embedding IS NOT NULL
+        Index('idx_pages_embedding_halfvec_nn', text('(embedding::halfvec(384)) halfvec_cosine_ops'),
+              postgresql_using='hnsw', postgresql_with={'m': 16, 'ef_construction': 64},
+              postgresql_where=text('embedding IS NOT NULL')),
+        Index('idx_pages_ocr_trgm', 'ocr_text', postgresql_using='gin', postgresql_ops={'ocr_text': 'gin_trgm_ops'}),
+        Index('idx_pages_ai_analysis_trgm', 'ai_analysis', postgresql_using='gin',
+              postgresql_ops={'ai_analysis': 'gin_trgm_ops'}),
+        Index('idx_pages_ai_equipment_list_trgm', 'ai_equipment_list', postgresql_using='gin',
+              postgresql_ops={'ai_equipment_list': 'gin_trgm_ops'}),
     )
 
 
@@ -148,6 +175,8 @@ class Equipment(Base):
 
     __table_args__ = (
         Index('idx_equipment_project_tag', 'project_id', 'tag', unique=True),
+        Index('idx_equipment_upper_tag_project', text('upper(tag)'), 'project_id'),
+        Index('idx_equipment_tag_trgm', 'tag', postgresql_using='gin', postgresql_ops={'tag': 'gin_trgm_ops'}),
     )
 
 
@@ -233,6 +262,8 @@ class DetailedConnection(Base):
         Index('idx_detailed_conn_doc_page', 'document_id', 'page_number'),
         Index('idx_detailed_conn_source', 'source_tag'),
         Index('idx_detailed_conn_target', 'target_tag'),
+        Index('idx_detailed_conn_upper_source', text('upper(source_tag)')),
+        Index('idx_detailed_conn_upper_target', text('upper(target_tag)')),
         Index('idx_detailed_conn_category', 'category'),
     )
 
@@ -300,10 +331,20 @@ class SupplementaryChunk(Base):
     source_location = Column(String(200))  # "Sheet1:A1-F20" or "Section 3.2"
     equipment_tags = Column(Text)  # JSON array
     embedding = Column(Vector(384))
+    content_tsv = Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True))
 
     # Relationships
     document = relationship("SupplementaryDocument", back_populates="chunks")
 
+    __table_args__ = (
+        Index('idx_supplementary_chunks_content_tsv', 'content_tsv', postgresql_using='gin'),
+        Index('idx_supplementary_chunks_embedding_halfvec_nn', text('(embedding::halfvec(384)) halfvec_cosine_ops'),
+              postgresql_using='hnsw', postgresql_with={'m': 16, 'ef_construction': 64},
+              postgresql_where=text('embedding IS NOT NULL')),
+        Index('idx_supplementary_chunks_embedding_bit', text('(binary_quantize(embedding)::bit(384)) bit_hamming_ops'),
+              postgresql_using='hnsw', postgresql_with={'m': 16, 'ef_construction': 64}),
+    )
+
 
 class EquipmentData(Base):
     """Structured equipment data extracted from supplementary documents"""
@@ -315,7 +356,8 @@ class EquipmentData(Base):
     equipment_id = Column(Integer, ForeignKey("equipment.id", ondelete="SET NULL"))
     match_confidence = Column(Float)
     data_type = Column(String(50), nullable=False)  # IO_POINT, SPECIFICATION, etc.
-    data_json = Column(Text, nullable=False)
+    data_json = Column(JSONB, nullable=False)  # Returned as a dict, no per-row parsing
+    snippet_preview = Column(Text)  # First 5 key=value pairs of data_json, for search snippets
     source_location = Column(String(200))
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -323,6 +365,23 @@ class EquipmentData(Base):
     document = relationship("SupplementaryDocument", back_populates="equipment_data")
     equipment = relationship("Equipment", back_populates="equipment_data_entries")
 
+    __table_args__ = (
+        Index('idx_equipment_data_type_tag', 'data_type', 'equipment_tag'),
+    )
+
+
+def build_snippet_preview(data_json: dict) -> Optional[str]:
+    """Render the first 5 key=value pairs of an equipment data JSON object"""
+    try:
+        return ", ".join(f"{k}={v}" for k, v in list(data_json.items())[:5])
+    except AttributeError:
+        return None
+
+
+@event.listens_for(EquipmentData, "before_insert")
+def _set_snippet_preview(mapper, connection, target):
+    target.snippet_preview = build_snippet_preview(target.data_json)
+
 
 class EquipmentAlias(Base):
     """Alternative names/tags for equipment to improve matching"""
@@ -338,7 +397,10 @@ class EquipmentAlias(Base):
     # Relationships
     equipment = relationship("Equipment", back_populates="aliases")
 
-    __table_args__ = (UniqueConstraint('equipment_id', 'alias', name='uq_equipment_alias'),)
+    __table_args__ = (
+        UniqueConstraint('equipment_id', 'alias', name='uq_equipment_alias'),
+        Index('idx_equipment_alias_upper_alias', text('upper(alias)'), 'equipment_id'),
+    )
 
 
 class EquipmentProfile(Base):
@@ -352,3 +414,186 @@ class EquipmentProfile(Base):
 
     # Relationships
     equipment = relationship("Equipment", back_populates="profile")
+
+
+class ProjectCacheVersion(Base):
+    """Per-project counter bumped by database triggers on every write that can change search results"""
+    __tablename__ = "project_cache_version"
+
+    project_id = Column(Integer, primary_key=True)  # No FK: triggers still fire during cascading project deletes
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+# Trigger DDL from scripts/migrations/012_project_cache_version.sql. Without
+# the triggers the version never moves and version-keyed caches (alias
+# automata, responses) never invalidate, so init_db installs them too. It is
+# idempotent, and metadata after_create fires on every create_all, so
+# databases created before this DDL existed get their triggers at startup.
+PROJECT_CACHE_VERSION_TRIGGERS_SQL = """
+-- Bumps each listed project once. Rows without a project (NULL project_id)
+-- bump project 0, so the all-projects sum used for project-less cache keys
+-- still moves. Sorted, so concurrent statements lock rows in the same order.
+CREATE OR REPLACE FUNCTION bump_project_cache_versions(p_project_ids INTEGER[]) RETURNS void AS $$
+BEGIN
+    INSERT INTO project_cache_version (project_id, version)
+    SELECT DISTINCT COALESCE(pid, 0), 1 FROM unnest(p_project_ids) AS pid
+    ORDER BY 1
+    ON CONFLICT (project_id) DO UPDATE SET version = project_cache_version.version + 1;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The triggers are per statement: a bulk insert of thousands of locations
+-- bumps its project once, not once per row. Each trigger function reads the
+-- statement's transition tables (new_rows / old_rows) for the projects hit.
+
+-- Tables that carry project_id directly (equipment, documents, supplementary_documents)
+CREATE OR REPLACE FUNCTION project_cache_version_direct() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_project_cache_versions(ARRAY(SELECT DISTINCT project_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM bump_project_cache_versions(ARRAY(SELECT DISTINCT project_id FROM old_rows));
+    ELSE
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT project_id FROM new_rows UNION SELECT project_id FROM old_rows
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tables that reach the project through equipment_id (equipment_aliases, equipment_locations)
+CREATE OR REPLACE FUNCTION project_cache_version_via_equipment() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT DISTINCT e.project_id FROM new_rows r JOIN equipment e ON e.id = r.equipment_id
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT DISTINCT e.project_id FROM old_rows r JOIN equipment e ON e.id = r.equipment_id
+        ));
+    ELSE
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT e.project_id FROM new_rows r JOIN equipment e ON e.id = r.equipment_id
+            UNION
+            SELECT e.project_id FROM old_rows r JOIN equipment e ON e.id = r.equipment_id
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- equipment_data reaches the project through its supplementary document
+CREATE OR REPLACE FUNCTION project_cache_version_via_supplementary_document() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT DISTINCT sd.project_id FROM new_rows r JOIN supplementary_documents sd ON sd.id = r.document_id
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT DISTINCT sd.project_id FROM old_rows r JOIN supplementary_documents sd ON sd.id = r.document_id
+        ));
+    ELSE
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT sd.project_id FROM new_rows r JOIN supplementary_documents sd ON sd.id = r.document_id
+            UNION
+            SELECT sd.project_id FROM old_rows r JOIN supplementary_documents sd ON sd.id = r.document_id
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow only one event per trigger, hence three per table.
+-- The DROPs also remove the earlier per-row triggers (trg_<table>_cache_version).
+
+DROP TRIGGER IF EXISTS trg_equipment_cache_version ON equipment;
+DROP TRIGGER IF EXISTS trg_equipment_cache_version_ins ON equipment;
+CREATE TRIGGER trg_equipment_cache_version_ins
+    AFTER INSERT ON equipment REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_equipment_cache_version_upd ON equipment;
+CREATE TRIGGER trg_equipment_cache_version_upd
+    AFTER UPDATE ON equipment REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_equipment_cache_version_del ON equipment;
+CREATE TRIGGER trg_equipment_cache_version_del
+    AFTER DELETE ON equipment REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+
+DROP TRIGGER IF EXISTS trg_documents_cache_version ON documents;
+DROP TRIGGER IF EXISTS trg_documents_cache_version_ins ON documents;
+CREATE TRIGGER trg_documents_cache_version_ins
+    AFTER INSERT ON documents REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_documents_cache_version_upd ON documents;
+CREATE TRIGGER trg_documents_cache_version_upd
+    AFTER UPDATE ON documents REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_documents_cache_version_del ON documents;
+CREATE TRIGGER trg_documents_cache_version_del
+    AFTER DELETE ON documents REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+
+DROP TRIGGER IF EXISTS trg_supplementary_documents_cache_version ON supplementary_documents;
+DROP TRIGGER IF EXISTS trg_supplementary_documents_cache_version_ins ON supplementary_documents;
+CREATE TRIGGER trg_supplementary_documents_cache_version_ins
+    AFTER INSERT ON supplementary_documents REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_supplementary_documents_cache_version_upd ON supplementary_documents;
+CREATE TRIGGER trg_supplementary_documents_cache_version_upd
+    AFTER UPDATE ON supplementary_documents REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_supplementary_documents_cache_version_del ON supplementary_documents;
+CREATE TRIGGER trg_supplementary_documents_cache_version_del
+    AFTER DELETE ON supplementary_documents REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+
+DROP TRIGGER IF EXISTS trg_equipment_aliases_cache_version ON equipment_aliases;
+DROP TRIGGER IF EXISTS trg_equipment_aliases_cache_version_ins ON equipment_aliases;
+CREATE TRIGGER trg_equipment_aliases_cache_version_ins
+    AFTER INSERT ON equipment_aliases REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+DROP TRIGGER IF EXISTS trg_equipment_aliases_cache_version_upd ON equipment_aliases;
+CREATE TRIGGER trg_equipment_aliases_cache_version_upd
+    AFTER UPDATE ON equipment_aliases REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+DROP TRIGGER IF EXISTS trg_equipment_aliases_cache_version_del ON equipment_aliases;
+CREATE TRIGGER trg_equipment_aliases_cache_version_del
+    AFTER DELETE ON equipment_aliases REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+
+DROP TRIGGER IF EXISTS trg_equipment_locations_cache_version ON equipment_locations;
+DROP TRIGGER IF EXISTS trg_equipment_locations_cache_version_ins ON equipment_locations;
+CREATE TRIGGER trg_equipment_locations_cache_version_ins
+    AFTER INSERT ON equipment_locations REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+DROP TRIGGER IF EXISTS trg_equipment_locations_cache_version_upd ON equipment_locations;
+CREATE TRIGGER trg_equipment_locations_cache_version_upd
+    AFTER UPDATE ON equipment_locations REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+DROP TRIGGER IF EXISTS trg_equipment_locations_cache_version_del ON equipment_locations;
+CREATE TRIGGER trg_equipment_locations_cache_version_del
+    AFTER DELETE ON equipment_locations REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+
+DROP TRIGGER IF EXISTS trg_equipment_data_cache_version ON equipment_data;
+DROP TRIGGER IF EXISTS trg_equipment_data_cache_version_ins ON equipment_data;
+CREATE TRIGGER trg_equipment_data_cache_version_ins
+    AFTER INSERT ON equipment_data REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_supplementary_document();
+DROP TRIGGER IF EXISTS trg_equipment_data_cache_version_upd ON equipment_data;
+CREATE TRIGGER trg_equipment_data_cache_version_upd
+    AFTER UPDATE ON equipment_data REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_supplementary_document();
+DROP TRIGGER IF EXISTS trg_equipment_data_cache_version_del ON equipment_data;
+CREATE TRIGGER trg_equipment_data_cache_version_del
+    AFTER DELETE ON equipment_data REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_supplementary_document();
+
+DROP FUNCTION IF EXISTS bump_project_cache_version(INTEGER);
+"""
+
+event.listen(Base.metadata, "after_create", DDL(PROJECT_CACHE_VERSION_TRIGGERS_SQL))
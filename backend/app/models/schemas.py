@@ -90,7 +90,7 @@ class EquipmentDataResponse(BaseModel):
     equipment_id: Optional[int] = None
     match_confidence: Optional[float] = None
     data_type: str
-    data_json: str
+    data_json: dict
     source_location: Optional[str] = None
     created_at: datetime
 
@@ -252,6 +252,52 @@ class DocumentResponse(DocumentBase):
     class Config:
         from_attributes = True
 
+    @classmethod
+    def from_document(cls, doc) -> "DocumentResponse":
+        """Build from a trusted Document ORM object, skipping validation"""
+        return cls._construct(doc, doc.id)
+
+    @classmethod
+    def from_row(cls, row) -> "DocumentResponse":
+        """Build from a trusted SQL row carrying the document columns plus document_id"""
+        return cls._construct(row, row.document_id)
+
+    @classmethod
+    def from_supplementary(cls, doc_id: int, filename: str, original_filename: str, upload_date: datetime,
+                           processed: int, file_size: Optional[int] = None) -> "DocumentResponse":
+        """Pseudo-document for a supplementary (Excel/Word) file, skipping validation"""
+        return cls.model_construct(
+            id=doc_id,
+            filename=filename,
+            original_filename=original_filename,
+            title=original_filename,  # Use filename as title
+            drawing_number=None,
+            revision=None,
+            system=None,
+            area=None,
+            file_size=file_size,
+            page_count=1,
+            upload_date=upload_date,
+            processed=processed
+        )
+
+    @classmethod
+    def _construct(cls, source, doc_id: int) -> "DocumentResponse":
+        return cls.model_construct(
+            id=doc_id,
+            filename=source.filename,
+            original_filename=source.original_filename,
+            title=source.title,
+            drawing_number=source.drawing_number,
+            revision=source.revision,
+            system=source.system,
+            area=source.area,
+            file_size=source.file_size,
+            page_count=source.page_count,
+            upload_date=source.upload_date,
+            processed=source.processed
+        )
+
 
 class PageSummary(BaseModel):
     id: int
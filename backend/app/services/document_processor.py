@@ -10,6 +10,7 @@ from app.services.extraction_service import extraction_service, ExtractedEquipme
 from app.services.embedding_service import embedding_service
 from app.services.ai_analysis_service import ai_analysis_service
 from app.services.vision_extraction_service import vision_extraction_service
+from app.services.search_service import search_service
 from PIL import Image
 
 logger = logging.getLogger(__name__)
@@ -310,6 +311,9 @@ class DocumentProcessor:
             document.processed = 2
             db.commit()
 
+            # New pages/equipment can change search results; drop cached responses
+            search_service.clear_response_cache()
+
             logger.info(f"[PIPELINE] Step 4 completed in {time.time() - step4_start:.1f}s")
 
             total_time = time.time() - pipeline_start
@@ -1,17 +1,30 @@
 import logging
-from typing import List
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
 from sentence_transformers import SentenceTransformer
 
 logger = logging.getLogger(__name__)
 
+# Memoized query embeddings per process (see generate_query_embedding)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+
 
 class EmbeddingService:
     """Generate embeddings for semantic search"""
 
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
         logger.info(f"Loading embedding model: {model_name}...")
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
         self.embedding_dim = 384
+        # Per instance, so entries are keyed by model as well as text
+        self._query_cache: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        # Uncased tokenizers (MiniLM's included) lowercase input themselves, so
+        # case variants of a query embed identically and can share a cache entry
+        self._lowercase_queries = bool(getattr(self.model.tokenizer, "do_lower_case", False))
         logger.info(f"Embedding model loaded successfully")
 
     def generate_embedding(self, text: str) -> List[float]:
@@ -22,6 +35,51 @@ class EmbeddingService:
         embedding = self.model.encode(text, convert_to_numpy=True)
         return embedding.tolist()
 
+    def generate_query_embedding(self, text: str) -> Tuple[float, ...]:
+        """Generate a memoized embedding for a search query.
+
+        Returns a tuple so cached values stay immutable; repeated queries skip
+        the model entirely. The cache key is normalized only in ways the
+        tokenizer ignores (whitespace runs, and case for uncased models), so
+        near-duplicate queries hit without changing the embedding.
+        """
+        return self.generate_query_embeddings([text])[0]
+
+    def generate_query_embeddings(self, texts: List[str]) -> List[Tuple[float, ...]]:
+        """Memoized embeddings for several queries, in input order.
+
+        Same cache as generate_query_embedding; all misses are encoded in a
+        single model call.
+        """
+        keys = [self._query_key(text) for text in texts]
+        found = {}
+        with self._query_cache_lock:
+            for key in keys:
+                if key in self._query_cache:
+                    self._query_cache.move_to_end(key)
+                    found[key] = self._query_cache[key]
+
+        misses = [key for key in dict.fromkeys(keys) if key not in found]
+        if misses:
+            # Blank queries embed as zeros without touching the model
+            to_encode = [key for key in misses if key]
+            encoded = self.generate_embeddings_batch(to_encode) if to_encode else []
+            computed = dict(zip(to_encode, map(tuple, encoded)))
+            computed.update((key, (0.0,) * self.embedding_dim) for key in misses if not key)
+            with self._query_cache_lock:
+                for key, embedding in computed.items():
+                    self._query_cache[key] = embedding
+                    self._query_cache.move_to_end(key)
+                while len(self._query_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def _query_key(self, text: str) -> str:
+        key = " ".join(text.split())
+        return key.lower() if self._lowercase_queries else key
+
     def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for multiple texts"""
         valid_texts = [t if t and t.strip() else " " for t in texts]
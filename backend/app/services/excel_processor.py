@@ -216,7 +216,7 @@ class ExcelProcessor:
             structured_data.append({
                 'equipment_tag': equipment_tag,
                 'data_type': data_type,
-                'data_json': json.dumps(row_data, default=str),
+                'data_json': row_data,
                 'source_location': f"{sheet_name}:Row {idx + 2}"  # +2 for 1-indexed + header
             })
 
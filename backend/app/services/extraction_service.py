@@ -10,6 +10,13 @@ from app.utils.tag_patterns import (
 
 logger = logging.getLogger(__name__)
 
+# Tag and wire patterns are compiled once. Each pattern is still scanned on
+# its own: they overlap (RTU-D01 also yields RTU), so one alternation would
+# drop tags, and the first pattern to find a tag decides its type
+_EQUIPMENT_REGEXES = [(re.compile(pattern, re.IGNORECASE), equip_type) for pattern, equip_type in EQUIPMENT_PATTERNS]
+_WIRE_REGEXES = [re.compile(pattern, re.IGNORECASE) for pattern in WIRE_PATTERNS]
+_GENERIC_TAG_RE = re.compile(r'\b([A-Z][A-Z0-9]*(?:[-_\s][A-Z0-9]+)*)\b')
+
 # Additional relationship keywords for AI parsing
 RELATIONSHIP_PATTERNS = {
     "CONTROLS": ["controls", "operates", "starts", "stops", "runs", "enables", "activates"],
@@ -39,8 +46,8 @@ class ExtractionService:
         """Extract all equipment tags from text"""
         found_equipment: Dict[str, ExtractedEquipment] = {}
 
-        for pattern, equip_type in EQUIPMENT_PATTERNS:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
+        for regex, equip_type in _EQUIPMENT_REGEXES:
+            matches = regex.finditer(text)
 
             for match in matches:
                 tag = match.group(0).upper()
@@ -69,8 +76,8 @@ class ExtractionService:
         """Extract wire numbers from text"""
         wires = set()
 
-        for pattern in WIRE_PATTERNS:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        for regex in _WIRE_REGEXES:
+            matches = regex.findall(text)
             wires.update([w.upper() for w in matches])
 
         return list(wires)
@@ -175,8 +182,7 @@ class ExtractionService:
 
             if len(found_tags) < 2:
                 # Fallback: try generic pattern for tags not in our list
-                generic_pattern = r'\b([A-Z][A-Z0-9]*(?:[-_\s][A-Z0-9]+)*)\b'
-                generic_matches = re.findall(generic_pattern, rel_upper)
+                generic_matches = _GENERIC_TAG_RE.findall(rel_upper)
                 # Filter out common words
                 common_words = {'THE', 'AND', 'FOR', 'FROM', 'WITH', 'BY', 'TO', 'IS', 'ARE', 'OF', 'IN', 'ON', 'AT'}
                 generic_matches = [m for m in generic_matches if m not in common_words and len(m) >= 2]
@@ -9,12 +9,13 @@ import json
 import logging
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
+from sqlalchemy import bindparam, func, text
+from pgvector.sqlalchemy import Vector
 
 from app.models.database import (
     EquipmentData, SupplementaryDocument, SupplementaryChunk, DetailedConnection
 )
-from app.services.search_agents.base import SearchAgent, AgentSearchResult
+from app.services.search_agents.base import SearchAgent, AgentSearchResult, enable_hnsw_iterative_scan
 from app.services.embedding_service import embedding_service
 
 logger = logging.getLogger(__name__)
@@ -109,7 +110,7 @@ class AlarmInterlockAgent(SearchAgent):
 
         for entry in query.limit(10).all():
             try:
-                data = json.loads(entry.data_json)
+                data = entry.data_json
                 content_parts = [f"Alarm for {entry.equipment_tag}:"]
 
                 # Common alarm fields
@@ -148,7 +149,7 @@ class AlarmInterlockAgent(SearchAgent):
                     relevance_score=entry.match_confidence or 0.9,
                     metadata={"data_type": "ALARM"}
                 ))
-            except (json.JSONDecodeError, TypeError) as e:
+            except TypeError as e:
                 logger.debug(f"Failed to parse alarm data: {e}")
                 continue
 
@@ -218,12 +219,19 @@ class AlarmInterlockAgent(SearchAgent):
         query: str,
         project_id: Optional[int] = None
     ) -> List[AgentSearchResult]:
-        """Semantic search for alarm and safety content in supplementary docs"""
+        """Semantic search for alarm and safety content in supplementary docs
+
+        Orders by the halfvec expression so idx_supplementary_chunks_embedding_halfvec_nn
+        serves the KNN; similarity is still scored on the full-precision column.
+        """
         results = []
 
         # Enhance query with safety-related terms
         enhanced_query = f"{query} alarm interlock trip safety shutdown permissive"
-        query_embedding = embedding_service.generate_embedding(enhanced_query)
+        query_embedding = list(embedding_service.generate_query_embedding(enhanced_query))
+
+        # The ILIKE and project filters apply after the HNSW index scan
+        enable_hnsw_iterative_scan(db)
 
         sql = text("""
             SELECT
@@ -231,9 +239,9 @@ class AlarmInterlockAgent(SearchAgent):
                 sc.document_id,
                 sc.content,
                 sc.source_location,
-                sc.equipment_tags,
+                sc.equipment_tags::jsonb ->> 0 AS equipment_tag,
                 sd.original_filename,
-                1 - (sc.embedding <=> CAST(:embedding AS vector)) as similarity
+                1 - (sc.embedding <=> :embedding) as similarity
             FROM supplementary_chunks sc
             JOIN supplementary_documents sd ON sc.document_id = sd.id
             WHERE sc.embedding IS NOT NULL
@@ -246,30 +254,22 @@ class AlarmInterlockAgent(SearchAgent):
                 OR sc.content ILIKE '%permissive%'
             )
             AND (:project_id IS NULL OR sd.project_id = :project_id)
-            ORDER BY sc.embedding <=> CAST(:embedding AS vector)
+            ORDER BY sc.embedding::halfvec(384) <=> CAST(:embedding AS halfvec(384))
             LIMIT 5
-        """)
+        """).bindparams(bindparam("embedding", type_=Vector(384)))
 
-        params = {"embedding": str(query_embedding), "project_id": project_id}
+        # Bound through pgvector's Vector type, so no str() of the list
+        params = {"embedding": query_embedding, "project_id": project_id}
 
         result = db.execute(sql, params)
 
         for row in result:
-            equipment_tag = None
-            if row.equipment_tags:
-                try:
-                    tags = json.loads(row.equipment_tags)
-                    if tags:
-                        equipment_tag = tags[0]
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
             results.append(AgentSearchResult(
-                content=(row.content[:500] if len(row.content) > 500 else row.content) if row.content else "",
+                content=(row.content or "")[:500],
                 source_type="supplementary",
                 document_name=row.original_filename,
                 page_or_location=row.source_location or "",
-                equipment_tag=equipment_tag,
+                equipment_tag=row.equipment_tag,
                 relevance_score=float(row.similarity),
                 metadata={}
             ))
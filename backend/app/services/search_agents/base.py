@@ -11,14 +11,55 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
+from sqlalchemy import text
 
 import anthropic
 import google.generativeai as genai
 
 logger = logging.getLogger(__name__)
 
+_SET_ITERATIVE_SCAN_SQL = text("SELECT set_config('hnsw.iterative_scan', 'relaxed_order', true)")
+_PGVECTOR_VERSION_SQL = text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
 
-@dataclass
+# hnsw.iterative_scan first shipped in pgvector 0.8.0
+_ITERATIVE_SCAN_MIN_VERSION = (0, 8)
+
+# Whether the database's pgvector has iterative scans; checked once per process
+_iterative_scan_supported: Optional[bool] = None
+
+
+def _pgvector_version(extversion: Optional[str]) -> tuple:
+    """Numeric prefix of a pgvector extversion ("0.8.0" -> (0, 8, 0)); () if unknown"""
+    parts = []
+    for part in (extversion or "").split("."):
+        if not part.isdigit():
+            break
+        parts.append(int(part))
+    return tuple(parts)
+
+
+def enable_hnsw_iterative_scan(db: Session) -> None:
+    """Keep this transaction's HNSW scans going until LIMIT rows pass the filters.
+
+    Agent KNNs filter (category, keywords, project) after the index scan; a
+    plain scan stops at ef_search candidates and can return too few rows.
+    Needs pgvector 0.8+: older versions reject the setting (hnsw. is a
+    reserved prefix) and abort the transaction, so it is skipped there.
+    """
+    global _iterative_scan_supported
+    if _iterative_scan_supported is None:
+        extversion = db.execute(_PGVECTOR_VERSION_SQL).scalar()
+        _iterative_scan_supported = _pgvector_version(extversion) >= _ITERATIVE_SCAN_MIN_VERSION
+        if not _iterative_scan_supported:
+            logger.warning(
+                f"pgvector {extversion} has no HNSW iterative scans (0.8+); "
+                "filtered agent vector searches may return fewer rows"
+            )
+    if _iterative_scan_supported:
+        db.execute(_SET_ITERATIVE_SCAN_SQL)
+
+
+@dataclass(slots=True)
 class AgentSearchResult:
     """A single search result from an agent's search phase"""
     content: str
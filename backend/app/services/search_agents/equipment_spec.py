@@ -5,7 +5,6 @@ Specialized agent for equipment specifications, ratings, locations, and physical
 Searches Equipment table, EquipmentData (SPECIFICATION), and PDF pages.
 """
 
-import json
 import logging
 from typing import List, Optional
 from sqlalchemy.orm import Session
@@ -136,7 +135,7 @@ class EquipmentSpecAgent(SearchAgent):
 
             for entry in eq_data_query.limit(5).all():
                 try:
-                    data = json.loads(entry.data_json)
+                    data = entry.data_json
                     content = f"Specification for {entry.equipment_tag}:\n"
                     content += "\n".join(f"  {k}: {v}" for k, v in data.items())
 
@@ -149,7 +148,7 @@ class EquipmentSpecAgent(SearchAgent):
                         relevance_score=entry.match_confidence or 0.85,
                         metadata={"data_type": entry.data_type}
                     ))
-                except (json.JSONDecodeError, TypeError):
+                except (TypeError, AttributeError):
                     continue
 
         # 3. Search PDF pages with AI analysis for equipment info
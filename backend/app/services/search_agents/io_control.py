@@ -5,20 +5,62 @@ Specialized agent for IO points, signals, and PLC mappings.
 Searches EquipmentData (IO_POINT) and SupplementaryChunks for control system data.
 """
 
-import json
 import logging
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
+from sqlalchemy import Integer, bindparam, func, or_, select, text
+from pgvector.sqlalchemy import Vector
 
 from app.models.database import (
     EquipmentData, SupplementaryDocument, SupplementaryChunk, DetailedConnection
 )
-from app.services.search_agents.base import SearchAgent, AgentSearchResult
+from app.services.search_agents.base import SearchAgent, AgentSearchResult, enable_hnsw_iterative_scan
 from app.services.embedding_service import embedding_service
 
 logger = logging.getLogger(__name__)
 
+# Cap on results returned by IOControlAgent.search
+MAX_RESULTS = 12
+
+# IO-specific terms appended to the query before embedding
+_IO_QUERY_SUFFIX = " IO point signal PLC control input output"
+
+# Coarse candidate pool size for the two-stage chunk search
+IO_CHUNK_CANDIDATES = 200
+
+# Per-tag statements are built once and reused with fresh bind values, so
+# SQLAlchemy's compiled cache hits on every call. project_id=None disables
+# the project filter.
+_project_id = bindparam("project_id", type_=Integer)
+
+_IO_POINTS_STMT = select(
+    EquipmentData.equipment_tag,
+    EquipmentData.data_json,
+    EquipmentData.source_location,
+    EquipmentData.match_confidence,
+    SupplementaryDocument.original_filename,
+).join(SupplementaryDocument).where(
+    EquipmentData.equipment_tag.ilike(bindparam("tag_pattern")),
+    EquipmentData.data_type == "IO_POINT",
+    or_(_project_id.is_(None), SupplementaryDocument.project_id == _project_id)
+).limit(bindparam("limit"))
+
+_CONTROL_CONNECTIONS_STMT = select(
+    DetailedConnection.source_tag,
+    DetailedConnection.target_tag,
+    DetailedConnection.io_type,
+    DetailedConnection.signal_type,
+    DetailedConnection.point_name,
+    DetailedConnection.function,
+    DetailedConnection.wire_numbers,
+    DetailedConnection.document_id,
+    DetailedConnection.page_number,
+).where(
+    DetailedConnection.category == "CONTROL",
+    (func.upper(DetailedConnection.source_tag) == bindparam("tag_upper")) |
+    (func.upper(DetailedConnection.target_tag) == bindparam("tag_upper"))
+).limit(bindparam("limit"))
+
 IO_CONTROL_PROMPT = """You are an IO and control systems expert analyzing industrial control systems.
 
 Your expertise includes:
@@ -71,41 +113,47 @@ class IOControlAgent(SearchAgent):
         """
         results = []
 
+        # Each source gets only the remaining result budget as its SQL LIMIT,
+        # and later sources are skipped once the cap is reached.
         # 1. Search EquipmentData for IO points
         for tag in equipment_tags:
-            io_data = self._search_io_points(db, tag, project_id)
-            results.extend(io_data)
+            remaining = MAX_RESULTS - len(results)
+            if remaining <= 0:
+                return results
+            results.extend(self._search_io_points(db, tag, project_id, limit=min(10, remaining)))
 
         # 2. Semantic search in supplementary chunks for IO content
-        io_chunks = self._search_io_chunks(db, query, project_id)
-        results.extend(io_chunks)
+        remaining = MAX_RESULTS - len(results)
+        if remaining <= 0:
+            return results
+        results.extend(self._search_io_chunks(db, query, project_id, limit=min(5, remaining)))
 
         # 3. Get control connections from DetailedConnection
         for tag in equipment_tags:
-            control_conns = self._search_control_connections(db, tag, project_id)
-            results.extend(control_conns)
+            remaining = MAX_RESULTS - len(results)
+            if remaining <= 0:
+                break
+            results.extend(self._search_control_connections(db, tag, project_id, limit=min(5, remaining)))
 
-        return results[:12]
+        return results
 
     def _search_io_points(
         self,
         db: Session,
         tag: str,
-        project_id: Optional[int] = None
+        project_id: Optional[int] = None,
+        limit: int = 10
     ) -> List[AgentSearchResult]:
         """Search EquipmentData for IO_POINT entries"""
         results = []
 
-        query = db.query(EquipmentData).join(SupplementaryDocument).filter(
-            EquipmentData.equipment_tag.ilike(f"%{tag}%"),
-            EquipmentData.data_type == "IO_POINT"
-        )
-        if project_id:
-            query = query.filter(SupplementaryDocument.project_id == project_id)
+        # Plain column rows: the document filename comes from the join, so no
+        # ORM entities and no per-entry lazy load of entry.document
+        params = {"tag_pattern": f"%{tag}%", "project_id": project_id or None, "limit": limit}
 
-        for entry in query.limit(10).all():
+        for entry in db.execute(_IO_POINTS_STMT, params):
             try:
-                data = json.loads(entry.data_json)
+                data = entry.data_json
                 content_parts = [f"IO Point for {entry.equipment_tag}:"]
 
                 # Common IO point fields
@@ -135,13 +183,13 @@ class IOControlAgent(SearchAgent):
                 results.append(AgentSearchResult(
                     content="\n".join(content_parts),
                     source_type="supplementary",
-                    document_name=entry.document.original_filename,
+                    document_name=entry.original_filename,
                     page_or_location=entry.source_location or "",
                     equipment_tag=entry.equipment_tag,
                     relevance_score=entry.match_confidence or 0.9,
                     metadata={"data_type": "IO_POINT"}
                 ))
-            except (json.JSONDecodeError, TypeError) as e:
+            except TypeError as e:
                 logger.debug(f"Failed to parse IO point data: {e}")
                 continue
 
@@ -151,61 +199,78 @@ class IOControlAgent(SearchAgent):
         self,
         db: Session,
         query: str,
-        project_id: Optional[int] = None
+        project_id: Optional[int] = None,
+        limit: int = 5
     ) -> List[AgentSearchResult]:
         """Semantic search in supplementary chunks for IO-related content"""
         results = []
 
         # Add IO-specific terms to query for better matching
-        enhanced_query = f"{query} IO point signal PLC control input output"
-        query_embedding = embedding_service.generate_embedding(enhanced_query)
+        query_embedding = list(embedding_service.generate_query_embedding(query + _IO_QUERY_SUFFIX))
+
+        # Two-stage search: pull a candidate pool by Hamming distance on the
+        # binary-quantized HNSW index (migration 004), then rerank the pool by
+        # exact cosine distance on the FP32 column. HNSW returns at most
+        # ef_search rows, so raise it (transaction-local) to the pool size,
+        # and let the scan continue past it while the category/keyword and
+        # project filters reject candidates.
+        db.execute(
+            text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+            {"ef": str(IO_CHUNK_CANDIDATES)}
+        )
+        enable_hnsw_iterative_scan(db)
 
         sql = text("""
+            WITH candidates AS (
+                SELECT sc.id
+                FROM supplementary_chunks sc
+                JOIN supplementary_documents sd ON sc.document_id = sd.id
+                WHERE sc.embedding IS NOT NULL
+                AND (
+                    sd.content_category = 'IO_LIST'
+                    OR sc.content ILIKE '%IO%'
+                    OR sc.content ILIKE '%point%'
+                    OR sc.content ILIKE '%signal%'
+                    OR sc.content ILIKE '%PLC%'
+                )
+                AND (:project_id IS NULL OR sd.project_id = :project_id)
+                ORDER BY binary_quantize(sc.embedding)::bit(384)
+                    <~> binary_quantize(CAST(:embedding AS vector(384)))
+                LIMIT :candidates
+            )
             SELECT
                 sc.id,
                 sc.document_id,
                 sc.content,
                 sc.source_location,
-                sc.equipment_tags,
+                sc.equipment_tags::jsonb ->> 0 AS equipment_tag,
                 sd.original_filename,
                 sd.content_category,
-                1 - (sc.embedding <=> CAST(:embedding AS vector)) as similarity
-            FROM supplementary_chunks sc
+                1 - (sc.embedding <=> :embedding) as similarity
+            FROM candidates
+            JOIN supplementary_chunks sc ON sc.id = candidates.id
             JOIN supplementary_documents sd ON sc.document_id = sd.id
-            WHERE sc.embedding IS NOT NULL
-            AND (
-                sd.content_category = 'IO_LIST'
-                OR sc.content ILIKE '%IO%'
-                OR sc.content ILIKE '%point%'
-                OR sc.content ILIKE '%signal%'
-                OR sc.content ILIKE '%PLC%'
-            )
-            AND (:project_id IS NULL OR sd.project_id = :project_id)
-            ORDER BY sc.embedding <=> CAST(:embedding AS vector)
-            LIMIT 5
-        """)
-
-        params = {"embedding": str(query_embedding), "project_id": project_id}
+            ORDER BY sc.embedding <=> :embedding
+            LIMIT :limit
+        """).bindparams(bindparam("embedding", type_=Vector(384)))
+
+        # Bound through pgvector's Vector type, so no str() of the list
+        params = {
+            "embedding": query_embedding,
+            "project_id": project_id,
+            "candidates": IO_CHUNK_CANDIDATES,
+            "limit": limit,
+        }
 
         result = db.execute(sql, params)
 
         for row in result:
-            # Parse equipment tags
-            equipment_tag = None
-            if row.equipment_tags:
-                try:
-                    tags = json.loads(row.equipment_tags)
-                    if tags:
-                        equipment_tag = tags[0]
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
             results.append(AgentSearchResult(
-                content=(row.content[:500] if len(row.content) > 500 else row.content) if row.content else "",
+                content=(row.content or "")[:500],
                 source_type="supplementary",
                 document_name=row.original_filename,
                 page_or_location=row.source_location or "",
-                equipment_tag=equipment_tag,
+                equipment_tag=row.equipment_tag,
                 relevance_score=float(row.similarity),
                 metadata={"content_category": row.content_category}
             ))
@@ -216,19 +281,16 @@ class IOControlAgent(SearchAgent):
         self,
         db: Session,
         tag: str,
-        project_id: Optional[int] = None
+        project_id: Optional[int] = None,
+        limit: int = 5
     ) -> List[AgentSearchResult]:
         """Search DetailedConnection for CONTROL category connections"""
         results = []
         tag_upper = tag.upper()
 
-        query = db.query(DetailedConnection).filter(
-            DetailedConnection.category == "CONTROL",
-            (func.upper(DetailedConnection.source_tag) == tag_upper) |
-            (func.upper(DetailedConnection.target_tag) == tag_upper)
-        )
+        params = {"tag_upper": tag_upper, "limit": limit}
 
-        for conn in query.limit(5).all():
+        for conn in db.execute(_CONTROL_CONNECTIONS_STMT, params):
             content_parts = [
                 f"Control Connection: {conn.source_tag} -> {conn.target_tag}"
             ]
@@ -5,10 +5,14 @@ Specialized agent for power feeds, control loops, and equipment connections.
 Uses DetailedConnection table and graph traversal for relationship queries.
 """
 
+import io
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, groupby
 from typing import List, Optional, Dict
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Integer, bindparam, func, or_, select
 
 from app.models.database import (
     Equipment, EquipmentRelationship, DetailedConnection, Document
@@ -18,6 +22,97 @@ from app.services.graph_service import graph_service
 
 logger = logging.getLogger(__name__)
 
+# Cap on results returned by RelationshipAgent.search
+MAX_RESULTS = 10
+
+# Power-flow trigger words (substring match, same as the old any(... in ...) check)
+_POWER_KEYWORDS_RE = re.compile(r"feed|power|upstream|downstream", re.IGNORECASE)
+
+
+def _write_line(buf: io.StringIO, line: str) -> None:
+    """Append a line, newline-separated from anything already written"""
+    if buf.tell():
+        buf.write("\n")
+    buf.write(line)
+
+
+def _write_section(buf: io.StringIO, heading: str) -> None:
+    """Start a section, separated from previous output by a blank line"""
+    if buf.tell():
+        buf.write("\n\n")
+    buf.write(heading)
+
+
+def _node_depth(node: Dict) -> int:
+    return node.get("depth", 0)
+
+
+# Built once and reused with fresh bind values so SQLAlchemy's compiled cache
+# hits on every call: plain column rows with the document filename taken from
+# the join. project_id=None disables the project filter.
+_project_id = bindparam("project_id", type_=Integer)
+
+_DETAILED_CONNECTIONS_STMT = select(
+    DetailedConnection.id,
+    DetailedConnection.document_id,
+    DetailedConnection.page_number,
+    DetailedConnection.source_tag,
+    DetailedConnection.target_tag,
+    DetailedConnection.category,
+    DetailedConnection.connection_type,
+    DetailedConnection.voltage,
+    DetailedConnection.breaker,
+    DetailedConnection.wire_size,
+    DetailedConnection.signal_type,
+    DetailedConnection.io_type,
+    DetailedConnection.function,
+    DetailedConnection.load,
+    Document.filename,
+).join(Document).where(
+    (func.upper(DetailedConnection.source_tag) == bindparam("tag_upper")) |
+    (func.upper(DetailedConnection.target_tag) == bindparam("tag_upper")),
+    or_(_project_id.is_(None), Document.project_id == _project_id)
+).limit(bindparam("limit"))
+
+# Shared read-only default for nodes without a "details" dict
+_EMPTY_DETAILS: Dict = {}
+
+# (connections key, section heading, (details key, suffix template) pairs),
+# in the order sections appear in the graph context
+_CONNECTION_SECTIONS = (
+    ("feeds_from", "POWERED BY:", (
+        ("breaker", " via breaker {}"), ("voltage", " at {}"), ("wire_size", ", wire: {}"),
+    )),
+    ("feeds_to", "FEEDS:", (
+        ("breaker", " via breaker {}"), ("load", " (load: {})"),
+    )),
+    ("controlled_by", "CONTROLLED BY:", (
+        ("signal_type", " [{}]"), ("io_type", " ({})"), ("function", " - {}"),
+    )),
+    ("controls", "CONTROLS:", (
+        ("signal_type", " [{}]"), ("function", " - {}"),
+    )),
+    ("protected_by", "PROTECTED BY:", ()),
+    ("monitored_by", "MONITORED BY:", (
+        ("signal_type", " [{}]"),
+    )),
+    ("driven_by", "DRIVEN BY:", ()),
+    ("drives", "DRIVES:", ()),
+)
+
+
+def _write_edge(buf: io.StringIO, node: Dict, fields: tuple) -> None:
+    """Write one connected-equipment line with its non-empty detail fields"""
+    buf.write(f"\n  {node['tag']}")
+    if not fields:
+        return
+    details = node.get("details") or _EMPTY_DETAILS
+    for key, template in fields:
+        value = details.get(key)
+        if value:
+            buf.write(template.format(value))
+
+
 RELATIONSHIP_PROMPT = """You are a systems relationship expert analyzing industrial power and control systems.
 
 Your expertise includes:
@@ -65,209 +160,152 @@ class RelationshipAgent(SearchAgent):
         2. Query DetailedConnection for rich connection data
         3. Query EquipmentRelationship for basic relationships
         """
+        if not equipment_tags:
+            return []
+
+        include_power_flow = _POWER_KEYWORDS_RE.search(query) is not None
+
+        if len(equipment_tags) == 1:
+            return self._search_tag(db, equipment_tags[0], project_id, include_power_flow)
+
+        # Each tag is an independent chain of graph/DB round-trips, so fan them
+        # out. Sessions are not thread-safe: every worker opens its own on the
+        # caller's engine.
+        engine = db.get_bind()
+
+        def _search_tag_with_own_session(tag: str) -> List[AgentSearchResult]:
+            thread_db = Session(bind=engine)
+            try:
+                return self._search_tag(thread_db, tag, project_id, include_power_flow)
+            finally:
+                thread_db.close()
+
+        with ThreadPoolExecutor(max_workers=min(8, len(equipment_tags))) as executor:
+            per_tag_results = list(executor.map(_search_tag_with_own_session, equipment_tags))
+
+        results = list(chain.from_iterable(per_tag_results))
+        return results[:MAX_RESULTS]
+
+    def _search_tag(
+        self,
+        db: Session,
+        tag: str,
+        project_id: Optional[int],
+        include_power_flow: bool
+    ) -> List[AgentSearchResult]:
+        """Collect graph, detailed-connection and power-flow results for one tag (at most MAX_RESULTS)"""
         results = []
 
-        for tag in equipment_tags:
-            # 1. Get full connection graph from graph_service
-            connections = graph_service.get_equipment_connections(db, tag)
-            graph_context = self._format_graph_connections(connections)
+        # 1. Get full connection graph from graph_service
+        connections = graph_service.get_equipment_connections(db, tag)
+        graph_context = self._format_graph_connections(connections)
 
-            if graph_context:
+        if graph_context:
+            results.append(AgentSearchResult(
+                content=graph_context,
+                source_type="graph",
+                document_name="Equipment Relationship Graph",
+                page_or_location="",
+                equipment_tag=tag,
+                relevance_score=1.0,
+                metadata={"source": "graph_service"}
+            ))
+
+        # 2. Get detailed connections for richer data (only as many rows as
+        # still fit under MAX_RESULTS)
+        remaining = MAX_RESULTS - len(results)
+        if remaining > 0:
+            results.extend(self._get_detailed_connections(db, tag, project_id, limit=min(10, remaining)))
+
+        # 3. Get power flow if this seems like a power-related query
+        if include_power_flow and len(results) < MAX_RESULTS:
+            power_flow = graph_service.get_full_power_flow(db, tag)
+            flow_context = self._format_power_flow(power_flow)
+            if flow_context:
                 results.append(AgentSearchResult(
-                    content=graph_context,
+                    content=flow_context,
                     source_type="graph",
-                    document_name="Equipment Relationship Graph",
+                    document_name="Power Flow Analysis",
                     page_or_location="",
                     equipment_tag=tag,
-                    relevance_score=1.0,
-                    metadata={"source": "graph_service"}
+                    relevance_score=0.95,
+                    metadata={"source": "power_flow"}
                 ))
 
-            # 2. Get detailed connections for richer data
-            detailed_conns = self._get_detailed_connections(db, tag, project_id)
-            for conn_result in detailed_conns:
-                results.append(conn_result)
-
-            # 3. Get power flow if this seems like a power-related query
-            query_lower = query.lower()
-            if any(word in query_lower for word in ["feed", "power", "upstream", "downstream"]):
-                power_flow = graph_service.get_full_power_flow(db, tag)
-                flow_context = self._format_power_flow(power_flow)
-                if flow_context:
-                    results.append(AgentSearchResult(
-                        content=flow_context,
-                        source_type="graph",
-                        document_name="Power Flow Analysis",
-                        page_or_location="",
-                        equipment_tag=tag,
-                        relevance_score=0.95,
-                        metadata={"source": "power_flow"}
-                    ))
-
-        return results[:10]
+        return results
 
     def _format_graph_connections(self, connections: Dict) -> str:
         """Format graph connections into readable context"""
-        parts = []
+        buf = io.StringIO()
         tag = connections.get("equipment_tag", "Unknown")
 
         if connections.get("equipment_info"):
             info = connections["equipment_info"]
-            parts.append(f"Equipment: {info.get('tag', tag)} ({info.get('type', 'Unknown')})")
+            _write_line(buf, f"Equipment: {info.get('tag', tag)} ({info.get('type', 'Unknown')})")
             if info.get("description"):
-                parts.append(f"Description: {info['description']}")
-
-        # Power relationships
-        if connections.get("feeds_from"):
-            parts.append("\nPOWERED BY:")
-            for feed in connections["feeds_from"]:
-                details = feed.get("details", {})
-                line = f"  {feed['tag']}"
-                if details.get("breaker"):
-                    line += f" via breaker {details['breaker']}"
-                if details.get("voltage"):
-                    line += f" at {details['voltage']}"
-                if details.get("wire_size"):
-                    line += f", wire: {details['wire_size']}"
-                parts.append(line)
-
-        if connections.get("feeds_to"):
-            parts.append("\nFEEDS:")
-            for feed in connections["feeds_to"]:
-                details = feed.get("details", {})
-                line = f"  {feed['tag']}"
-                if details.get("breaker"):
-                    line += f" via breaker {details['breaker']}"
-                if details.get("load"):
-                    line += f" (load: {details['load']})"
-                parts.append(line)
-
-        # Control relationships
-        if connections.get("controlled_by"):
-            parts.append("\nCONTROLLED BY:")
-            for ctrl in connections["controlled_by"]:
-                details = ctrl.get("details", {})
-                line = f"  {ctrl['tag']}"
-                if details.get("signal_type"):
-                    line += f" [{details['signal_type']}]"
-                if details.get("io_type"):
-                    line += f" ({details['io_type']})"
-                if details.get("function"):
-                    line += f" - {details['function']}"
-                parts.append(line)
-
-        if connections.get("controls"):
-            parts.append("\nCONTROLS:")
-            for ctrl in connections["controls"]:
-                details = ctrl.get("details", {})
-                line = f"  {ctrl['tag']}"
-                if details.get("signal_type"):
-                    line += f" [{details['signal_type']}]"
-                if details.get("function"):
-                    line += f" - {details['function']}"
-                parts.append(line)
-
-        # Protection
-        if connections.get("protected_by"):
-            parts.append("\nPROTECTED BY:")
-            for prot in connections["protected_by"]:
-                parts.append(f"  {prot['tag']}")
-
-        # Monitoring
-        if connections.get("monitored_by"):
-            parts.append("\nMONITORED BY:")
-            for mon in connections["monitored_by"]:
-                details = mon.get("details", {})
-                line = f"  {mon['tag']}"
-                if details.get("signal_type"):
-                    line += f" [{details['signal_type']}]"
-                parts.append(line)
-
-        # Drives
-        if connections.get("driven_by"):
-            parts.append("\nDRIVEN BY:")
-            for drv in connections["driven_by"]:
-                parts.append(f"  {drv['tag']}")
-
-        if connections.get("drives"):
-            parts.append("\nDRIVES:")
-            for drv in connections["drives"]:
-                parts.append(f"  {drv['tag']}")
-
-        return "\n".join(parts) if parts else ""
+                _write_line(buf, f"Description: {info['description']}")
+
+        for key, heading, fields in _CONNECTION_SECTIONS:
+            nodes = connections.get(key)
+            if nodes:
+                _write_section(buf, heading)
+                for node in nodes:
+                    _write_edge(buf, node, fields)
+
+        return buf.getvalue()
 
     def _format_power_flow(self, power_flow: Dict) -> str:
         """Format power flow analysis into readable context"""
-        parts = []
+        buf = io.StringIO()
         tag = power_flow.get("equipment_tag", "Unknown")
 
         if power_flow.get("upstream_tree"):
-            parts.append(f"UPSTREAM POWER CHAIN for {tag}:")
-            # Group by depth
-            by_depth = {}
-            for node in power_flow["upstream_tree"]:
-                depth = node.get("depth", 0)
-                if depth not in by_depth:
-                    by_depth[depth] = []
-                by_depth[depth].append(node)
-
-            for depth in sorted(by_depth.keys()):
-                for node in by_depth[depth]:
-                    indent = "  " * depth
-                    line = f"{indent}{node['tag']}"
+            _write_line(buf, f"UPSTREAM POWER CHAIN for {tag}:")
+            # Group by depth (sorted() is stable, so BFS order is kept within a level)
+            nodes = sorted(power_flow["upstream_tree"], key=_node_depth)
+            for depth, group in groupby(nodes, key=_node_depth):
+                indent = "  " * depth
+                for node in group:
+                    buf.write(f"\n{indent}{node['tag']}")
                     if node.get("breaker"):
-                        line += f" (breaker: {node['breaker']})"
+                        buf.write(f" (breaker: {node['breaker']})")
                     if node.get("voltage"):
-                        line += f" [{node['voltage']}]"
-                    line += f" -> feeds {node.get('feeds', '?')}"
-                    parts.append(line)
+                        buf.write(f" [{node['voltage']}]")
+                    buf.write(f" -> feeds {node.get('feeds', '?')}")
 
         if power_flow.get("downstream_tree"):
-            parts.append(f"\nDOWNSTREAM EQUIPMENT fed by {tag}:")
-            by_depth = {}
-            for node in power_flow["downstream_tree"]:
-                depth = node.get("depth", 0)
-                if depth not in by_depth:
-                    by_depth[depth] = []
-                by_depth[depth].append(node)
-
-            for depth in sorted(by_depth.keys()):
-                for node in by_depth[depth]:
-                    indent = "  " * depth
-                    line = f"{indent}{node['tag']}"
+            _write_section(buf, f"DOWNSTREAM EQUIPMENT fed by {tag}:")
+            nodes = sorted(power_flow["downstream_tree"], key=_node_depth)
+            for depth, group in groupby(nodes, key=_node_depth):
+                indent = "  " * depth
+                for node in group:
+                    buf.write(f"\n{indent}{node['tag']}")
                     if node.get("breaker"):
-                        line += f" (breaker: {node['breaker']})"
+                        buf.write(f" (breaker: {node['breaker']})")
                     if node.get("load"):
-                        line += f" [load: {node['load']}]"
-                    parts.append(line)
+                        buf.write(f" [load: {node['load']}]")
 
-        if parts:
-            parts.append(f"\nTotal: {power_flow.get('total_upstream', 0)} upstream, "
-                        f"{power_flow.get('total_downstream', 0)} downstream")
+        if buf.tell():
+            _write_section(buf, f"Total: {power_flow.get('total_upstream', 0)} upstream, "
+                                f"{power_flow.get('total_downstream', 0)} downstream")
 
-        return "\n".join(parts) if parts else ""
+        return buf.getvalue()
 
     def _get_detailed_connections(
         self,
         db: Session,
         tag: str,
-        project_id: Optional[int] = None
+        project_id: Optional[int] = None,
+        limit: int = 10
     ) -> List[AgentSearchResult]:
         """Get detailed connection records with document references"""
         results = []
         tag_upper = tag.upper()
 
         # Get connections where this equipment is source or target
-        query = db.query(DetailedConnection).join(Document).filter(
-            (func.upper(DetailedConnection.source_tag) == tag_upper) |
-            (func.upper(DetailedConnection.target_tag) == tag_upper)
-        )
-        if project_id:
-            query = query.filter(Document.project_id == project_id)
-
-        connections = query.limit(10).all()
+        params = {"tag_upper": tag_upper, "project_id": project_id or None, "limit": limit}
 
-        for conn in connections:
+        for conn in db.execute(_DETAILED_CONNECTIONS_STMT, params):
             content_parts = [
                 f"Connection: {conn.source_tag} -> {conn.target_tag}",
                 f"Category: {conn.category}",
@@ -289,13 +327,10 @@ class RelationshipAgent(SearchAgent):
             if conn.load:
                 content_parts.append(f"Load: {conn.load}")
 
-            doc = db.query(Document).filter(Document.id == conn.document_id).first()
-            doc_name = doc.filename if doc else f"Document {conn.document_id}"
-
             results.append(AgentSearchResult(
                 content="\n".join(content_parts),
                 source_type="pdf",
-                document_name=doc_name,
+                document_name=conn.filename or f"Document {conn.document_id}",
                 page_or_location=f"Page {conn.page_number}",
                 equipment_tag=tag,
                 relevance_score=0.9,
@@ -5,18 +5,87 @@ Specialized agent for operating sequences, modes, and control logic.
 Searches SupplementaryChunks (SEQUENCE_OF_OPERATION content category).
 """
 
-import json
+import io
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import Integer, String, bindparam, cast, column, func, literal, or_, select, text, values
+from sqlalchemy.dialects.postgresql import JSONB
+from pgvector.sqlalchemy import Vector
 
 from app.models.database import SupplementaryDocument, SupplementaryChunk, EquipmentData
-from app.services.search_agents.base import SearchAgent, AgentSearchResult
+from app.services.search_agents.base import SearchAgent, AgentSearchResult, enable_hnsw_iterative_scan
 from app.services.embedding_service import embedding_service
+from app.services.semantic_cache import project_cache_version, semantic_cache
 
 logger = logging.getLogger(__name__)
 
+# Sequence keyword filter for the semantic search, matched against the
+# stemmed content_tsv column (so "starting", "modes", ... also match)
+SEQUENCE_KEYWORDS_TSQUERY = "sequence | start | stop | mode | operation"
+
+# Queries with fewer words than this skip the semantic search
+SEQUENCE_MIN_SEMANTIC_WORDS = 3
+
+# Sequence-related terms appended to the query before embedding
+SEQUENCE_QUERY_TERMS = "sequence operation start stop mode control logic step procedure"
+
+# Semantic search SQL, built once per project-filter variant. A literal
+# variant (rather than ":project_id IS NULL OR ...") gives the planner a
+# plain equality predicate to plan against.
+_SEMANTIC_SQL_TEMPLATE = """
+    SELECT
+        sc.id,
+        sc.document_id,
+        LEFT(sc.content, 500) AS content,
+        sc.source_location,
+        sc.equipment_tags::jsonb ->> 0 AS equipment_tag,
+        sd.original_filename,
+        sd.content_category,
+        1 - (sc.embedding <=> :embedding) as similarity
+    FROM supplementary_chunks sc
+    JOIN supplementary_documents sd ON sc.document_id = sd.id
+    WHERE sc.embedding IS NOT NULL
+    AND (
+        sd.content_category = 'SEQUENCE_OF_OPERATION'
+        OR sc.content_tsv @@ to_tsquery('english', :keywords)
+    )
+    {project_filter}
+    ORDER BY sc.embedding::halfvec(384) <=> CAST(:embedding AS halfvec(384))
+    LIMIT 5
+"""
+
+_SEMANTIC_SQL_NO_PROJECT = text(
+    _SEMANTIC_SQL_TEMPLATE.format(project_filter="")
+).bindparams(bindparam("embedding", type_=Vector(384)))
+
+_SEMANTIC_SQL_WITH_PROJECT = text(
+    _SEMANTIC_SQL_TEMPLATE.format(project_filter="AND sd.project_id = :project_id")
+).bindparams(bindparam("embedding", type_=Vector(384)))
+
+
+def _dedupe_chunks(results: List[AgentSearchResult]) -> List[AgentSearchResult]:
+    """Drop repeated chunks, keeping the first-seen result in branch order
+
+    The document and semantic searches both cover SEQUENCE_OF_OPERATION
+    chunks, so the same chunk can come back twice. Their relevance scores
+    are on different scales, so results are not re-sorted. Results without
+    a chunk_id (equipment data entries) are all kept.
+    """
+    seen = set()
+    deduped = []
+    for result in results:
+        chunk_id = result.metadata.get("chunk_id")
+        if chunk_id is not None:
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+        deduped.append(result)
+    return deduped
+
+
 SEQUENCE_PROMPT = """You are a sequence of operations expert analyzing industrial process control and automation.
 
 Your expertise includes:
@@ -70,22 +139,60 @@ class SequenceAgent(SearchAgent):
         2. Search EquipmentData for SEQUENCE type entries
         3. Semantic search for sequence-related content
         """
-        results = []
-
-        # 1. Search SEQUENCE_OF_OPERATION documents
-        soo_results = self._search_sequence_documents(db, query, equipment_tags, project_id)
-        results.extend(soo_results)
+        # Very short queries are dominated by the lexical branches; skip the
+        # embedding, the result cache and the vector search for them
+        use_semantic = len(query.split()) >= SEQUENCE_MIN_SEMANTIC_WORDS
+
+        if use_semantic:
+            # Enhance query with sequence-related terms; the (memoized) embedding
+            # serves both the result cache lookup and the semantic search below
+            query_embedding = list(embedding_service.generate_query_embedding(f"{query} {SEQUENCE_QUERY_TERMS}"))
+
+            # A near-identical query for the same tags/project was answered recently.
+            # The project version is bumped by triggers when supplementary documents
+            # or equipment data change, so stale entries miss in every worker.
+            project_version = project_cache_version(db, project_id)
+            cache_key = (
+                self.name,
+                project_id,
+                project_version,
+                tuple(sorted(tag.upper() for tag in equipment_tags)),
+            )
+            cached = semantic_cache.get(cache_key, query_embedding)
+            if cached is not None:
+                return cached
 
-        # 2. Search EquipmentData for SEQUENCE entries
-        for tag in equipment_tags:
-            seq_data = self._search_sequence_data(db, tag, project_id)
-            results.extend(seq_data)
+        # The branches hit independent tables, so run them concurrently.
+        # Sessions are not thread-safe: each worker opens its own on the
+        # caller's engine, and the caller's session runs the semantic search.
+        engine = db.get_bind()
 
-        # 3. Semantic search for sequence content
-        semantic_results = self._semantic_sequence_search(db, query, project_id)
-        results.extend(semantic_results)
+        def _with_own_session(search_fn, *args) -> List[AgentSearchResult]:
+            thread_db = Session(bind=engine)
+            try:
+                return search_fn(thread_db, *args)
+            finally:
+                thread_db.close()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # 1. Search SEQUENCE_OF_OPERATION documents
+            soo_future = executor.submit(
+                _with_own_session, self._search_sequence_documents, query, equipment_tags, project_id
+            )
+            # 2. Search EquipmentData for SEQUENCE entries
+            data_future = executor.submit(
+                _with_own_session, self._search_sequence_data, equipment_tags, project_id
+            )
+            # 3. Semantic search for sequence content
+            semantic_results = (
+                self._semantic_sequence_search(db, query_embedding, project_id) if use_semantic else []
+            )
+            results = soo_future.result() + data_future.result() + semantic_results
 
-        return results[:12]
+        results = _dedupe_chunks(results)[:12]
+        if use_semantic:
+            semantic_cache.put(cache_key, query_embedding, results, project=(self.name, project_id), version=project_version)
+        return results
 
     def _search_sequence_documents(
         self,
@@ -97,109 +204,134 @@ class SequenceAgent(SearchAgent):
         """Search chunks from SEQUENCE_OF_OPERATION documents"""
         results = []
 
-        # Get sequence documents
-        doc_query = db.query(SupplementaryDocument).filter(
+        # One query for all sequence documents: up to 5 matching chunks per
+        # document (row_number window), as plain column rows. Truncation and
+        # first-tag extraction happen in SQL (equipment_tags is always a JSON
+        # array or NULL, written by the Excel/Word processors).
+        per_doc_rank = func.row_number().over(
+            partition_by=SupplementaryChunk.document_id,
+            order_by=SupplementaryChunk.chunk_index
+        ).label("per_doc_rank")
+
+        ranked = select(
+            SupplementaryChunk.id,
+            func.left(SupplementaryChunk.content, 600).label("content"),
+            SupplementaryChunk.source_location,
+            cast(SupplementaryChunk.equipment_tags, JSONB)[0].astext.label("equipment_tag"),
+            SupplementaryChunk.chunk_index,
+            SupplementaryChunk.document_id,
+            SupplementaryDocument.original_filename,
+            per_doc_rank,
+        ).join(SupplementaryDocument).where(
             SupplementaryDocument.content_category == "SEQUENCE_OF_OPERATION"
         )
         if project_id:
-            doc_query = doc_query.filter(SupplementaryDocument.project_id == project_id)
-
-        seq_docs = doc_query.all()
-
-        for doc in seq_docs:
-            # Search chunks from this document
-            chunk_query = db.query(SupplementaryChunk).filter(
-                SupplementaryChunk.document_id == doc.id
-            )
-
-            # Filter by equipment tags if provided
-            if equipment_tags:
-                tag_filters = []
-                for tag in equipment_tags:
-                    tag_filters.append(SupplementaryChunk.content.ilike(f"%{tag}%"))
-                    tag_filters.append(SupplementaryChunk.equipment_tags.ilike(f"%{tag}%"))
-
-                from sqlalchemy import or_
-                chunk_query = chunk_query.filter(or_(*tag_filters))
-
-            chunks = chunk_query.limit(5).all()
+            ranked = ranked.where(SupplementaryDocument.project_id == project_id)
+
+        # Filter by equipment tags if provided: one case-insensitive regex
+        # alternation per column instead of an ILIKE per tag per column
+        # (substring semantics unchanged; both forms use the trigram indexes)
+        if equipment_tags:
+            tag_pattern = "|".join(re.escape(tag) for tag in equipment_tags)
+            ranked = ranked.where(or_(
+                SupplementaryChunk.content.op("~*")(tag_pattern),
+                SupplementaryChunk.equipment_tags.op("~*")(tag_pattern)
+            ))
 
-            for chunk in chunks:
-                equipment_tag = None
-                if chunk.equipment_tags:
-                    try:
-                        tags = json.loads(chunk.equipment_tags)
-                        if tags:
-                            equipment_tag = tags[0]
-                    except (json.JSONDecodeError, TypeError):
-                        pass
+        ranked = ranked.subquery()
+        # Row count grows with the number of sequence documents (5 each), so
+        # stream in batches rather than buffering the whole result
+        stmt = select(ranked).where(ranked.c.per_doc_rank <= 5).order_by(
+            ranked.c.document_id, ranked.c.chunk_index
+        ).execution_options(yield_per=50)
 
-                results.append(AgentSearchResult(
-                    content=(chunk.content[:600] if len(chunk.content) > 600 else chunk.content) if chunk.content else "",
-                    source_type="supplementary",
-                    document_name=doc.original_filename,
-                    page_or_location=chunk.source_location or f"Section {chunk.chunk_index + 1}",
-                    equipment_tag=equipment_tag,
-                    relevance_score=0.95,
-                    metadata={"content_category": "SEQUENCE_OF_OPERATION"}
-                ))
+        for chunk in db.execute(stmt):
+            results.append(AgentSearchResult(
+                content=chunk.content or "",
+                source_type="supplementary",
+                document_name=chunk.original_filename,
+                page_or_location=chunk.source_location or f"Section {chunk.chunk_index + 1}",
+                equipment_tag=chunk.equipment_tag,
+                relevance_score=0.95,
+                metadata={"content_category": "SEQUENCE_OF_OPERATION", "chunk_id": chunk.id}
+            ))
 
         return results
 
     def _search_sequence_data(
         self,
         db: Session,
-        tag: str,
+        equipment_tags: List[str],
         project_id: Optional[int] = None
     ) -> List[AgentSearchResult]:
-        """Search EquipmentData for SEQUENCE entries"""
+        """Search EquipmentData for SEQUENCE entries matching any of the tags"""
         results = []
-
-        query = db.query(EquipmentData).join(SupplementaryDocument).filter(
-            EquipmentData.equipment_tag.ilike(f"%{tag}%"),
+        if not equipment_tags:
+            return results
+
+        # One round-trip for all tags, up to 5 rows per tag as before: rows are
+        # ranked per tag in SQL, so one broad tag cannot crowd out the others
+        tag_values = values(
+            column("tag_position", Integer), column("tag", String), name="query_tags"
+        ).data(list(enumerate(equipment_tags)))
+        ranked = select(
+            EquipmentData.equipment_tag,
+            EquipmentData.data_json,
+            EquipmentData.source_location,
+            EquipmentData.match_confidence,
+            SupplementaryDocument.original_filename,
+            tag_values.c.tag_position,
+            func.row_number().over(partition_by=tag_values.c.tag_position, order_by=EquipmentData.id).label("tag_rank"),
+        ).select_from(EquipmentData).join(
+            tag_values, EquipmentData.equipment_tag.ilike(literal("%") + tag_values.c.tag + literal("%"))
+        ).join(SupplementaryDocument).where(
             EquipmentData.data_type == "SEQUENCE"
         )
         if project_id:
-            query = query.filter(SupplementaryDocument.project_id == project_id)
+            ranked = ranked.where(SupplementaryDocument.project_id == project_id)
+        ranked = ranked.subquery()
+        stmt = select(ranked).where(ranked.c.tag_rank <= 5).order_by(ranked.c.tag_position, ranked.c.tag_rank)
 
-        for entry in query.limit(5).all():
+        for entry in db.execute(stmt):
             try:
-                data = json.loads(entry.data_json)
-                content_parts = [f"Sequence for {entry.equipment_tag}:"]
+                data = entry.data_json
+                buf = io.StringIO()
+                buf.write(f"Sequence for {entry.equipment_tag}:")
 
                 # Common sequence fields
                 if "mode" in data:
-                    content_parts.append(f"  Mode: {data['mode']}")
+                    buf.write(f"\n  Mode: {data['mode']}")
                 if "sequence_name" in data:
-                    content_parts.append(f"  Sequence: {data['sequence_name']}")
+                    buf.write(f"\n  Sequence: {data['sequence_name']}")
                 if "steps" in data:
-                    content_parts.append("  Steps:")
-                    if isinstance(data["steps"], list):
-                        for i, step in enumerate(data["steps"], 1):
+                    buf.write("\n  Steps:")
+                    steps = data["steps"]
+                    if isinstance(steps, list):
+                        for i, step in enumerate(steps, 1):
                             if isinstance(step, dict):
-                                step_desc = step.get("description", step.get("action", str(step)))
+                                step_desc = step.get("description", step.get("action", step))
                             else:
-                                step_desc = str(step)
-                            content_parts.append(f"    {i}. {step_desc}")
+                                step_desc = step
+                            buf.write(f"\n    {i}. {step_desc}")
                     else:
-                        content_parts.append(f"    {data['steps']}")
+                        buf.write(f"\n    {steps}")
                 if "conditions" in data:
-                    content_parts.append(f"  Conditions: {data['conditions']}")
+                    buf.write(f"\n  Conditions: {data['conditions']}")
                 if "timing" in data:
-                    content_parts.append(f"  Timing: {data['timing']}")
+                    buf.write(f"\n  Timing: {data['timing']}")
                 if "description" in data:
-                    content_parts.append(f"  Description: {data['description']}")
+                    buf.write(f"\n  Description: {data['description']}")
 
                 results.append(AgentSearchResult(
-                    content="\n".join(content_parts),
+                    content=buf.getvalue(),
                     source_type="supplementary",
-                    document_name=entry.document.original_filename,
+                    document_name=entry.original_filename,
                     page_or_location=entry.source_location or "",
                     equipment_tag=entry.equipment_tag,
                     relevance_score=entry.match_confidence or 0.9,
                     metadata={"data_type": "SEQUENCE"}
                 ))
-            except (json.JSONDecodeError, TypeError) as e:
+            except TypeError as e:
                 logger.debug(f"Failed to parse sequence data: {e}")
                 continue
 
@@ -208,64 +340,34 @@ class SequenceAgent(SearchAgent):
     def _semantic_sequence_search(
         self,
         db: Session,
-        query: str,
+        query_embedding: List[float],
         project_id: Optional[int] = None
     ) -> List[AgentSearchResult]:
         """Semantic search for sequence-related content"""
         results = []
 
-        # Enhance query with sequence-related terms
-        enhanced_query = f"{query} sequence operation start stop mode control logic step procedure"
-        query_embedding = embedding_service.generate_embedding(enhanced_query)
-
-        sql = text("""
-            SELECT
-                sc.id,
-                sc.document_id,
-                sc.content,
-                sc.source_location,
-                sc.equipment_tags,
-                sd.original_filename,
-                sd.content_category,
-                1 - (sc.embedding <=> CAST(:embedding AS vector)) as similarity
-            FROM supplementary_chunks sc
-            JOIN supplementary_documents sd ON sc.document_id = sd.id
-            WHERE sc.embedding IS NOT NULL
-            AND (
-                sd.content_category = 'SEQUENCE_OF_OPERATION'
-                OR sc.content ILIKE '%sequence%'
-                OR sc.content ILIKE '%start%'
-                OR sc.content ILIKE '%stop%'
-                OR sc.content ILIKE '%mode%'
-                OR sc.content ILIKE '%operation%'
-            )
-            AND (:project_id IS NULL OR sd.project_id = :project_id)
-            ORDER BY sc.embedding <=> CAST(:embedding AS vector)
-            LIMIT 5
-        """)
+        # Ordered on the expression covered by the halfvec HNSW index; the
+        # category/keyword and project filters apply after the index scan
+        enable_hnsw_iterative_scan(db)
 
-        params = {"embedding": str(query_embedding), "project_id": project_id}
+        params = {"embedding": query_embedding, "keywords": SEQUENCE_KEYWORDS_TSQUERY}
+        if project_id:
+            sql = _SEMANTIC_SQL_WITH_PROJECT
+            params["project_id"] = project_id
+        else:
+            sql = _SEMANTIC_SQL_NO_PROJECT
 
         result = db.execute(sql, params)
 
         for row in result:
-            equipment_tag = None
-            if row.equipment_tags:
-                try:
-                    tags = json.loads(row.equipment_tags)
-                    if tags:
-                        equipment_tag = tags[0]
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
             results.append(AgentSearchResult(
-                content=(row.content[:500] if len(row.content) > 500 else row.content) if row.content else "",
+                content=row.content or "",
                 source_type="supplementary",
                 document_name=row.original_filename,
                 page_or_location=row.source_location or "",
-                equipment_tag=equipment_tag,
+                equipment_tag=row.equipment_tag,
                 relevance_score=float(row.similarity),
-                metadata={"content_category": row.content_category}
+                metadata={"content_category": row.content_category, "chunk_id": row.id}
             ))
 
         return results
@@ -1,24 +1,533 @@
-import json
+import atexit
+import hashlib
+import heapq
 import os
 import re
+import threading
 import time
 import logging
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+from operator import attrgetter
 from datetime import datetime
-from typing import List, Tuple, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import text, or_, func
+from typing import Callable, List, Sequence, Tuple, Optional
+from sqlalchemy.orm import Session, aliased, load_only, selectinload
+from sqlalchemy import String, bindparam, column, literal, literal_column, select, text, union_all, values, or_, func
+from pgvector.sqlalchemy import Vector
 
+import ahocorasick
 import anthropic
 import google.generativeai as genai
+import httpx
+import numpy as np
 
-from app.models.database import Document, Page, Equipment, EquipmentLocation, EquipmentRelationship, SupplementaryChunk, EquipmentData, SupplementaryDocument, EquipmentAlias
+from app.db.session import HNSW_EF_SEARCH
+from app.models.database import PAGE_SEARCH_TEXT_SQL, Document, Page, Equipment, EquipmentLocation, EquipmentRelationship, SupplementaryChunk, EquipmentData, SupplementaryDocument, EquipmentAlias
 from app.models.schemas import QueryType, SearchResult, SearchResponse, DocumentResponse, EquipmentBrief
 from app.services.embedding_service import embedding_service
 from app.services.extraction_service import extraction_service
 from app.services.graph_service import graph_service
+from app.services.semantic_cache import SemanticResultCache, project_cache_version
 
 logger = logging.getLogger(__name__)
 
+# Query rewrite cache: exact hits on the normalized query, then near-identical
+# paraphrases by embedding similarity. Enabled with SEARCH_QUERY_CACHE=1.
+REWRITE_CACHE_MAX_EXACT = 1024
+REWRITE_CACHE_MAX_SEMANTIC = 512
+REWRITE_CACHE_TTL_SECONDS = 3600.0
+REWRITE_CACHE_KEY = "rewrite_query"
+
+# Whole-response cache for search(), also enabled with SEARCH_QUERY_CACHE=1.
+# Paraphrase hits use a stricter threshold than the rewrite cache: a slightly
+# different question can need different sources.
+RESPONSE_CACHE_MAX_ENTRIES = 512
+RESPONSE_CACHE_TTL_SECONDS = 300.0
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = 0.97
+
+# Final ranking of merged results: "heuristic" (match-type multipliers and
+# tag/intent/snippet boosts) or "rrf" (weighted reciprocal-rank fusion of the
+# per-branch rankings, so results found by several branches rise)
+SEARCH_RANKING = os.environ.get("SEARCH_RANKING", "heuristic").lower()
+RRF_K = 60
+
+# Heuristic relevance scores are capped here; every branch can reach the cap
+SCORE_CAP = 2.0
+
+# Top results (by relevance score) handed to the cross-encoder reranker
+RERANK_CANDIDATES = 60
+
+# Per-query hnsw.ef_search is limit * multiplier (never below the connection
+# default, capped at pgvector's maximum). Larger vector tables get a larger
+# multiplier: (max rows, multiplier) tiers, then HNSW_EF_MULTIPLIER_MAX
+HNSW_EF_MULTIPLIER_TIERS = ((100_000, 4), (1_000_000, 6))
+HNSW_EF_MULTIPLIER_MAX = 8
+HNSW_EF_SEARCH_CAP = 1000
+
+# Branches that apply the per-document cap in SQL fetch limit * this many
+# candidates, so capping still leaves up to `limit` rows
+DOC_CAP_CANDIDATE_FACTOR = 3
+
+# Worker threads for the concurrent search branches (graph, fused vector
+# search, keyword, exact, text, equipment data, plus the vector search
+# redone for a rewritten query)
+SEARCH_BRANCH_WORKERS = 7
+
+# Latency budget for the LLM rewrite, from submission. The tag-dependent
+# branches (exact, text, equipment data, graph) wait up to this long for the
+# rewritten query's tags and aliases; past it search() goes ahead with the
+# original query. 0 disables rewriting.
+REWRITE_BUDGET_SECONDS = float(os.environ.get("SEARCH_REWRITE_BUDGET_SECONDS", "2.0"))
+
+# Shared HTTP/2 connection pool for the Anthropic rewrite client: keeps TLS
+# connections warm between searches and multiplexes concurrent rewrites
+REWRITE_HTTP_TIMEOUT = httpx.Timeout(10.0, connect=2.0)
+REWRITE_HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
+# LLM rewrites run here rather than on the per-search branch pool, so a slow
+# rewrite never holds up search() (it still lands in the rewrite cache)
+_REWRITE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search-rewrite")
+
+
+# Equipment tag shape used to classify a query as an equipment lookup
+_EQUIPMENT_TAG_RE = re.compile(r'\b[A-Z]{2,4}-?\d{2,4}\b', re.IGNORECASE)
+
+# Room numbers like 1-117, used for the location-intent boost
+_ROOM_NUMBER_RE = re.compile(r'\b\d-\d{3}\b')
+
+# "list all X" style phrasings; group 1 is the candidate equipment type
+_LIST_PATTERNS = tuple(re.compile(p) for p in (
+    r'list\s+(?:all\s+)?(?:the\s+)?(\w+)',
+    r'show\s+(?:me\s+)?(?:all\s+)?(?:the\s+)?(\w+)',
+    r'what\s+(?:are\s+)?(?:all\s+)?(?:the\s+)?(\w+)',
+    r'find\s+(?:all\s+)?(?:the\s+)?(\w+)',
+    r'all\s+(?:the\s+)?(\w+)\s+in',
+))
+
+# Words that put a type mention into a "list all" context
+_LIST_CONTEXT_WORDS = ('list', 'all', 'show', 'find', 'what are')
+
+# Equipment type mappings (plural/singular to type)
+_TYPE_MAPPINGS = {
+    'rtu': 'RTU', 'rtus': 'RTU', 'remote terminal unit': 'RTU', 'remote terminal units': 'RTU',
+    'pump': 'PUMP', 'pumps': 'PUMP',
+    'vfd': 'VFD', 'vfds': 'VFD', 'variable frequency drive': 'VFD', 'drives': 'VFD',
+    'motor': 'MOTOR', 'motors': 'MOTOR',
+    'fan': 'FAN', 'fans': 'FAN', 'ahu': 'FAN', 'ahus': 'FAN', 'air handler': 'FAN',
+    'breaker': 'BREAKER', 'breakers': 'BREAKER',
+    'panel': 'PANEL', 'panels': 'PANEL', 'mcc': 'PANEL', 'mccs': 'PANEL',
+    'plc': 'PLC', 'plcs': 'PLC', 'controller': 'PLC', 'controllers': 'PLC',
+    'transformer': 'TRANSFORMER', 'transformers': 'TRANSFORMER', 'xfmr': 'TRANSFORMER',
+    'sensor': 'SENSOR', 'sensors': 'SENSOR',
+    'valve': 'VALVE', 'valves': 'VALVE',
+    'rio': 'RIO', 'rios': 'RIO', 'remote io': 'RIO', 'remote i/o': 'RIO',
+}
+
+# Query classification phrases, checked in order
+_LOOKUP_PHRASES = ('where is', 'find', 'locate', 'which drawing', 'which page')
+_RELATIONSHIP_PHRASES = ('control', 'controls', 'controlled by', 'what controls')
+_UPSTREAM_DOWNSTREAM_PHRASES = ('upstream', 'downstream', 'feeds', 'powered by', 'powers')
+_WIRE_TRACE_PHRASES = ('wire', 'cable', 'conductor', 'w-')
+
+
+def _phrase_re(phrases: Tuple[str, ...]) -> "re.Pattern[str]":
+    """One alternation regex that matches wherever any phrase occurs as a substring"""
+    return re.compile("|".join(re.escape(p) for p in phrases))
+
+
+_LIST_CONTEXT_RE = _phrase_re(_LIST_CONTEXT_WORDS)
+
+# Query classification: every phrase group plus the tag pattern as named
+# alternatives, highest priority first, in one scan of the query. The
+# lookahead makes the scan test every position, so overlapping phrases are
+# all seen and the best-ranked group wins regardless of where it occurs.
+_QUERY_TYPE_GROUPS = (
+    ("lookup", QueryType.EQUIPMENT_LOOKUP, _phrase_re(_LOOKUP_PHRASES).pattern),
+    ("relationship", QueryType.RELATIONSHIP, _phrase_re(_RELATIONSHIP_PHRASES).pattern),
+    ("updown", QueryType.UPSTREAM_DOWNSTREAM, _phrase_re(_UPSTREAM_DOWNSTREAM_PHRASES).pattern),
+    ("wire", QueryType.WIRE_TRACE, _phrase_re(_WIRE_TRACE_PHRASES).pattern),
+    ("tag", QueryType.EQUIPMENT_LOOKUP, f"(?i:{_EQUIPMENT_TAG_RE.pattern})"),
+)
+_QUERY_TYPE_RE = re.compile(
+    "(?=" + "|".join(f"(?P<{name}>{pattern})" for name, _, pattern in _QUERY_TYPE_GROUPS) + ")"
+)
+_QUERY_TYPE_RANK = {name: (rank, query_type) for rank, (name, query_type, _) in enumerate(_QUERY_TYPE_GROUPS)}
+
+# Relevance scoring: match type multipliers
+_MATCH_TYPE_MULTIPLIERS = {
+    "exact": 1.5,           # Exact equipment location match
+    "text_search": 1.3,     # Found in OCR/AI analysis
+    "semantic": 1.0,        # Vector similarity
+    "keyword": 0.8,         # Basic keyword match
+    "supplementary_semantic": 1.1,  # Supplementary docs are valuable
+    "equipment_data": 1.4,  # Structured equipment data is high value
+    "graph_relationship": 1.35,  # Graph-derived relationships are highly relevant
+}
+
+# Relevance scoring: equipment data types aligned with each query intent
+_QUERY_TYPE_DATA_ALIGNMENT = {
+    QueryType.EQUIPMENT_LOOKUP: ("SPECIFICATION", "SCHEDULE_ENTRY"),
+    QueryType.RELATIONSHIP: ("SPECIFICATION",),
+    QueryType.UPSTREAM_DOWNSTREAM: ("SPECIFICATION",),
+    QueryType.WIRE_TRACE: ("IO_POINT",),
+    QueryType.GENERAL: (),
+}
+
+# Relevance scoring: words that signal a location question
+_LOCATION_INTENT_WORDS = ("where", "locate", "room")
+
+# Relevance scoring: common words ignored by the keyword boost
+_SCORING_STOP_WORDS = frozenset({"what", "where", "is", "the", "a", "an", "and", "or", "for", "to", "of", "in", "on"})
+
+# Data types recognized in equipment_data snippets ("SPECIFICATION: ...")
+_SNIPPET_DATA_TYPES = ("SPECIFICATION", "IO_POINT", "ALARM", "SCHEDULE_ENTRY", "SEQUENCE")
+
+# Keyword search: short/common words skipped when splitting the query
+_KEYWORD_STOP_WORDS = frozenset({
+    "what", "where", "is", "the", "a", "an", "and", "or", "for", "to",
+    "of", "in", "on", "how", "does", "do", "are", "this", "that", "with",
+    "from", "by", "all", "about", "which", "who", "it", "at", "be", "has"
+})
+
+
+def _result_key(result: SearchResult) -> tuple:
+    """Identity of a search result: document + source location, or document + page."""
+    if result.source_location:
+        return (result.document.id, result.source_location)
+    return (result.document.id, result.page_number)
+
+
+# classify_query and _detect_equipment_type_query are pure functions of the
+# lowercased query, memoized so repeat queries skip the phrase and regex scans
+@lru_cache(maxsize=4096)
+def _classify_query_lower(query_lower: str) -> QueryType:
+    """Query type for an already-lowercased query (see SearchService.classify_query)"""
+    best = None
+    for match in _QUERY_TYPE_RE.finditer(query_lower):
+        ranked = _QUERY_TYPE_RANK[match.lastgroup]
+        if best is None or ranked[0] < best[0]:
+            best = ranked
+            if best[0] == 0:
+                break
+
+    return best[1] if best else QueryType.GENERAL
+
+
+@lru_cache(maxsize=4096)
+def _detect_equipment_type_lower(query_lower: str) -> Optional[str]:
+    """Listed equipment type for an already-lowercased query (see SearchService._detect_equipment_type_query)"""
+    # Check for "list all" or "show all" or "what are the" patterns
+    for pattern in _LIST_PATTERNS:
+        match = pattern.search(query_lower)
+        if match:
+            potential_type = match.group(1).strip()
+            if potential_type in _TYPE_MAPPINGS:
+                return _TYPE_MAPPINGS[potential_type]
+
+    # Direct check for equipment type mentions, only in a "list all" context
+    if _LIST_CONTEXT_RE.search(query_lower):
+        for term, eq_type in _TYPE_MAPPINGS.items():
+            if term in query_lower:
+                return eq_type
+
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _query_equipment_tags(query: str) -> Tuple[str, ...]:
+    """Equipment tags found in a search query, memoized like the classifiers above"""
+    return tuple(eq.tag for eq in extraction_service.extract_equipment_tags(query))
+
+
+def _rewrite_semantic_key(query: str) -> tuple:
+    """Semantic rewrite cache key: paraphrases only share a rewrite when they
+    name the same equipment ("what controls ahu-2" must not reuse AHU-1's)"""
+    return (REWRITE_CACHE_KEY, tuple(sorted({tag.upper() for tag in _query_equipment_tags(query)})))
+
+
+# Page text matched by the text search, as the exact expression behind
+# idx_pages_search_text_trgm
+_PAGE_SEARCH_TEXT = literal_column(f"({PAGE_SEARCH_TEXT_SQL})")
+
+# Document fields DocumentResponse.from_row needs, selected as plain columns
+# so page searches don't load whole ORM entities
+_DOCUMENT_RESPONSE_COLUMNS = (
+    Document.id.label("document_id"),
+    Document.filename,
+    Document.original_filename,
+    Document.title,
+    Document.drawing_number,
+    Document.revision,
+    Document.system,
+    Document.area,
+    Document.file_size,
+    Document.page_count,
+    Document.upload_date,
+    Document.processed,
+)
+
+
+def _memo_doc_response(cache: dict, doc_id: int, build, *args, **kwargs) -> DocumentResponse:
+    """DocumentResponse for doc_id from cache, built with build(*args, **kwargs) on first use.
+
+    Result loops pass one dict per batch, so a document appearing on many
+    rows is constructed once and the results share it.
+    """
+    doc_response = cache.get(doc_id)
+    if doc_response is None:
+        doc_response = cache[doc_id] = build(*args, **kwargs)
+    return doc_response
+
+
+SNIPPET_MAX_CHARS = 1500
+CHUNK_SNIPPET_MAX_CHARS = 300
+TAG_CONTEXT_CHARS = 150
+
+
+def _tag_context_columns(column, tag, prefix: str) -> tuple:
+    """SQL columns locating tag in column and cutting the context window around it.
+
+    Only the window leaves the database; _tag_context rebuilds the snippet from
+    the match position, the full text length and the window.
+    """
+    position = func.strpos(func.lower(column), func.lower(tag))
+    start = func.greatest(position - TAG_CONTEXT_CHARS, 1)
+    return (
+        position.label(f"{prefix}_pos"),
+        func.length(column).label(f"{prefix}_len"),
+        func.substr(column, start, position - start + func.length(tag) + TAG_CONTEXT_CHARS).label(f"{prefix}_window"),
+    )
+
+
+def _tag_context(position: Optional[int], length: Optional[int], window: Optional[str], tag: str) -> str:
+    """Context snippet around a tag mention from _tag_context_columns output"""
+    if not position:
+        return ""
+
+    start = max(0, position - 1 - TAG_CONTEXT_CHARS)
+    end = min(length, position - 1 + len(tag) + TAG_CONTEXT_CHARS)
+
+    context = window.strip()
+    if start > 0:
+        context = "..." + context
+    if end < length:
+        context = context + "..."
+
+    return context
+
+
+def _log_query_cache_info() -> None:
+    logger.debug(
+        f"[SEARCH] classify_query cache: {_classify_query_lower.cache_info()}, "
+        f"equipment type cache: {_detect_equipment_type_lower.cache_info()}"
+    )
+
+
+atexit.register(_log_query_cache_info)
+
+
+def _first_line(text_chunks) -> str:
+    """Read streamed text chunks until the first non-empty line is complete."""
+    buf = ""
+    for chunk in text_chunks:
+        buf += chunk
+        stripped = buf.lstrip()
+        if "\n" in stripped:
+            return stripped.split("\n", 1)[0].strip()
+    return buf.strip()
+
+
+# Vector-search snippets are cut in SQL so full page text and chunk content
+# never leave the database: the AI analysis (when present) followed by the
+# OCR text, and the chunk content, each truncated with a flag for "..."
+_PAGE_SNIPPET_SOURCE_SQL = (
+    "CASE WHEN p.ai_analysis <> '' THEN p.ai_analysis || E'\\n\\n' || coalesce(p.ocr_text, '') "
+    "ELSE p.ocr_text END"
+)
+_KNN_SNIPPET_SQL = {
+    "page_snippet": (
+        f"left({_PAGE_SNIPPET_SOURCE_SQL}, {SNIPPET_MAX_CHARS}) AS snippet_head, "
+        f"length({_PAGE_SNIPPET_SOURCE_SQL}) > {SNIPPET_MAX_CHARS} AS snippet_truncated"
+    ),
+    "chunk_snippet": (
+        f"left(sc.content, {CHUNK_SNIPPET_MAX_CHARS}) AS snippet_head, "
+        f"length(sc.content) > {CHUNK_SNIPPET_MAX_CHARS} AS snippet_truncated"
+    ),
+}
+
+# Vector-search statements are built once at import (with and without the
+# project filter) rather than per call, so SQLAlchemy's compiled cache and
+# the driver see the same statement objects every time
+_PAGE_KNN_SQL_TEMPLATE = """
+SELECT
+    p.id,
+    p.document_id,
+    p.page_number,
+    {page_snippet},
+    d.filename,
+    d.original_filename,
+    d.title,
+    d.drawing_number,
+    d.revision,
+    d.system,
+    d.area,
+    d.file_size,
+    d.page_count,
+    d.upload_date,
+    d.processed,
+    p.embedding <=> :embedding AS distance
+FROM pages p
+JOIN documents d ON p.document_id = d.id
+WHERE p.embedding IS NOT NULL {project_filter}
+ORDER BY p.embedding::halfvec(384) <=> CAST(:embedding AS halfvec(384))
+LIMIT :limit
+"""
+
+_CHUNK_KNN_SQL_TEMPLATE = """
+SELECT
+    sc.id,
+    sc.document_id,
+    sc.chunk_index,
+    {chunk_snippet},
+    sc.source_location,
+    sc.equipment_tags::jsonb ->> 0 AS equipment_tag,
+    sd.filename,
+    sd.original_filename,
+    sd.document_type,
+    sd.project_id,
+    sd.created_at,
+    sc.embedding <=> :embedding AS distance
+FROM supplementary_chunks sc
+JOIN supplementary_documents sd ON sc.document_id = sd.id
+WHERE sc.embedding IS NOT NULL {project_filter}
+ORDER BY sc.embedding::halfvec(384) <=> CAST(:embedding AS halfvec(384))
+LIMIT :limit
+"""
+
+# Both branches expose the same columns (NULL-padded, typed for the
+# UNION); src tells the row builders apart. Page hits keep at most
+# :max_per_document pages per document out of the :page_candidates nearest,
+# ranked after the index scan so the KNN still uses the HNSW index.
+_FUSED_KNN_SQL_TEMPLATE = """
+WITH page_candidates AS (
+    SELECT
+        'pdf' AS src,
+        p.document_id,
+        p.page_number,
+        NULL::integer AS chunk_index,
+        {page_snippet},
+        NULL::varchar AS source_location,
+        NULL::text AS equipment_tag,
+        d.filename,
+        d.original_filename,
+        d.title,
+        d.drawing_number,
+        d.revision,
+        d.system,
+        d.area,
+        d.file_size,
+        d.page_count,
+        d.upload_date,
+        d.processed,
+        NULL::timestamp AS created_at,
+        p.embedding <=> :embedding AS distance
+    FROM pages p
+    JOIN documents d ON p.document_id = d.id
+    WHERE p.embedding IS NOT NULL {page_filter}
+    ORDER BY p.embedding::halfvec(384) <=> CAST(:embedding AS halfvec(384))
+    LIMIT :page_candidates
+),
+page_hits AS (
+    SELECT
+        src, document_id, page_number, chunk_index, snippet_head, snippet_truncated, source_location,
+        equipment_tag, filename, original_filename, title, drawing_number, revision, system, area,
+        file_size, page_count, upload_date, processed, created_at, distance
+    FROM (
+        SELECT
+            page_candidates.*,
+            row_number() OVER (PARTITION BY document_id ORDER BY distance) AS doc_rank
+        FROM page_candidates
+    ) ranked
+    WHERE doc_rank <= :max_per_document
+    ORDER BY distance
+    LIMIT :page_limit
+),
+chunk_hits AS (
+    SELECT
+        'supp' AS src,
+        sc.document_id,
+        NULL::integer AS page_number,
+        sc.chunk_index,
+        {chunk_snippet},
+        sc.source_location,
+        sc.equipment_tags::jsonb ->> 0 AS equipment_tag,
+        sd.filename,
+        sd.original_filename,
+        NULL::varchar AS title,
+        NULL::varchar AS drawing_number,
+        NULL::varchar AS revision,
+        NULL::varchar AS system,
+        NULL::varchar AS area,
+        NULL::integer AS file_size,
+        NULL::integer AS page_count,
+        NULL::timestamp AS upload_date,
+        NULL::integer AS processed,
+        sd.created_at,
+        sc.embedding <=> :embedding AS distance
+    FROM supplementary_chunks sc
+    JOIN supplementary_documents sd ON sc.document_id = sd.id
+    WHERE sc.embedding IS NOT NULL {chunk_filter}
+    ORDER BY sc.embedding::halfvec(384) <=> CAST(:embedding AS halfvec(384))
+    LIMIT :chunk_limit
+)
+SELECT * FROM page_hits
+UNION ALL
+SELECT * FROM chunk_hits
+"""
+
+_PAGE_KNN_SQL_NO_PROJECT = text(
+    _PAGE_KNN_SQL_TEMPLATE.format(project_filter="", **_KNN_SNIPPET_SQL)
+).bindparams(bindparam("embedding", type_=Vector(384)))
+
+_PAGE_KNN_SQL_WITH_PROJECT = text(
+    _PAGE_KNN_SQL_TEMPLATE.format(project_filter="AND d.project_id = :project_id", **_KNN_SNIPPET_SQL)
+).bindparams(bindparam("embedding", type_=Vector(384)))
+
+_CHUNK_KNN_SQL_NO_PROJECT = text(
+    _CHUNK_KNN_SQL_TEMPLATE.format(project_filter="", **_KNN_SNIPPET_SQL)
+).bindparams(bindparam("embedding", type_=Vector(384)))
+
+_CHUNK_KNN_SQL_WITH_PROJECT = text(
+    _CHUNK_KNN_SQL_TEMPLATE.format(project_filter="AND sd.project_id = :project_id", **_KNN_SNIPPET_SQL)
+).bindparams(bindparam("embedding", type_=Vector(384)))
+
+_FUSED_KNN_SQL_NO_PROJECT = text(
+    _FUSED_KNN_SQL_TEMPLATE.format(page_filter="", chunk_filter="", **_KNN_SNIPPET_SQL)
+).bindparams(bindparam("embedding", type_=Vector(384)))
+
+_FUSED_KNN_SQL_WITH_PROJECT = text(
+    _FUSED_KNN_SQL_TEMPLATE.format(
+        page_filter="AND d.project_id = :project_id", chunk_filter="AND sd.project_id = :project_id",
+        **_KNN_SNIPPET_SQL
+    )
+).bindparams(bindparam("embedding", type_=Vector(384)))
+
+
+def auto_tune_hnsw(vector_count: float) -> int:
+    """Pick the ef_search-per-result multiplier for a vector table of vector_count rows."""
+    for max_rows, multiplier in HNSW_EF_MULTIPLIER_TIERS:
+        if vector_count < max_rows:
+            return multiplier
+    return HNSW_EF_MULTIPLIER_MAX
+
+
+def _is_word_boundary(text: str, pos: int) -> bool:
+    """Same test as regex \\b: word-ness differs on either side of pos."""
+    before = pos > 0 and (text[pos - 1].isalnum() or text[pos - 1] == "_")
+    after = pos < len(text) and (text[pos].isalnum() or text[pos] == "_")
+    return before != after
+
 # Query rewriting prompt
 QUERY_REWRITE_PROMPT = """You are a search query optimizer for an industrial equipment documentation system.
 
@@ -80,13 +589,41 @@ class SearchService:
         self.gemini_model = None
         self._init_llm_client()
 
+        self.query_cache_enabled = os.environ.get("SEARCH_QUERY_CACHE", "0") == "1"
+        self._rewrite_exact_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._rewrite_exact_lock = threading.Lock()
+        self._rewrite_semantic_cache = SemanticResultCache(
+            ttl_seconds=REWRITE_CACHE_TTL_SECONDS,
+            max_entries_per_key=REWRITE_CACHE_MAX_SEMANTIC,
+            max_entries=REWRITE_CACHE_MAX_SEMANTIC
+        )
+
+        self._response_cache: "OrderedDict[bytes, Tuple[float, SearchResponse]]" = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+        self._response_semantic_cache = SemanticResultCache(
+            threshold=RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+            ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+            max_entries_per_key=RESPONSE_CACHE_MAX_ENTRIES,
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES
+        )
+
+        # project_id -> (project cache version, automaton or None)
+        self._alias_automata: dict = {}
+        self._alias_automata_lock = threading.Lock()
+
+        # Set from pg_class.reltuples on the first vector search
+        self._hnsw_ef_multiplier: Optional[int] = None
+
     def _init_llm_client(self):
         """Initialize LLM client for query rewriting"""
         if self.provider == "claude":
             api_key = os.environ.get("ANTHROPIC_API_KEY")
             if api_key:
-                self.anthropic_client = anthropic.Anthropic(api_key=api_key)
+                http_client = httpx.Client(http2=True, timeout=REWRITE_HTTP_TIMEOUT, limits=REWRITE_HTTP_LIMITS)
+                atexit.register(http_client.close)
+                self.anthropic_client = anthropic.Anthropic(api_key=api_key, http_client=http_client)
         elif self.provider == "gemini":
+            # The Gemini SDK's default gRPC transport already keeps a pooled, multiplexed channel
             api_key = os.environ.get("GEMINI_API_KEY")
             if api_key:
                 genai.configure(api_key=api_key)
@@ -96,6 +633,92 @@ class SearchService:
         """Check if LLM is available for query rewriting"""
         return self.anthropic_client is not None or self.gemini_model is not None
 
+    def _get_cached_response(self, exact_key: bytes, semantic_key: tuple, get_query_embedding: Callable[[], List[float]]) -> Optional[SearchResponse]:
+        """Look up a cached search response by exact key, then by query similarity.
+
+        The query is only embedded (get_query_embedding) when the exact key misses.
+        """
+        now = time.monotonic()
+        with self._response_cache_lock:
+            entry = self._response_cache.get(exact_key)
+            if entry is not None:
+                created, response = entry
+                if now - created <= RESPONSE_CACHE_TTL_SECONDS:
+                    self._response_cache.move_to_end(exact_key)
+                    return response
+                del self._response_cache[exact_key]
+
+        cached = self._response_semantic_cache.get(semantic_key, get_query_embedding())
+        return cached[0] if cached else None
+
+    def _store_response(self, exact_key: bytes, semantic_key: tuple, query_embedding: List[float], response: SearchResponse) -> None:
+        """Insert a search response into both response cache tiers."""
+        with self._response_cache_lock:
+            self._response_cache[exact_key] = (time.monotonic(), response)
+            self._response_cache.move_to_end(exact_key)
+            while len(self._response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+                self._response_cache.popitem(last=False)
+        # semantic_key leads with (project version, project id); a new version
+        # drops the project's stale entries
+        project_version, project_id = semantic_key[:2]
+        self._response_semantic_cache.put(
+            semantic_key, query_embedding, [response], project=project_id, version=project_version
+        )
+
+    def clear_response_cache(self) -> None:
+        """Drop cached search responses (e.g. after new documents are ingested)."""
+        with self._response_cache_lock:
+            self._response_cache.clear()
+        self._response_semantic_cache.clear()
+
+    def _await_rewrite(self, rewrite_future: Future, deadline: float, original_query: str) -> str:
+        """Wait for a rewrite until deadline (time.monotonic()).
+
+        Returns the rewritten query, or original_query if the rewrite did not
+        arrive in time. A late rewrite is only worth finishing when it can
+        land in the rewrite cache; otherwise it is cancelled if not yet started.
+        """
+        wait([rewrite_future], timeout=max(0.0, deadline - time.monotonic()))
+        if not rewrite_future.done():
+            logger.debug("[SEARCH] Query rewrite over budget, using original query")
+            if not self.query_cache_enabled:
+                rewrite_future.cancel()
+            return original_query
+        search_query, _ = rewrite_future.result()
+        return search_query
+
+    def _get_cached_rewrite(self, key: str) -> Tuple[Optional[str], Optional[List[float]]]:
+        """Look up a cached rewrite for a normalized query.
+
+        Returns (rewritten, key_embedding). The embedding is computed on an
+        exact-cache miss and handed back so the caller can reuse it to store
+        a fresh rewrite.
+        """
+        now = time.monotonic()
+        with self._rewrite_exact_lock:
+            entry = self._rewrite_exact_cache.get(key)
+            if entry is not None:
+                created, rewritten = entry
+                if now - created <= REWRITE_CACHE_TTL_SECONDS:
+                    self._rewrite_exact_cache.move_to_end(key)
+                    return rewritten, None
+                del self._rewrite_exact_cache[key]
+
+        key_embedding = list(embedding_service.generate_query_embedding(key))
+        cached = self._rewrite_semantic_cache.get(_rewrite_semantic_key(key), key_embedding)
+        if cached:
+            self._store_exact_rewrite(key, cached[0])
+            return cached[0], key_embedding
+        return None, key_embedding
+
+    def _store_exact_rewrite(self, key: str, rewritten: str) -> None:
+        """Insert into the exact-match rewrite cache, evicting the LRU entry."""
+        with self._rewrite_exact_lock:
+            self._rewrite_exact_cache[key] = (time.monotonic(), rewritten)
+            self._rewrite_exact_cache.move_to_end(key)
+            while len(self._rewrite_exact_cache) > REWRITE_CACHE_MAX_EXACT:
+                self._rewrite_exact_cache.popitem(last=False)
+
     def rewrite_query(self, original_query: str) -> Tuple[str, str]:
         """
         Use LLM to rewrite/expand the query for better search results.
@@ -110,24 +733,37 @@ class SearchService:
         if not self._has_llm():
             return original_query, original_query
 
+        cache_key = None
+        key_embedding = None
+        if self.query_cache_enabled:
+            cache_key = " ".join(original_query.lower().split())
+            cached, key_embedding = self._get_cached_rewrite(cache_key)
+            if cached is not None:
+                logger.debug(f"[SEARCH] Query rewrite cache hit: '{original_query}' → '{cached}'")
+                return cached, original_query
+
         try:
             user_prompt = f"User query: {original_query}"
 
+            # The prompt asks for a single line, so stream and stop reading at
+            # the first newline instead of waiting for the full response
             if self.provider == "gemini" and self.gemini_model:
                 response = self.gemini_model.generate_content(
                     f"{QUERY_REWRITE_PROMPT}\n\n{user_prompt}",
-                    generation_config={"max_output_tokens": 100, "temperature": 0.1}
+                    generation_config={"max_output_tokens": 100, "temperature": 0.1, "stop_sequences": ["\n"]},
+                    stream=True
                 )
-                rewritten = response.text.strip()
+                rewritten = _first_line(chunk.text for chunk in response)
             elif self.anthropic_client:
-                response = self.anthropic_client.messages.create(
+                with self.anthropic_client.messages.stream(
                     model="claude-sonnet-4-20250514",
                     max_tokens=100,
                     temperature=0,
+                    stop_sequences=["\n"],
                     system=QUERY_REWRITE_PROMPT,
                     messages=[{"role": "user", "content": user_prompt}]
-                )
-                rewritten = response.content[0].text.strip()
+                ) as stream:
+                    rewritten = _first_line(stream.text_stream)
             else:
                 return original_query, original_query
 
@@ -140,6 +776,9 @@ class SearchService:
                 return original_query, original_query
 
             logger.debug(f"[SEARCH] Query rewritten: '{original_query}' → '{rewritten}'")
+            if cache_key is not None:
+                self._store_exact_rewrite(cache_key, rewritten)
+                self._rewrite_semantic_cache.put(_rewrite_semantic_key(cache_key), key_embedding, [rewritten])
             return rewritten, original_query
 
         except Exception as e:
@@ -148,26 +787,7 @@ class SearchService:
 
     def classify_query(self, query: str) -> QueryType:
         """Determine the type of query"""
-        query_lower = query.lower()
-
-        has_equipment_tag = bool(re.search(r'\b[A-Z]{2,4}-?\d{2,4}\b', query, re.IGNORECASE))
-
-        if any(word in query_lower for word in ['where is', 'find', 'locate', 'which drawing', 'which page']):
-            return QueryType.EQUIPMENT_LOOKUP
-
-        if any(word in query_lower for word in ['control', 'controls', 'controlled by', 'what controls']):
-            return QueryType.RELATIONSHIP
-
-        if any(word in query_lower for word in ['upstream', 'downstream', 'feeds', 'powered by', 'powers']):
-            return QueryType.UPSTREAM_DOWNSTREAM
-
-        if any(word in query_lower for word in ['wire', 'cable', 'conductor', 'w-']):
-            return QueryType.WIRE_TRACE
-
-        if has_equipment_tag:
-            return QueryType.EQUIPMENT_LOOKUP
-
-        return QueryType.GENERAL
+        return _classify_query_lower(query.lower())
 
     def expand_equipment_tags_with_aliases(self, db: Session, tags: List[str], project_id: int = None) -> List[str]:
         """
@@ -177,50 +797,43 @@ class SearchService:
         1. Find if it's a canonical equipment tag -> get all its aliases
         2. Find if it's an alias -> get the canonical tag and all other aliases
 
+        Both cases are resolved for all tags at once in two queries.
+
         Returns a deduplicated list of all tags to search for.
         """
-        expanded_tags = set(tags)  # Start with original tags
-
-        for tag in tags:
-            tag_upper = tag.upper()
+        tags_upper = {tag.upper() for tag in tags}
+        expanded_tags = []  # Uppercased canonical tags and aliases of matched equipment
 
-            # 1. Check if this tag is a canonical equipment tag
-            equipment_query = db.query(Equipment).filter(
-                func.upper(Equipment.tag) == tag_upper
+        # 1. Equipment whose canonical tag or any alias matches one of the tags
+        match_query = db.query(Equipment.id).outerjoin(
+            EquipmentAlias, EquipmentAlias.equipment_id == Equipment.id
+        ).filter(
+            or_(
+                func.upper(Equipment.tag).in_(tags_upper),
+                func.upper(EquipmentAlias.alias).in_(tags_upper)
             )
-            if project_id:
-                equipment_query = equipment_query.filter(Equipment.project_id == project_id)
-            equipment = equipment_query.first()
-
-            if equipment:
-                # Get all aliases for this equipment
-                aliases = db.query(EquipmentAlias).filter(
-                    EquipmentAlias.equipment_id == equipment.id
-                ).all()
-                for alias in aliases:
-                    expanded_tags.add(alias.alias.upper())
-
-            # 2. Check if this tag is an alias
-            alias_matches = db.query(EquipmentAlias).filter(
-                func.upper(EquipmentAlias.alias) == tag_upper
-            ).all()
-
-            for alias_match in alias_matches:
-                # Get the canonical equipment
-                eq = db.query(Equipment).filter(Equipment.id == alias_match.equipment_id).first()
-                if eq:
-                    expanded_tags.add(eq.tag.upper())
-                    # Also get all other aliases for this equipment
-                    other_aliases = db.query(EquipmentAlias).filter(
-                        EquipmentAlias.equipment_id == eq.id
-                    ).all()
-                    for other_alias in other_aliases:
-                        expanded_tags.add(other_alias.alias.upper())
-
-        # Return as list, preserving original tags first
+        )
+        if project_id:
+            match_query = match_query.filter(Equipment.project_id == project_id)
+        equipment_ids = {row.id for row in match_query.distinct()}
+
+        # 2. Canonical tag and every alias of the matched equipment
+        if equipment_ids:
+            names = db.query(Equipment.tag, EquipmentAlias.alias).outerjoin(
+                EquipmentAlias, EquipmentAlias.equipment_id == Equipment.id
+            ).filter(Equipment.id.in_(equipment_ids))
+            for eq_tag, alias in names:
+                expanded_tags.append(eq_tag.upper())
+                if alias:
+                    expanded_tags.append(alias.upper())
+
+        # Return as list, preserving original tags first; the uppercased view
+        # of what is already in the result makes each check a hash lookup
         result = list(tags)  # Original tags first
+        result_upper = set(tags_upper)
         for t in expanded_tags:
-            if t not in [x.upper() for x in result]:
+            if t not in result_upper:
+                result_upper.add(t)
                 result.append(t)
 
         return result
@@ -235,48 +848,7 @@ class SearchService:
         - "what are the pumps in the project" -> "PUMP"
         - "show me all VFDs" -> "VFD"
         """
-        query_lower = query.lower()
-
-        # Check for "list all" or "show all" or "what are the" patterns
-        list_patterns = [
-            r'list\s+(?:all\s+)?(?:the\s+)?(\w+)',
-            r'show\s+(?:me\s+)?(?:all\s+)?(?:the\s+)?(\w+)',
-            r'what\s+(?:are\s+)?(?:all\s+)?(?:the\s+)?(\w+)',
-            r'find\s+(?:all\s+)?(?:the\s+)?(\w+)',
-            r'all\s+(?:the\s+)?(\w+)\s+in',
-        ]
-
-        # Equipment type mappings (plural/singular to type)
-        type_mappings = {
-            'rtu': 'RTU', 'rtus': 'RTU', 'remote terminal unit': 'RTU', 'remote terminal units': 'RTU',
-            'pump': 'PUMP', 'pumps': 'PUMP',
-            'vfd': 'VFD', 'vfds': 'VFD', 'variable frequency drive': 'VFD', 'drives': 'VFD',
-            'motor': 'MOTOR', 'motors': 'MOTOR',
-            'fan': 'FAN', 'fans': 'FAN', 'ahu': 'FAN', 'ahus': 'FAN', 'air handler': 'FAN',
-            'breaker': 'BREAKER', 'breakers': 'BREAKER',
-            'panel': 'PANEL', 'panels': 'PANEL', 'mcc': 'PANEL', 'mccs': 'PANEL',
-            'plc': 'PLC', 'plcs': 'PLC', 'controller': 'PLC', 'controllers': 'PLC',
-            'transformer': 'TRANSFORMER', 'transformers': 'TRANSFORMER', 'xfmr': 'TRANSFORMER',
-            'sensor': 'SENSOR', 'sensors': 'SENSOR',
-            'valve': 'VALVE', 'valves': 'VALVE',
-            'rio': 'RIO', 'rios': 'RIO', 'remote io': 'RIO', 'remote i/o': 'RIO',
-        }
-
-        for pattern in list_patterns:
-            match = re.search(pattern, query_lower)
-            if match:
-                potential_type = match.group(1).strip()
-                if potential_type in type_mappings:
-                    return type_mappings[potential_type]
-
-        # Direct check for equipment type mentions
-        for term, eq_type in type_mappings.items():
-            if term in query_lower:
-                # Make sure it's a "list all" context
-                if any(p in query_lower for p in ['list', 'all', 'show', 'find', 'what are']):
-                    return eq_type
-
-        return None
+        return _detect_equipment_type_lower(query.lower())
 
     def _search_equipment_by_type(self, db: Session, equipment_type: str, limit: int = 50, project_id: int = None) -> List[SearchResult]:
         """
@@ -286,10 +858,11 @@ class SearchService:
         results = []
 
         # Query equipment by type or by tag pattern
-        eq_query = db.query(Equipment).filter(
+        eq_query = db.query(Equipment.id, Equipment.tag, Equipment.equipment_type).filter(
+            # The substring match also covers tags that start with the type;
+            # equipment_type uses its B-tree index, the tag ILIKE the trigram index
             or_(
                 Equipment.equipment_type == equipment_type,
-                Equipment.tag.ilike(f'{equipment_type}%'),
                 Equipment.tag.ilike(f'%{equipment_type}%')
             )
         )
@@ -300,75 +873,96 @@ class SearchService:
 
         logger.debug(f"[SEARCH] Found {len(equipment_list)} equipment of type {equipment_type}")
 
-        for equipment in equipment_list:
-            # Get locations for this equipment
-            loc_query = db.query(EquipmentLocation).filter(
-                EquipmentLocation.equipment_id == equipment.id
-            ).join(Page).join(Document)
+        # Locations for all matched equipment in one statement, capped at 3
+        # per equipment in SQL; only the page number and document columns
+        # are read, never full page rows
+        equipment_locations = defaultdict(list)
+        if equipment_list:
+            ranked = db.query(
+                EquipmentLocation.equipment_id,
+                EquipmentLocation.context_text,
+                Page.page_number,
+                *_DOCUMENT_RESPONSE_COLUMNS,
+                func.row_number().over(
+                    partition_by=EquipmentLocation.equipment_id, order_by=EquipmentLocation.id
+                ).label("location_rank")
+            ).select_from(EquipmentLocation).join(
+                Page, EquipmentLocation.page_id == Page.id
+            ).join(Document, Page.document_id == Document.id).filter(
+                EquipmentLocation.equipment_id.in_([equipment.id for equipment in equipment_list])
+            )
+            if project_id is not None:
+                ranked = ranked.filter(Document.project_id == project_id)
+            ranked = ranked.subquery()
+            for row in db.query(ranked).filter(ranked.c.location_rank <= 3).order_by(
+                ranked.c.equipment_id, ranked.c.location_rank
+            ):
+                equipment_locations[row.equipment_id].append(row)
+
+        # No PDF location, but equipment exists - try to find in supplementary
+        # docs, with one query for all equipment missing locations
+        missing_tags = list(dict.fromkeys(eq.tag for eq in equipment_list if not equipment_locations[eq.id]))
+        eq_data_by_tag = {}
+        if missing_tags:
+            # Entries are ranked per missing tag in SQL, so a short tag that
+            # matches many entries (P-1 in P-10..P-19) cannot crowd out the rest
+            tag_values = values(column("tag", String), name="missing_tags").data([(tag,) for tag in missing_tags])
+            ranked = select(
+                EquipmentData.id,
+                tag_values.c.tag,
+                func.row_number().over(partition_by=tag_values.c.tag, order_by=EquipmentData.id).label("tag_rank")
+            ).select_from(EquipmentData).join(
+                tag_values, EquipmentData.equipment_tag.ilike(literal("%") + tag_values.c.tag + literal("%"))
+            ).join(SupplementaryDocument)
             if project_id is not None:
-                loc_query = loc_query.filter(Document.project_id == project_id)
-            locations = loc_query.limit(3).all()  # Limit locations per equipment
+                ranked = ranked.filter(SupplementaryDocument.project_id == project_id)
+            ranked = ranked.subquery()
+
+            eq_data_query = db.query(EquipmentData, ranked.c.tag).join(
+                ranked, EquipmentData.id == ranked.c.id
+            ).options(
+                load_only(
+                    EquipmentData.id, EquipmentData.document_id, EquipmentData.equipment_tag,
+                    EquipmentData.data_type, EquipmentData.snippet_preview, EquipmentData.source_location
+                ),
+                selectinload(EquipmentData.document)
+            ).filter(ranked.c.tag_rank == 1)  # Only the first entry per tag is used
+            for entry, tag in eq_data_query:
+                eq_data_by_tag[tag] = entry
+
+        doc_responses = {}
+        supplementary_doc_responses = {}
+        for equipment in equipment_list:
+            locations = equipment_locations[equipment.id]
 
             if locations:
                 for loc in locations:
-                    page = loc.page
-                    doc = page.document
-
-                    doc_response = DocumentResponse(
-                        id=doc.id,
-                        filename=doc.filename,
-                        original_filename=doc.original_filename,
-                        title=doc.title,
-                        drawing_number=doc.drawing_number,
-                        revision=doc.revision,
-                        system=doc.system,
-                        area=doc.area,
-                        file_size=doc.file_size,
-                        page_count=doc.page_count,
-                        upload_date=doc.upload_date,
-                        processed=doc.processed
-                    )
+                    doc_response = _memo_doc_response(doc_responses, loc.document_id, DocumentResponse.from_row, loc)
 
                     results.append(SearchResult(
                         equipment=EquipmentBrief(id=equipment.id, tag=equipment.tag, equipment_type=equipment.equipment_type),
                         document=doc_response,
-                        page_number=page.page_number,
+                        page_number=loc.page_number,
                         relevance_score=1.0,  # High relevance for direct equipment type match
                         snippet=loc.context_text or f"Equipment {equipment.tag} found on this page",
                         match_type="equipment_type_search"
                     ))
             else:
-                # No PDF location, but equipment exists - create a placeholder result
-                # Try to find in supplementary docs
-                eq_data = db.query(EquipmentData).join(SupplementaryDocument).filter(
-                    EquipmentData.equipment_tag.ilike(f'%{equipment.tag}%')
-                )
-                if project_id is not None:
-                    eq_data = eq_data.filter(SupplementaryDocument.project_id == project_id)
-                eq_data = eq_data.first()
+                # No PDF location - create a placeholder result from supplementary data
+                eq_data = eq_data_by_tag.get(equipment.tag)
 
                 if eq_data:
                     doc = eq_data.document
-                    doc_response = DocumentResponse(
-                        id=doc.id,
-                        filename=doc.filename,
-                        original_filename=doc.original_filename,
-                        title=doc.original_filename,
-                        drawing_number=None,
-                        revision=None,
-                        system=None,
-                        area=None,
-                        file_size=doc.file_size,
-                        page_count=1,
-                        upload_date=doc.created_at,
-                        processed=doc.processed
+                    doc_response = _memo_doc_response(
+                        supplementary_doc_responses, doc.id, DocumentResponse.from_supplementary,
+                        doc.id, doc.filename, doc.original_filename,
+                        upload_date=doc.created_at, processed=doc.processed, file_size=doc.file_size
                     )
 
-                    # Build snippet from data
-                    try:
-                        data = json.loads(eq_data.data_json)
-                        snippet = f"{eq_data.data_type}: " + ", ".join(f"{k}={v}" for k, v in list(data.items())[:5])
-                    except (json.JSONDecodeError, TypeError):
+                    # Build snippet from the preview rendered at insert time
+                    if eq_data.snippet_preview is not None:
+                        snippet = f"{eq_data.data_type}: {eq_data.snippet_preview}"
+                    else:
                         snippet = f"{equipment.tag} - {eq_data.data_type}"
 
                     results.append(SearchResult(
@@ -383,59 +977,85 @@ class SearchService:
 
         return results
 
-    def _find_aliases_in_query(self, db: Session, query: str, project_id: int = None) -> List[str]:
+    def _find_aliases_in_query(self, db: Session, queries: List[str], project_id: int = None) -> List[str]:
         """
-        Search for equipment aliases mentioned in the query text.
+        Search for equipment aliases mentioned in any of the query texts.
 
         This catches cases where users type descriptions like:
         - "Air Handling Unit 1" -> matches alias -> returns "AHU-1"
         - "Supply Fan" -> matches alias -> returns "SF-1"
+
+        All queries are scanned with one automaton lookup; tags come back in
+        first-seen order across the queries.
+        """
+        automaton = self._get_alias_automaton(db, project_id)
+        if automaton is None:
+            return []
+
+        found_tags = {}  # dict keeps first-seen order
+        for query in dict.fromkeys(queries):
+            query_upper = query.upper()
+            for end, (alias_upper, matches) in automaton.iter(query_upper):
+                start = end - len(alias_upper) + 1
+                # Short alias - need word boundary; longer alias - substring match is fine
+                if len(alias_upper) <= 5 and not (
+                    _is_word_boundary(query_upper, start) and _is_word_boundary(query_upper, end + 1)
+                ):
+                    continue
+                for alias, tag in matches:
+                    if tag not in found_tags:
+                        found_tags[tag] = None
+                        logger.debug(f"[SEARCH] Alias match: '{alias}' -> {tag}")
+
+        return list(found_tags)
+
+    def _get_alias_automaton(self, db: Session, project_id: int = None):
+        """Return the Aho-Corasick automaton over a project's aliases, or None if it has none.
+
+        Automata are cached per project and rebuilt when the project cache
+        version changes.
         """
-        found_tags = []
-        query_upper = query.upper()
+        version = project_cache_version(db, project_id)
+
+        cache_key = project_id or None
+        with self._alias_automata_lock:
+            cached = self._alias_automata.get(cache_key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
 
         # Get all aliases (with their equipment tags)
-        alias_query = db.query(EquipmentAlias, Equipment).join(
+        alias_query = db.query(EquipmentAlias.alias, Equipment.tag).join(
             Equipment, EquipmentAlias.equipment_id == Equipment.id
         )
         if project_id:
             alias_query = alias_query.filter(Equipment.project_id == project_id)
 
-        # Check each alias against the query
-        for alias, equipment in alias_query.all():
-            alias_upper = alias.alias.upper()
-            # Check if alias appears in query (as whole word/phrase)
+        words: dict[str, list] = {}
+        for alias, tag in alias_query:
+            alias_upper = alias.upper()
             if len(alias_upper) >= 3:  # Only check aliases with 3+ chars to avoid false matches
-                # Use word boundary matching for short aliases, substring for longer ones
-                if len(alias_upper) <= 5:
-                    # Short alias - need word boundary
-                    pattern = r'\b' + re.escape(alias_upper) + r'\b'
-                    if re.search(pattern, query_upper):
-                        if equipment.tag not in found_tags:
-                            found_tags.append(equipment.tag)
-                            logger.debug(f"[SEARCH] Alias match: '{alias.alias}' -> {equipment.tag}")
-                else:
-                    # Longer alias - substring match is fine
-                    if alias_upper in query_upper:
-                        if equipment.tag not in found_tags:
-                            found_tags.append(equipment.tag)
-                            logger.debug(f"[SEARCH] Alias match: '{alias.alias}' -> {equipment.tag}")
+                words.setdefault(alias_upper, []).append((alias, tag))
+
+        automaton = None
+        if words:
+            automaton = ahocorasick.Automaton()
+            for alias_upper, matches in words.items():
+                automaton.add_word(alias_upper, (alias_upper, matches))
+            automaton.make_automaton()
 
-        return found_tags
+        with self._alias_automata_lock:
+            self._alias_automata[cache_key] = (version, automaton)
+        return automaton
 
-    def _calculate_relevance_score(
+    def _calculate_relevance_scores(
         self,
-        base_score: float,
-        match_type: str,
+        results: List[SearchResult],
         query: str,
         query_type: QueryType,
-        equipment_tags: List[str],
-        result_equipment_tag: str = None,
-        snippet: str = None,
-        data_type: str = None
-    ) -> float:
+        equipment_tags: List[str]
+    ) -> np.ndarray:
         """
-        Calculate enhanced relevance score based on multiple factors.
+        Calculate enhanced relevance scores for all results at once.
 
         Factors:
         1. Base score from search method
@@ -443,88 +1063,90 @@ class SearchService:
         3. Equipment tag match boost
         4. Query type alignment boost
         5. Snippet quality boost
+
+        Query-level work (keywords, intent, tag set) is done once; the per-result
+        factors are gathered in one pass and combined with NumPy.
         """
-        score = base_score
-
-        # 1. Match type multiplier
-        match_type_multipliers = {
-            "exact": 1.5,           # Exact equipment location match
-            "text_search": 1.3,     # Found in OCR/AI analysis
-            "semantic": 1.0,        # Vector similarity
-            "keyword": 0.8,         # Basic keyword match
-            "supplementary_semantic": 1.1,  # Supplementary docs are valuable
-            "equipment_data": 1.4,  # Structured equipment data is high value
-            "graph_relationship": 1.35,  # Graph-derived relationships are highly relevant
-        }
-        multiplier = match_type_multipliers.get(match_type, 1.0)
-        score *= multiplier
-
-        # 2. Equipment tag match boost - if result contains a queried equipment tag
-        if result_equipment_tag and equipment_tags:
-            tag_upper = result_equipment_tag.upper()
-            if any(tag_upper == et.upper() for et in equipment_tags):
-                score *= 2.0  # Significant boost for direct equipment match (ensures plan pages are prioritized)
-
-        # 3. Query type alignment boost
-        if data_type:
-            # Boost when data type matches query intent
-            query_type_data_alignment = {
-                QueryType.EQUIPMENT_LOOKUP: ["SPECIFICATION", "SCHEDULE_ENTRY"],
-                QueryType.RELATIONSHIP: ["SPECIFICATION"],
-                QueryType.UPSTREAM_DOWNSTREAM: ["SPECIFICATION"],
-                QueryType.WIRE_TRACE: ["IO_POINT"],
-                QueryType.GENERAL: [],
-            }
-            aligned_types = query_type_data_alignment.get(query_type, [])
-            if data_type in aligned_types:
-                score *= 1.2  # 20% boost for aligned data type
-
-        # 3b. Location Intent Boost - if query is about location, boost Plan/PID pages over Schedules
-        if query_type == QueryType.EQUIPMENT_LOOKUP and any(word in query.lower() for word in ["where", "locate", "room"]):
-            # If we could detect drawing type here, we would boost 'PID' or 'GENERAL' (usually plans)
-            # For now, we boost if the snippet contains room-like patterns
-            if re.search(r'\b\d-\d{3}\b', snippet or ""): # Matches room numbers like 1-117
-                score *= 1.4
-
-        # 4. Query keyword boost - check if query keywords appear in snippet
-        if snippet:
-            query_words = set(query.lower().split())
-            # Remove common words
-            stop_words = {"what", "where", "is", "the", "a", "an", "and", "or", "for", "to", "of", "in", "on"}
-            query_words -= stop_words
+        count = len(results)
+        base = np.fromiter((r.relevance_score for r in results), dtype=np.float64, count=count)
+        if count == 0:
+            return base
 
+        equipment_tags_upper = {tag.upper() for tag in equipment_tags}
+        aligned_types = _QUERY_TYPE_DATA_ALIGNMENT.get(query_type, ())
+        query_lower = query.lower()
+        location_intent = query_type == QueryType.EQUIPMENT_LOOKUP and any(
+            word in query_lower for word in _LOCATION_INTENT_WORDS
+        )
+        # Remove common words
+        query_words = set(query_lower.split()) - _SCORING_STOP_WORDS
+
+        multiplier = np.empty(count)
+        tag_match = np.zeros(count, dtype=bool)
+        aligned = np.zeros(count, dtype=bool)
+        room_match = np.zeros(count, dtype=bool)
+        keyword_matches = np.zeros(count)
+        snippet_len = np.full(count, -1.0)  # -1 = no snippet
+
+        for i, result in enumerate(results):
+            multiplier[i] = _MATCH_TYPE_MULTIPLIERS.get(result.match_type, 1.0)
+            if result.equipment and equipment_tags_upper:
+                tag_match[i] = result.equipment.tag.upper() in equipment_tags_upper
+
+            snippet = result.snippet
+            if not snippet:
+                continue
+            # Data type is only known for equipment_data results, from the
+            # snippet prefix (e.g., "SPECIFICATION: ..." or "IO_POINT: ...")
+            if aligned_types and result.match_type == "equipment_data":
+                snippet_upper = snippet.upper()
+                data_type = next((dt for dt in _SNIPPET_DATA_TYPES if dt in snippet_upper), None)
+                aligned[i] = data_type in aligned_types
+            # Location intent: boost snippets with room numbers like 1-117
+            if location_intent:
+                room_match[i] = _ROOM_NUMBER_RE.search(snippet) is not None
             snippet_lower = snippet.lower()
-            matches = sum(1 for word in query_words if word in snippet_lower)
-            if matches > 0:
-                keyword_boost = min(1.0 + (matches * 0.1), 1.5)  # Up to 50% boost
-                score *= keyword_boost
-
-        # 5. Snippet quality - penalize very short snippets
-        if snippet:
-            if len(snippet) < 50:
-                score *= 0.8  # Penalize very short snippets
-            elif len(snippet) > 200:
-                score *= 1.1  # Boost substantial snippets
+            keyword_matches[i] = sum(1 for word in query_words if word in snippet_lower)
+            snippet_len[i] = len(snippet)
+
+        score = base * multiplier
+        # Significant boost for direct equipment match (ensures plan pages are prioritized)
+        score *= np.where(tag_match, 2.0, 1.0)
+        # 20% boost for data type aligned with query intent
+        score *= np.where(aligned, 1.2, 1.0)
+        score *= np.where(room_match, 1.4, 1.0)
+        # Query keywords in snippet: up to 50% boost
+        score *= np.minimum(1.0 + keyword_matches * 0.1, 1.5)
+        # Snippet quality: penalize very short snippets, boost substantial ones
+        score *= np.where((snippet_len >= 0) & (snippet_len < 50), 0.8, 1.0)
+        score *= np.where(snippet_len > 200, 1.1, 1.0)
 
         # Cap score at 2.0 to prevent runaway scores
-        return min(score, 2.0)
+        return np.minimum(score, SCORE_CAP)
+
+    def _rrf_scores(self, results: List[SearchResult], branch_results: List[Tuple[str, List[SearchResult]]]) -> np.ndarray:
+        """
+        Score results by weighted reciprocal-rank fusion over the search branches.
+
+        Each branch that returned a result (including as a duplicate dropped
+        during merging) contributes weight / (RRF_K + rank), with the match
+        type multipliers as branch weights. Scores are scaled to the 0-2
+        range the reranker expects.
+        """
+        fused: defaultdict[tuple, float] = defaultdict(float)
+        for match_type, ranked in branch_results:
+            weight = _MATCH_TYPE_MULTIPLIERS.get(match_type, 1.0)
+            for rank, result in enumerate(ranked, start=1):
+                fused[_result_key(result)] += weight / (RRF_K + rank)
+
+        scores = np.fromiter((fused[_result_key(r)] for r in results), dtype=np.float64, count=len(results))
+        if scores.size and scores.max() > 0:
+            scores *= 2.0 / scores.max()
+        return scores
 
     def _build_document_response(self, document: Document) -> DocumentResponse:
         """Convert a Document ORM object into API response model."""
-        return DocumentResponse(
-            id=document.id,
-            filename=document.filename,
-            original_filename=document.original_filename,
-            title=document.title,
-            drawing_number=document.drawing_number,
-            revision=document.revision,
-            system=document.system,
-            area=document.area,
-            file_size=document.file_size,
-            page_count=document.page_count,
-            upload_date=document.upload_date,
-            processed=document.processed
-        )
+        return DocumentResponse.from_document(document)
 
     def _get_document_response_cached(self, db: Session, doc_id: int, cache: dict) -> Tuple[Optional[DocumentResponse], Optional[int]]:
         """Fetch DocumentResponse + project_id with simple cache to avoid duplicate lookups."""
@@ -677,16 +1299,43 @@ class SearchService:
         start_time = time.time()
         original_query = query
 
-        # Step 0: Query rewriting with LLM for better search results
-        if rewrite_query and self._has_llm():
-            search_query, original_query = self.rewrite_query(query)
-        else:
-            search_query = query
+        # Whole-response cache: an identical or near-identical request was answered recently
+        if self.query_cache_enabled:
+            normalized_query = " ".join(query.lower().split())
+            project_version = project_cache_version(db, project_id)
+            exact_cache_key = hashlib.blake2b(
+                f"{project_version}|{project_id}|{limit}|{max_per_document}|{rewrite_query}|{normalized_query}".encode(),
+                digest_size=16
+            ).digest()
+            # Queries differing only by tag ("alarms for P-101" / "P-102") embed
+            # almost identically, so paraphrase hits must also match on tags
+            query_tags = tuple(sorted({tag.upper() for tag in _query_equipment_tags(original_query)}))
+            semantic_cache_key = (project_version, project_id, limit, max_per_document, rewrite_query, query_tags)
+            normalized_embedding = None
+
+            def get_normalized_embedding() -> List[float]:
+                # Embedded on first use, so an exact cache hit never touches the
+                # model. The lookup form and the search form go in one model
+                # call; the vector branches below then find the search form cached
+                nonlocal normalized_embedding
+                if normalized_embedding is None:
+                    normalized_embedding = list(
+                        embedding_service.generate_query_embeddings([normalized_query, original_query])[0]
+                    )
+                return normalized_embedding
+
+            cached_response = self._get_cached_response(exact_cache_key, semantic_cache_key, get_normalized_embedding)
+            if cached_response is not None:
+                logger.debug(f"[SEARCH] Response cache hit: {query[:60]}")
+                return cached_response.model_copy(deep=True, update={
+                    "query": query,
+                    "response_time_ms": int((time.time() - start_time) * 1000)
+                })
 
         query_type = self.classify_query(original_query)  # Use original for classification
         all_results: List[SearchResult] = []
         existing_keys = set()
-        document_counts: dict[int, int] = {}
+        document_counts: defaultdict[int, int] = defaultdict(int)
 
         # Detect if this is a "list all [equipment type]" query
         detected_equipment_type = self._detect_equipment_type_query(original_query)
@@ -694,6 +1343,9 @@ class SearchService:
         # Track equipment tags we've already included (for equipment type search)
         included_equipment_tags = set()
 
+        # Every branch's full ranking (before dedup), for rank fusion
+        branch_results: List[Tuple[str, List[SearchResult]]] = []
+
         def add_result(result: SearchResult, skip_doc_limit: bool = False) -> bool:
             """Add result if not duplicate and within per-document limit
 
@@ -702,67 +1354,157 @@ class SearchService:
                 skip_doc_limit: If True, bypass per-document limit (for equipment type search)
             """
             # Create unique key based on document + page/location
-            if result.source_location:
-                key = (result.document.id, result.source_location)
-            else:
-                key = (result.document.id, result.page_number)
-
+            key = _result_key(result)
             if key in existing_keys:
                 return False
 
             # Check per-document limit (unless skipped)
-            if not skip_doc_limit:
-                doc_count = document_counts.get(result.document.id, 0)
-                if doc_count >= max_per_document:
-                    return False
+            if not skip_doc_limit and document_counts[result.document.id] >= max_per_document:
+                return False
 
             existing_keys.add(key)
-            document_counts[result.document.id] = document_counts.get(result.document.id, 0) + 1
+            document_counts[result.document.id] += 1
             all_results.append(result)
             return True
 
-        # Extract equipment tags from BOTH original and rewritten queries
-        equipment_in_original = extraction_service.extract_equipment_tags(original_query)
-        equipment_in_rewritten = extraction_service.extract_equipment_tags(search_query)
-        equipment_tags_raw = list(set(
-            [eq.tag for eq in equipment_in_original] +
-            [eq.tag for eq in equipment_in_rewritten]
-        ))
+        # === SEARCH ALL SOURCES (using rewritten query for semantic/keyword) ===
+        # The branches are independent queries, so run them concurrently.
+        # Sessions are not thread-safe: each worker opens its own on the
+        # caller's engine. Results are merged on this thread in the fixed
+        # branch order below, so dedup and per-document limits stay deterministic.
+        engine = db.get_bind()
+
+        def _with_own_session(search_fn, *args) -> List[SearchResult]:
+            thread_db = Session(bind=engine)
+            try:
+                return search_fn(thread_db, *args)
+            finally:
+                thread_db.close()
+
+        def _vector_branches(thread_db: Session, vector_query: str) -> Tuple[List[SearchResult], List[SearchResult]]:
+            # Both vector branches search with the same query; embed it once.
+            # Embedding on the worker keeps it off this thread, and a branch
+            # cancelled before it starts (the rerank window filled first)
+            # never embeds at all
+            query_embedding = list(embedding_service.generate_query_embedding(vector_query))
+            return self._vector_search(thread_db, query_embedding, 30, 15, project_id, max_per_document)
+
+        def _submit_vector_branches(vector_query: str) -> Future:
+            """Start the fused semantic + supplementary chunk search for vector_query."""
+            return executor.submit(_with_own_session, _vector_branches, vector_query)
+
+        # Managed explicitly rather than with `with`: an early stop below must
+        # not join the branches it skips
+        executor = ThreadPoolExecutor(max_workers=SEARCH_BRANCH_WORKERS)
+        settled_early = False
+        try:
+            # Step 0: Query rewriting with LLM for better search results. The
+            # keyword branch starts on the original query meanwhile; the
+            # tag-dependent and vector branches wait for the rewrite, up to its budget.
+            rewrite_future = None
+            if rewrite_query and REWRITE_BUDGET_SECONDS > 0 and self._has_llm():
+                rewrite_deadline = time.monotonic() + REWRITE_BUDGET_SECONDS
+                rewrite_future = _REWRITE_EXECUTOR.submit(self.rewrite_query, query)
+
+            # 4. Keyword search in PDF (use ORIGINAL query to avoid noise from LLM expansion)
+            keyword_future = executor.submit(
+                _with_own_session, self._keyword_search, original_query, 30, project_id, max_per_document
+            )
+            # Extract equipment tags from the original query meanwhile
+            original_tags = list(_query_equipment_tags(original_query))
+
+            search_query = original_query
+            if rewrite_future is not None:
+                search_query = self._await_rewrite(rewrite_future, rewrite_deadline, original_query)
+            if search_query != original_query:
+                rewritten_tags = list(_query_equipment_tags(search_query))
+            else:
+                rewritten_tags = []
+
+            # Extract equipment tags from BOTH original and rewritten queries,
+            # plus aliases found in either (one pass). Dedup case-insensitively
+            # against an uppercased set, keeping first-seen order
+            equipment_tags_raw = []
+            equipment_tags_upper = set()
+            for tag in (
+                original_tags + rewritten_tags +
+                self._find_aliases_in_query(db, [original_query, search_query], project_id)
+            ):
+                tag_upper = tag.upper()
+                if tag_upper not in equipment_tags_upper:
+                    equipment_tags_upper.add(tag_upper)
+                    equipment_tags_raw.append(tag)
+
+            # Expand equipment tags with aliases for better matching
+            if equipment_tags_raw:
+                equipment_tags = self.expand_equipment_tags_with_aliases(db, equipment_tags_raw, project_id)
+            else:
+                equipment_tags = []
+
+            logger.info(f"[SEARCH] === Starting search ===")
+            logger.debug(f"[SEARCH] Original query: {original_query[:60]}...")
+            if search_query != original_query:
+                logger.debug(f"[SEARCH] Rewritten query: {search_query[:80]}...")
+            logger.debug(f"[SEARCH] Equipment tags found: {equipment_tags_raw}")
+            if len(equipment_tags) > len(equipment_tags_raw):
+                logger.debug(f"[SEARCH] Expanded with aliases: {equipment_tags}")
+            if detected_equipment_type:
+                logger.debug(f"[SEARCH] Detected equipment type query: {detected_equipment_type}")
+            logger.debug(f"[SEARCH] Project ID: {project_id}")
+
+            # Later branches can only tie a capped score, and ties keep merge
+            # order, so once the whole rerank window is capped they cannot
+            # change the response; stop merging and don't wait for them
+            window = max(limit, RERANK_CANDIDATES)
+
+            def _window_full() -> bool:
+                if SEARCH_RANKING == "rrf" or len(all_results) < window:
+                    return False
+                scores = self._calculate_relevance_scores(all_results, query, query_type, equipment_tags)
+                return int(np.count_nonzero(scores >= SCORE_CAP)) >= window
 
-        # Also search for aliases in both queries
-        alias_matches = self._find_aliases_in_query(db, original_query, project_id)
-        alias_matches += self._find_aliases_in_query(db, search_query, project_id)
-        for tag in alias_matches:
-            if tag not in equipment_tags_raw:
-                equipment_tags_raw.append(tag)
+            graph_future = None
+            if query_type in [QueryType.RELATIONSHIP, QueryType.UPSTREAM_DOWNSTREAM, QueryType.WIRE_TRACE]:
+                graph_future = executor.submit(
+                    _with_own_session, self._graph_relationship_results, list(equipment_tags), query_type, project_id
+                )
 
-        # Expand equipment tags with aliases for better matching
-        if equipment_tags_raw:
-            equipment_tags = self.expand_equipment_tags_with_aliases(db, equipment_tags_raw, project_id)
-        else:
-            equipment_tags = []
-
-        logger.info(f"[SEARCH] === Starting search ===")
-        logger.debug(f"[SEARCH] Original query: {original_query[:60]}...")
-        if search_query != original_query:
-            logger.debug(f"[SEARCH] Rewritten query: {search_query[:80]}...")
-        logger.debug(f"[SEARCH] Equipment tags found: {equipment_tags_raw}")
-        if len(equipment_tags) > len(equipment_tags_raw):
-            logger.debug(f"[SEARCH] Expanded with aliases: {equipment_tags}")
-        if detected_equipment_type:
-            logger.debug(f"[SEARCH] Detected equipment type query: {detected_equipment_type}")
-        logger.debug(f"[SEARCH] Project ID: {project_id}")
+            # 0. Equipment type search (for "list all X" queries), on the caller's
+            # session: the tag-based branches below also search its equipment
+            type_results = []
+            if detected_equipment_type:
+                type_results = self._search_equipment_by_type(db, detected_equipment_type, 50, project_id)
+                logger.debug(f"[SEARCH] 0. Equipment type search ({detected_equipment_type}): {len(type_results)} results")
+                # Also add all equipment of this type to equipment_tags for other searches
+                seen_tags = set(equipment_tags)
+                for r in type_results:
+                    if r.equipment and r.equipment.tag not in seen_tags:
+                        seen_tags.add(r.equipment.tag)
+                        equipment_tags.append(r.equipment.tag)
+
+            exact_future = text_future = eq_data_future = None
+            if equipment_tags:
+                branch_tags = list(equipment_tags)
+                # 1. Exact equipment match from PDF (highest relevance)
+                exact_future = executor.submit(
+                    _with_own_session, self._exact_equipment_search, branch_tags, 20, project_id
+                )
+                # 2. Text search for equipment tags in PDF
+                text_future = executor.submit(
+                    _with_own_session, self._text_search_for_equipment, branch_tags, 30, project_id
+                )
+                # 6. Equipment data from supplementary docs (always run if equipment tags)
+                eq_data_future = executor.submit(
+                    _with_own_session, self._search_equipment_data, branch_tags, None, 15, project_id
+                )
 
-        # === SEARCH ALL SOURCES (using rewritten query for semantic/keyword) ===
-        if query_type in [QueryType.RELATIONSHIP, QueryType.UPSTREAM_DOWNSTREAM, QueryType.WIRE_TRACE]:
-            graph_results = self._graph_relationship_results(db, equipment_tags, query_type, project_id)
-            for graph_result in graph_results:
-                add_result(graph_result, skip_doc_limit=True)
-
-        # 0. Equipment type search (for "list all X" queries)
-        if detected_equipment_type:
-            type_results = self._search_equipment_by_type(db, detected_equipment_type, 50, project_id)
-            logger.debug(f"[SEARCH] 0. Equipment type search ({detected_equipment_type}): {len(type_results)} results")
+            if graph_future is not None:
+                graph_results = graph_future.result()
+                branch_results.append(("graph_relationship", graph_results))
+                for graph_result in graph_results:
+                    add_result(graph_result, skip_doc_limit=True)
+
+            branch_results.append(("equipment_type_search", type_results))
             # Add at least one result per unique equipment tag (skip doc limit for first)
             for r in type_results:
                 eq_tag = r.equipment.tag if r.equipment else None
@@ -773,107 +1515,92 @@ class SearchService:
                 else:
                     # Additional results for same tag - apply normal limits
                     add_result(r)
-            # Also add all equipment of this type to equipment_tags for other searches
-            for r in type_results:
-                if r.equipment and r.equipment.tag not in equipment_tags:
-                    equipment_tags.append(r.equipment.tag)
-
-        # 1. Exact equipment match from PDF (highest relevance)
-        if equipment_tags:
-            exact_results = self._exact_equipment_search(db, equipment_tags, 20, project_id)
-            logger.debug(f"[SEARCH] 1. Exact equipment match: {len(exact_results)} results")
-            for r in exact_results:
-                add_result(r)
-
-        # 2. Text search for equipment tags in PDF
-        if equipment_tags:
-            text_results = self._text_search_for_equipment(db, equipment_tags, 30, project_id)
-            logger.debug(f"[SEARCH] 2. Text search (PDF): {len(text_results)} results")
-            for r in text_results:
-                add_result(r)
-
-        # 3. Semantic search in PDF (use rewritten query for better embeddings)
-        semantic_results = self._semantic_search(db, search_query, 30, project_id)
-        logger.debug(f"[SEARCH] 3. Semantic search (PDF): {len(semantic_results)} results")
-        for r in semantic_results:
-            add_result(r)
-
-        # 4. Keyword search in PDF (use ORIGINAL query to avoid noise from LLM expansion)
-        keyword_results = self._keyword_search(db, original_query, 30, project_id)
-        logger.debug(f"[SEARCH] 4. Keyword search (PDF): {len(keyword_results)} results")
-        for r in keyword_results:
-            add_result(r)
-
-        # 5. Supplementary chunks semantic search (use rewritten query)
-        supp_chunk_results = self._search_supplementary_chunks(db, search_query, 15, project_id)
-        logger.debug(f"[SEARCH] 5. Supplementary chunks: {len(supp_chunk_results)} results")
-        for r in supp_chunk_results:
-            add_result(r)
-
-        # 6. Equipment data from supplementary docs (always run if equipment tags)
-        if equipment_tags:
-            eq_data_results = self._search_equipment_data(db, equipment_tags, None, 15, project_id)
-            logger.debug(f"[SEARCH] 6. Equipment data: {len(eq_data_results)} results")
-            for r in eq_data_results:
-                add_result(r)
+
+            # 3./5. Semantic searches on the final (possibly rewritten) query.
+            # Submitted only if the early stages left room in the rerank window,
+            # so a query answered by them is never embedded for the vector search
+            vector_future = None
+            if not _window_full():
+                vector_future = _submit_vector_branches(search_query)
+
+            # (label, match_type, future, part): part indexes the fused vector
+            # search's (pages, chunks) result; None for single-branch futures
+            merge_order = [
+                ("1. Exact equipment match", "exact", exact_future, None),
+                ("2. Text search (PDF)", "text_search", text_future, None),
+                ("3. Semantic search (PDF)", "semantic", vector_future, 0),
+                ("4. Keyword search (PDF)", "keyword", keyword_future, None),
+                ("5. Supplementary chunks", "supplementary_semantic", vector_future, 1),
+                ("6. Equipment data", "equipment_data", eq_data_future, None),
+            ]
+            for i, (label, match_type, future, part) in enumerate(merge_order):
+                if future is None:
+                    continue
+                if _window_full():
+                    skipped = {f for _, _, f, _ in merge_order[i:] if f is not None}
+                    logger.debug(f"[SEARCH] Top {window} results at score cap, skipping {len(skipped)} branches")
+                    settled_early = True
+                    break
+                branch = future.result() if part is None else future.result()[part]
+                branch_results.append((match_type, branch))
+                logger.debug(f"[SEARCH] {label}: {len(branch)} results")
+                for r in branch:
+                    add_result(r)
+        finally:
+            # After an early stop, cancel the skipped branches that have not
+            # started and return without waiting for the running ones; they
+            # finish in the background and close their own sessions
+            executor.shutdown(wait=not settled_early, cancel_futures=settled_early)
 
         # === ENHANCED RELEVANCE SCORING ===
         # Recalculate scores with multiple factors
-        for result in all_results:
-            # Extract data_type from metadata if available (for equipment_data results)
-            data_type = None
-            if result.match_type == "equipment_data" and result.snippet:
-                # Try to extract data type from snippet (e.g., "SPECIFICATION: ..." or "IO_POINT: ...")
-                for dt in ["SPECIFICATION", "IO_POINT", "ALARM", "SCHEDULE_ENTRY", "SEQUENCE"]:
-                    if dt in result.snippet.upper():
-                        data_type = dt
-                        break
-
-            enhanced_score = self._calculate_relevance_score(
-                base_score=result.relevance_score,
-                match_type=result.match_type,
-                query=query,
-                query_type=query_type,
-                equipment_tags=equipment_tags,
-                result_equipment_tag=result.equipment.tag if result.equipment else None,
-                snippet=result.snippet,
-                data_type=data_type
-            )
-            # Update the result's relevance score
-            result.relevance_score = enhanced_score
+        if SEARCH_RANKING == "rrf":
+            scores = self._rrf_scores(all_results, branch_results)
+        else:
+            scores = self._calculate_relevance_scores(all_results, query, query_type, equipment_tags)
+        for result, score in zip(all_results, scores.tolist()):
+            result.relevance_score = score
 
-        # Sort all results by enhanced relevance score
-        all_results.sort(key=lambda r: r.relevance_score, reverse=True)
+        # Only the rerank window (or the page, if larger) can reach the
+        # response: keep just those, best first. nlargest is stable, so ties
+        # keep merge order exactly as a full sort would
+        total_count = len(all_results)
+        top_results = heapq.nlargest(max(limit, RERANK_CANDIDATES), all_results, key=attrgetter('relevance_score'))
 
         # === CROSS-ENCODER RERANKING ===
         # Rerank top candidates for better precision/recall
-        if len(all_results) > 10:
+        if len(top_results) > 10:
             try:
                 from app.services.reranker_service import reranker_service
-                rerank_count = min(len(all_results), 60)
-                candidates = all_results[:rerank_count]
-                remainder = all_results[rerank_count:]
+                rerank_count = min(len(top_results), RERANK_CANDIDATES)
+                candidates = top_results[:rerank_count]
+                remainder = top_results[rerank_count:]
                 reranked = reranker_service.rerank(original_query, candidates, top_k=limit)
-                all_results = reranked + remainder
+                top_results = reranked + remainder
+                total_count -= rerank_count - len(reranked)  # Reranking keeps only its top_k
                 logger.debug(f"[SEARCH] Reranked top {rerank_count} results")
             except Exception as e:
                 logger.warning(f"[SEARCH] Reranking skipped: {e}")
 
-        # Count result types for logging
-        pdf_count = sum(1 for r in all_results if r.match_type in ["exact", "text_search", "semantic", "keyword"])
-        supp_count = sum(1 for r in all_results if r.match_type in ["supplementary_semantic", "equipment_data"])
-
-        logger.debug(f"[SEARCH] === Total: {len(all_results)} results ({pdf_count} PDF, {supp_count} supplementary) ===\n")
+        # Count result types for logging, in one pass
+        if logger.isEnabledFor(logging.DEBUG):
+            type_counts = Counter(r.match_type for r in all_results)
+            pdf_count = sum(type_counts[t] for t in ("exact", "text_search", "semantic", "keyword"))
+            supp_count = sum(type_counts[t] for t in ("supplementary_semantic", "equipment_data"))
+            logger.debug(f"[SEARCH] === Total: {total_count} results ({pdf_count} PDF, {supp_count} supplementary) ===\n")
 
         response_time = int((time.time() - start_time) * 1000)
 
-        return SearchResponse(
+        response = SearchResponse(
             query=query,
             query_type=query_type,
-            results=all_results[:limit],
-            total_count=len(all_results),
+            results=top_results[:limit],
+            total_count=total_count,
             response_time_ms=response_time
         )
+        if self.query_cache_enabled:
+            self._store_response(exact_cache_key, semantic_cache_key, get_normalized_embedding(), response.model_copy(deep=True))
+        return response
 
     def _text_search_for_equipment(self, db: Session, tags: List[str], limit: int, project_id: int = None) -> List[SearchResult]:
         """Search for equipment mentions in OCR text and AI analysis.
@@ -881,48 +1608,52 @@ class SearchService:
         Uses PostgreSQL regex with word boundaries to prevent 'P-1' matching 'P-10'.
         """
         results = []
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return results
 
+        branches = []
         for tag in tags:
             # Use regex word-boundary matching to avoid false positives
             # e.g., "P-1" should NOT match "P-10" or "P-101"
             boundary_pattern = self._tag_boundary_pattern(tag)
-            query = db.query(Page).join(Document).filter(
-                or_(
-                    Page.ocr_text.op("~*")(boundary_pattern),
-                    Page.ai_analysis.op("~*")(boundary_pattern),
-                    Page.ai_equipment_list.op("~*")(boundary_pattern)
-                )
-            )
+            # One regex over the combined page text: a single trigram index
+            # scan per tag instead of a BitmapOr across three column indexes
+            branch = select(Page.id.label("page_id"), literal(tag, String).label("tag")).join(
+                Document, Page.document_id == Document.id
+            ).where(_PAGE_SEARCH_TEXT.op("~*")(literal(boundary_pattern, String)))
             if project_id is not None:
-                query = query.filter(Document.project_id == project_id)
-            pages = query.limit(limit).all()
-
-            for page in pages:
-                doc = page.document
-                doc_response = DocumentResponse(
-                    id=doc.id,
-                    filename=doc.filename,
-                    original_filename=doc.original_filename,
-                    title=doc.title,
-                    drawing_number=doc.drawing_number,
-                    revision=doc.revision,
-                    system=doc.system,
-                    area=doc.area,
-                    file_size=doc.file_size,
-                    page_count=doc.page_count,
-                    upload_date=doc.upload_date,
-                    processed=doc.processed
-                )
+                branch = branch.where(Document.project_id == project_id)
+            branches.append(branch.limit(limit))
+
+        hits = self._union_tag_hits(branches)
+        rows = db.query(
+            Page.page_number,
+            hits.c.tag,
+            *_tag_context_columns(Page.ocr_text, hits.c.tag, "ocr"),
+            *_tag_context_columns(Page.ai_analysis, hits.c.tag, "ai"),
+            *_DOCUMENT_RESPONSE_COLUMNS
+        ).select_from(Page).join(hits, hits.c.page_id == Page.id).join(
+            Document, Page.document_id == Document.id
+        )
+        rows_by_tag = defaultdict(list)
+        for row in rows:
+            rows_by_tag[row.tag].append(row)
+
+        doc_responses = {}
+        for tag in tags:
+            for row in rows_by_tag[tag]:
+                doc_response = _memo_doc_response(doc_responses, row.document_id, DocumentResponse.from_row, row)
 
-                # Extract context around the tag mention
-                snippet = self._extract_context(page.ocr_text or "", tag)
-                if not snippet and page.ai_analysis:
-                    snippet = self._extract_context(page.ai_analysis, tag)
+                # Context around the tag mention, cut out in SQL
+                snippet = _tag_context(row.ocr_pos, row.ocr_len, row.ocr_window, tag)
+                if not snippet:
+                    snippet = _tag_context(row.ai_pos, row.ai_len, row.ai_window, tag)
 
                 results.append(SearchResult(
                     equipment=EquipmentBrief(id=0, tag=tag, equipment_type="UNKNOWN"),
                     document=doc_response,
-                    page_number=page.page_number,
+                    page_number=row.page_number,
                     relevance_score=1.5,
                     snippet=snippet or f"Equipment {tag} mentioned on this page",
                     match_type="text_search"
@@ -930,207 +1661,184 @@ class SearchService:
 
         return results
 
-    def _extract_context(self, text: str, tag: str, context_chars: int = 150) -> str:
-        """Extract text context around a tag mention"""
-        if not text:
-            return ""
-
-        # Case-insensitive search
-        text_lower = text.lower()
-        tag_lower = tag.lower()
-
-        pos = text_lower.find(tag_lower)
-        if pos == -1:
-            return ""
-
-        start = max(0, pos - context_chars)
-        end = min(len(text), pos + len(tag) + context_chars)
-
-        context = text[start:end].strip()
-        if start > 0:
-            context = "..." + context
-        if end < len(text):
-            context = context + "..."
-
-        return context
+    @staticmethod
+    def _union_tag_hits(branches: list):
+        """Fuse per-tag LIMITed selects into one subquery, so all tags cost one round trip."""
+        if len(branches) == 1:
+            return branches[0].subquery()
+        return union_all(*branches).subquery()
 
     def _exact_equipment_search(self, db: Session, tags: List[str], limit: int, project_id: int = None) -> List[SearchResult]:
         """Search for exact equipment tag matches"""
         results = []
+        tags_upper = list(dict.fromkeys(tag.upper() for tag in tags))
+        if not tags_upper:
+            return results
+
+        # One statement for all tags: equipment joined to its locations, pages
+        # and documents, capped at `limit` locations per equipment in SQL
+        ranked = db.query(
+            Equipment.id.label("equipment_id"),
+            Equipment.tag,
+            Equipment.equipment_type,
+            EquipmentLocation.context_text,
+            Page.page_number,
+            *_DOCUMENT_RESPONSE_COLUMNS,
+            func.row_number().over(
+                partition_by=EquipmentLocation.equipment_id, order_by=EquipmentLocation.id
+            ).label("location_rank")
+        ).select_from(Equipment).join(
+            EquipmentLocation, EquipmentLocation.equipment_id == Equipment.id
+        ).join(Page, EquipmentLocation.page_id == Page.id).join(
+            Document, Page.document_id == Document.id
+        ).filter(func.upper(Equipment.tag).in_(tags_upper))
+        if project_id is not None:
+            ranked = ranked.filter(Equipment.project_id == project_id, Document.project_id == project_id)
+        ranked = ranked.subquery()
+
+        # A tag can match equipment in several projects; keep the first one seen
+        equipment_by_tag = {}
+        rows_by_tag = defaultdict(list)
+        for row in db.query(ranked).filter(ranked.c.location_rank <= limit).order_by(
+            ranked.c.equipment_id, ranked.c.location_rank
+        ):
+            tag_upper = row.tag.upper()
+            if equipment_by_tag.setdefault(tag_upper, row.equipment_id) == row.equipment_id:
+                rows_by_tag[tag_upper].append(row)
+
+        doc_responses = {}
+        for tag_upper in tags_upper:
+            for row in rows_by_tag[tag_upper]:
+                doc_response = _memo_doc_response(doc_responses, row.document_id, DocumentResponse.from_row, row)
 
-        for tag in tags:
-            eq_query = db.query(Equipment).filter(
-                func.upper(Equipment.tag) == tag.upper()
-            )
-            if project_id is not None:
-                eq_query = eq_query.filter(Equipment.project_id == project_id)
-            equipment = eq_query.first()
+                results.append(SearchResult(
+                    equipment=EquipmentBrief(id=row.equipment_id, tag=row.tag, equipment_type=row.equipment_type),
+                    document=doc_response,
+                    page_number=row.page_number,
+                    relevance_score=1.0,
+                    snippet=row.context_text,
+                    match_type="exact"
+                ))
 
-            if equipment:
-                loc_query = db.query(EquipmentLocation).filter(
-                    EquipmentLocation.equipment_id == equipment.id
-                ).join(Page).join(Document)
-                if project_id is not None:
-                    loc_query = loc_query.filter(Document.project_id == project_id)
-                locations = loc_query.limit(limit).all()
+        return results
 
-                for loc in locations:
-                    page = loc.page
-                    doc = page.document
-
-                    doc_response = DocumentResponse(
-                        id=doc.id,
-                        filename=doc.filename,
-                        original_filename=doc.original_filename,
-                        title=doc.title,
-                        drawing_number=doc.drawing_number,
-                        revision=doc.revision,
-                        system=doc.system,
-                        area=doc.area,
-                        file_size=doc.file_size,
-                        page_count=doc.page_count,
-                        upload_date=doc.upload_date,
-                        processed=doc.processed
-                    )
+    def _set_local_ef_search(self, db: Session, limit: int) -> None:
+        """Size hnsw.ef_search for this transaction's vector scan by its limit."""
+        if self._hnsw_ef_multiplier is None:
+            vector_count = db.execute(text(
+                "SELECT max(reltuples) FROM pg_class WHERE relname IN ('pages', 'supplementary_chunks')"
+            )).scalar() or 0
+            self._hnsw_ef_multiplier = auto_tune_hnsw(vector_count)
 
-                    results.append(SearchResult(
-                        equipment=EquipmentBrief(id=equipment.id, tag=equipment.tag, equipment_type=equipment.equipment_type),
-                        document=doc_response,
-                        page_number=page.page_number,
-                        relevance_score=1.0,
-                        snippet=loc.context_text,
-                        match_type="exact"
-                    ))
+        ef_search = min(max(HNSW_EF_SEARCH, limit * self._hnsw_ef_multiplier), HNSW_EF_SEARCH_CAP)
+        db.execute(text("SELECT set_config('hnsw.ef_search', :ef_search, true)"), {"ef_search": str(ef_search)})
 
-        return results
+    def _semantic_search(self, db: Session, query: str, limit: int, project_id: int = None,
+                         query_embedding: Optional[Sequence[float]] = None) -> List[SearchResult]:
+        """Search using vector similarity.
+
+        Orders by the halfvec expression so the pages HNSW index serves the KNN;
+        similarity is still scored on the full-precision column.
+        """
+        if query_embedding is None:
+            query_embedding = embedding_service.generate_query_embedding(query)
 
-    def _semantic_search(self, db: Session, query: str, limit: int, project_id: int = None) -> List[SearchResult]:
-        """Search using vector similarity"""
-        query_embedding = embedding_service.generate_embedding(query)
-
-        # Build SQL with optional project filter
-        project_filter = "AND d.project_id = :project_id" if project_id is not None else ""
-
-        sql = text(f"""
-            SELECT
-                p.id,
-                p.document_id,
-                p.page_number,
-                p.ocr_text,
-                p.ai_analysis,
-                p.ai_equipment_list,
-                d.filename,
-                d.original_filename,
-                d.title,
-                d.drawing_number,
-                d.revision,
-                d.system,
-                d.area,
-                d.file_size,
-                d.page_count,
-                d.upload_date,
-                d.processed,
-                1 - (p.embedding <=> CAST(:embedding AS vector)) as similarity
-            FROM pages p
-            JOIN documents d ON p.document_id = d.id
-            WHERE p.embedding IS NOT NULL {project_filter}
-            ORDER BY p.embedding <=> CAST(:embedding AS vector)
-            LIMIT :limit
-        """)
-
-        params = {"embedding": str(query_embedding), "limit": limit}
+        sql = _PAGE_KNN_SQL_WITH_PROJECT if project_id is not None else _PAGE_KNN_SQL_NO_PROJECT
+
+        params = {"embedding": list(query_embedding), "limit": limit}
         if project_id is not None:
             params["project_id"] = project_id
+        self._set_local_ef_search(db, limit)
         result = db.execute(sql, params)
 
-        results = []
-        for row in result:
-            doc_response = DocumentResponse(
-                id=row.document_id,
-                filename=row.filename,
-                original_filename=row.original_filename,
-                title=row.title,
-                drawing_number=row.drawing_number,
-                revision=row.revision,
-                system=row.system,
-                area=row.area,
-                file_size=row.file_size,
-                page_count=row.page_count,
-                upload_date=row.upload_date,
-                processed=row.processed
-            )
-
-            # Prefer AI analysis for snippet if available
-            snippet_source = row.ocr_text
-            if hasattr(row, 'ai_analysis') and row.ai_analysis:
-                snippet_source = f"{row.ai_analysis}\n\n{row.ocr_text}"
-            snippet = snippet_source[:1500] + "..." if snippet_source and len(snippet_source) > 1500 else snippet_source
+        doc_responses = {}
+        return [self._page_hit_result(row, doc_responses) for row in result]
 
-            results.append(SearchResult(
-                equipment=None,
-                document=doc_response,
-                page_number=row.page_number,
-                relevance_score=float(row.similarity),
-                snippet=snippet,
-                match_type="semantic"
-            ))
-
-        return results
+    @staticmethod
+    def _page_hit_result(row, doc_responses: dict) -> SearchResult:
+        """Build a semantic SearchResult from a pages vector-search row."""
+        doc_response = _memo_doc_response(doc_responses, row.document_id, DocumentResponse.from_row, row)
+
+        # AI analysis (if available) then OCR text, truncated in SQL
+        snippet = row.snippet_head + "..." if row.snippet_truncated else row.snippet_head
+
+        return SearchResult(
+            equipment=None,
+            document=doc_response,
+            page_number=row.page_number,
+            relevance_score=1 - float(row.distance),
+            snippet=snippet,
+            match_type="semantic"
+        )
 
-    def _keyword_search(self, db: Session, query: str, limit: int, project_id: int = None) -> List[SearchResult]:
+    def _keyword_search(self, db: Session, query: str, limit: int, project_id: int = None,
+                        max_per_document: int = None) -> List[SearchResult]:
         """Full-text keyword search including AI analysis.
 
         Splits the query into individual keywords and searches for each,
         rather than using the entire (potentially expanded) query as one ILIKE pattern.
+        With max_per_document, pages are capped per document in SQL.
         """
         # Split query into meaningful keywords (skip short/common words)
-        stop_words = {"what", "where", "is", "the", "a", "an", "and", "or", "for", "to",
-                      "of", "in", "on", "how", "does", "do", "are", "this", "that", "with",
-                      "from", "by", "all", "about", "which", "who", "it", "at", "be", "has"}
-        keywords = [w for w in query.split() if len(w) >= 2 and w.lower() not in stop_words]
+        keywords = [w for w in query.split() if len(w) >= 2 and w.lower() not in _KEYWORD_STOP_WORDS]
 
         if not keywords:
             keywords = [query]  # Fallback to full query
 
-        # Build OR conditions for each keyword across all text fields
-        keyword_conditions = []
+        # Trigram indexes only serve patterns of 3+ characters, and a single
+        # shorter term in the OR chain forces a sequential scan; keep 2-char
+        # keywords only when there is nothing longer to search for
+        indexable_keywords = [kw for kw in keywords if len(kw) >= 3]
+        if indexable_keywords:
+            keywords = indexable_keywords
+
+        # Build OR conditions for each keyword across all text fields, per
+        # table so each OR chain can be answered by that table's trigram indexes
+        page_conditions = []
+        document_conditions = []
         for kw in keywords[:8]:  # Limit to 8 keywords to avoid huge queries
             term = f"%{kw}%"
-            keyword_conditions.append(Page.ocr_text.ilike(term))
-            keyword_conditions.append(Page.ai_analysis.ilike(term))
-            keyword_conditions.append(Page.ai_equipment_list.ilike(term))
-            keyword_conditions.append(Document.title.ilike(term))
-            keyword_conditions.append(Document.drawing_number.ilike(term))
-
-        kw_query = db.query(Page).join(Document).filter(or_(*keyword_conditions))
+            page_conditions.append(Page.ocr_text.ilike(term))
+            page_conditions.append(Page.ai_analysis.ilike(term))
+            page_conditions.append(Page.ai_equipment_list.ilike(term))
+            document_conditions.append(Document.title.ilike(term))
+            document_conditions.append(Document.drawing_number.ilike(term))
+
+        # Only the snippet head of the OCR text leaves the database
+        kw_query = db.query(
+            Page.page_number,
+            func.substr(Page.ocr_text, 1, SNIPPET_MAX_CHARS).label("ocr_head"),
+            (func.length(Page.ocr_text) > SNIPPET_MAX_CHARS).label("ocr_truncated"),
+            *_DOCUMENT_RESPONSE_COLUMNS
+        ).select_from(Page).join(Document, Page.document_id == Document.id).filter(or_(
+            Page.id.in_(select(Page.id).where(or_(*page_conditions))),
+            Page.document_id.in_(select(Document.id).where(or_(*document_conditions)))
+        ))
         if project_id is not None:
             kw_query = kw_query.filter(Document.project_id == project_id)
-        pages = kw_query.limit(limit).all()
+        if max_per_document is None:
+            rows = kw_query.limit(limit).all()
+        else:
+            candidates = kw_query.limit(limit * DOC_CAP_CANDIDATE_FACTOR).subquery()
+            ranked = select(
+                candidates,
+                func.row_number().over(
+                    partition_by=candidates.c.document_id, order_by=candidates.c.page_number
+                ).label("doc_rank")
+            ).subquery()
+            rows = db.query(ranked).filter(ranked.c.doc_rank <= max_per_document).limit(limit).all()
 
         results = []
-        for page in pages:
-            doc = page.document
-            doc_response = DocumentResponse(
-                id=doc.id,
-                filename=doc.filename,
-                original_filename=doc.original_filename,
-                title=doc.title,
-                drawing_number=doc.drawing_number,
-                revision=doc.revision,
-                system=doc.system,
-                area=doc.area,
-                file_size=doc.file_size,
-                page_count=doc.page_count,
-                upload_date=doc.upload_date,
-                processed=doc.processed
-            )
+        doc_responses = {}
+        for row in rows:
+            doc_response = _memo_doc_response(doc_responses, row.document_id, DocumentResponse.from_row, row)
 
-            snippet = page.ocr_text[:1500] + "..." if page.ocr_text and len(page.ocr_text) > 1500 else page.ocr_text
+            snippet = row.ocr_head + "..." if row.ocr_truncated else row.ocr_head
 
             results.append(SearchResult(
                 equipment=None,
                 document=doc_response,
-                page_number=page.page_number,
+                page_number=row.page_number,
                 relevance_score=0.5,
                 snippet=snippet,
                 match_type="keyword"
@@ -1138,156 +1846,182 @@ class SearchService:
 
         return results
 
+    @staticmethod
+    def _equipment_ref(db: Session, equipment_tag: str) -> Optional[Tuple[int, str]]:
+        """(id, tag) of the equipment matching equipment_tag, case-insensitively.
+
+        Served by idx_equipment_upper_tag_project and memoized in the session's
+        info dict, so relationship and upstream lookups for the same tag within
+        one request share a single query.
+        """
+        refs = db.info.setdefault("equipment_ref_by_tag", {})
+        tag_upper = equipment_tag.upper()
+        if tag_upper not in refs:
+            row = db.query(Equipment.id, Equipment.tag).filter(
+                func.upper(Equipment.tag) == tag_upper
+            ).first()
+            refs[tag_upper] = (row.id, row.tag) if row else None
+        return refs[tag_upper]
+
     def get_equipment_relationships(self, db: Session, equipment_tag: str, direction: str = "both") -> dict:
         """Get equipment relationships (controls/controlled_by)"""
-        equipment = db.query(Equipment).filter(
-            func.upper(Equipment.tag) == equipment_tag.upper()
-        ).first()
+        equipment = self._equipment_ref(db, equipment_tag)
 
         if not equipment:
             return {"error": f"Equipment {equipment_tag} not found"}
 
         result = {
-            "equipment": equipment.tag,
+            "equipment": equipment[1],
             "controls": [],
             "controlled_by": [],
             "powers": [],
             "powered_by": []
         }
 
-        if direction in ["both", "outgoing"]:
-            outgoing = db.query(EquipmentRelationship).filter(
-                EquipmentRelationship.source_id == equipment.id
-            ).all()
-
-            for rel in outgoing:
-                target = db.query(Equipment).filter(Equipment.id == rel.target_id).first()
-                if target:
-                    if rel.relationship_type == "CONTROLS":
-                        result["controls"].append(target.tag)
-                    elif rel.relationship_type == "POWERS":
-                        result["powers"].append(target.tag)
-
-        if direction in ["both", "incoming"]:
-            incoming = db.query(EquipmentRelationship).filter(
-                EquipmentRelationship.target_id == equipment.id
-            ).all()
-
-            for rel in incoming:
-                source = db.query(Equipment).filter(Equipment.id == rel.source_id).first()
-                if source:
-                    if rel.relationship_type == "CONTROLS":
-                        result["controlled_by"].append(source.tag)
-                    elif rel.relationship_type == "POWERS":
-                        result["powered_by"].append(source.tag)
+        # Both directions in one query: each relationship row with both end tags
+        outgoing = direction in ["both", "outgoing"]
+        incoming = direction in ["both", "incoming"]
+        if not (outgoing or incoming):
+            return result
+
+        directions = []
+        if outgoing:
+            directions.append(EquipmentRelationship.source_id == equipment[0])
+        if incoming:
+            directions.append(EquipmentRelationship.target_id == equipment[0])
+
+        source = aliased(Equipment)
+        target = aliased(Equipment)
+        rows = db.query(
+            EquipmentRelationship.relationship_type,
+            EquipmentRelationship.source_id,
+            EquipmentRelationship.target_id,
+            source.tag,
+            target.tag
+        ).join(source, source.id == EquipmentRelationship.source_id).join(
+            target, target.id == EquipmentRelationship.target_id
+        ).filter(
+            or_(*directions),
+            EquipmentRelationship.relationship_type.in_(["CONTROLS", "POWERS"])
+        ).order_by(EquipmentRelationship.id)
+
+        for relationship_type, source_id, target_id, source_tag, target_tag in rows:
+            if outgoing and source_id == equipment[0]:
+                result["controls" if relationship_type == "CONTROLS" else "powers"].append(target_tag)
+            if incoming and target_id == equipment[0]:
+                result["controlled_by" if relationship_type == "CONTROLS" else "powered_by"].append(source_tag)
 
         return result
 
     def get_upstream_equipment(self, db: Session, equipment_tag: str, depth: int = 3) -> List[str]:
-        """Get upstream equipment chain"""
-        visited = set()
-        upstream = []
-
-        def traverse(tag: str, current_depth: int):
-            if current_depth > depth or tag in visited:
-                return
-            visited.add(tag)
-
-            equipment = db.query(Equipment).filter(
-                func.upper(Equipment.tag) == tag.upper()
-            ).first()
-
-            if not equipment:
-                return
-
-            incoming = db.query(EquipmentRelationship).filter(
-                EquipmentRelationship.target_id == equipment.id,
-                EquipmentRelationship.relationship_type.in_(["POWERS", "FEEDS"])
-            ).all()
+        """Get upstream equipment chain.
 
-            for rel in incoming:
-                source = db.query(Equipment).filter(Equipment.id == rel.source_id).first()
-                if source and source.tag not in visited:
-                    upstream.append(source.tag)
-                    traverse(source.tag, current_depth + 1)
+        Walks POWERS/FEEDS relationships backwards in one recursive query
+        (served by idx_relationship_target). Equipment at each level is
+        expanded while its level is <= depth, so sources up to depth + 1
+        hops away are returned, nearest first. The recursion walks ids on
+        the edge table alone; tags are joined once for the final set.
+        """
+        equipment = self._equipment_ref(db, equipment_tag)
+        if not equipment:
+            return []
 
-        traverse(equipment_tag, 0)
-        return upstream
+        rows = db.execute(text("""
+            WITH RECURSIVE up(id, depth) AS (
+                SELECT CAST(:root_id AS integer), 0
+                -- UNION (not ALL): a node reached twice at one level is expanded once
+                UNION
+                SELECT r.source_id, up.depth + 1
+                FROM up
+                JOIN equipment_relationships r ON r.target_id = up.id
+                WHERE r.relationship_type IN ('POWERS', 'FEEDS') AND up.depth <= :depth
+            )
+            SELECT e.tag, min(up.depth) AS depth
+            FROM up
+            JOIN equipment e ON e.id = up.id
+            WHERE up.depth > 0 AND up.id <> :root_id
+            GROUP BY e.tag
+            ORDER BY min(up.depth), e.tag
+        """), {"root_id": equipment[0], "depth": depth})
+        return [row.tag for row in rows]
+
+    def _search_supplementary_chunks(self, db: Session, query: str, limit: int, project_id: int = None,
+                                     query_embedding: Optional[Sequence[float]] = None) -> List[SearchResult]:
+        """Search supplementary document chunks using vector similarity.
+
+        Orders by the halfvec expression so the chunk HNSW index serves the KNN;
+        similarity is still scored on the full-precision column.
+        """
+        if query_embedding is None:
+            query_embedding = embedding_service.generate_query_embedding(query)
 
-    def _search_supplementary_chunks(self, db: Session, query: str, limit: int, project_id: int = None) -> List[SearchResult]:
-        """Search supplementary document chunks using vector similarity"""
-        query_embedding = embedding_service.generate_embedding(query)
+        sql = _CHUNK_KNN_SQL_WITH_PROJECT if project_id is not None else _CHUNK_KNN_SQL_NO_PROJECT
 
-        # Build SQL with optional project filter
-        project_filter = ""
-        if project_id is not None:
-            project_filter = "AND sd.project_id = :project_id"
-
-        sql = text(f"""
-            SELECT
-                sc.id,
-                sc.document_id,
-                sc.chunk_index,
-                sc.content,
-                sc.source_location,
-                sc.equipment_tags,
-                sd.filename,
-                sd.original_filename,
-                sd.document_type,
-                sd.project_id,
-                sd.created_at,
-                1 - (sc.embedding <=> CAST(:embedding AS vector)) as similarity
-            FROM supplementary_chunks sc
-            JOIN supplementary_documents sd ON sc.document_id = sd.id
-            WHERE sc.embedding IS NOT NULL {project_filter}
-            ORDER BY sc.embedding <=> CAST(:embedding AS vector)
-            LIMIT :limit
-        """)
-
-        params = {"embedding": str(query_embedding), "limit": limit}
+        params = {"embedding": list(query_embedding), "limit": limit}
         if project_id is not None:
             params["project_id"] = project_id
+        self._set_local_ef_search(db, limit)
         result = db.execute(sql, params)
 
-        results = []
-        for row in result:
-            # Create a pseudo-document response for supplementary docs
-            doc_response = DocumentResponse(
-                id=row.document_id,
-                filename=row.filename,
-                original_filename=row.original_filename,
-                title=row.original_filename,  # Use filename as title
-                drawing_number=None,
-                revision=None,
-                system=None,
-                area=None,
-                file_size=None,
-                page_count=1,
-                upload_date=row.created_at or datetime.utcnow(),
-                processed=2
-            )
+        doc_responses = {}
+        return [self._chunk_hit_result(row, doc_responses) for row in result]
 
-            # Parse equipment tags if present
-            equipment_brief = None
-            if row.equipment_tags:
-                try:
-                    tags = json.loads(row.equipment_tags)
-                    if tags:
-                        equipment_brief = EquipmentBrief(id=0, tag=tags[0], equipment_type="UNKNOWN")
-                except (json.JSONDecodeError, TypeError, IndexError) as e:
-                    logger.debug(f"Failed to parse equipment tags: {e}")
+    @staticmethod
+    def _chunk_hit_result(row, doc_responses: dict) -> SearchResult:
+        """Build a supplementary_semantic SearchResult from a chunk vector-search row."""
+        # Create a pseudo-document response for supplementary docs
+        doc_response = _memo_doc_response(
+            doc_responses, row.document_id, DocumentResponse.from_supplementary,
+            row.document_id, row.filename, row.original_filename,
+            upload_date=row.created_at or datetime.utcnow(), processed=2
+        )
 
-            results.append(SearchResult(
-                equipment=equipment_brief,
-                document=doc_response,
-                page_number=row.chunk_index + 1,  # Use chunk index as page
-                relevance_score=float(row.similarity),
-                snippet=row.content[:300] + "..." if len(row.content) > 300 else row.content,
-                match_type="supplementary_semantic",
-                source_location=row.source_location
-            ))
+        # First equipment tag, extracted from the JSON array in SQL
+        equipment_brief = None
+        if row.equipment_tag:
+            equipment_brief = EquipmentBrief(id=0, tag=row.equipment_tag, equipment_type="UNKNOWN")
+
+        return SearchResult(
+            equipment=equipment_brief,
+            document=doc_response,
+            page_number=row.chunk_index + 1,  # Use chunk index as page
+            relevance_score=1 - float(row.distance),
+            snippet=row.snippet_head + "..." if row.snippet_truncated else row.snippet_head,
+            match_type="supplementary_semantic",
+            source_location=row.source_location
+        )
 
-        return results
+    def _vector_search(self, db: Session, query_embedding: Sequence[float], page_limit: int, chunk_limit: int,
+                       project_id: int = None, max_per_document: int = None) -> Tuple[List[SearchResult], List[SearchResult]]:
+        """Run the page and supplementary chunk vector searches as one statement.
+
+        Same KNN queries (and indexes) as _semantic_search and
+        _search_supplementary_chunks, fused with UNION ALL so both cost one
+        round trip and one connection. With max_per_document, page hits are
+        capped per document in SQL. Returns (page results, chunk results).
+        """
+        sql = _FUSED_KNN_SQL_WITH_PROJECT if project_id is not None else _FUSED_KNN_SQL_NO_PROJECT
+
+        page_candidates = page_limit if max_per_document is None else page_limit * DOC_CAP_CANDIDATE_FACTOR
+        params = {
+            "embedding": list(query_embedding),
+            "page_candidates": page_candidates,
+            "page_limit": page_limit,
+            "max_per_document": page_limit if max_per_document is None else max_per_document,
+            "chunk_limit": chunk_limit,
+        }
+        if project_id is not None:
+            params["project_id"] = project_id
+        self._set_local_ef_search(db, max(page_candidates, chunk_limit))
+
+        page_results, chunk_results = [], []
+        page_doc_responses, chunk_doc_responses = {}, {}
+        for row in db.execute(sql, params):
+            if row.src == "pdf":
+                page_results.append(self._page_hit_result(row, page_doc_responses))
+            else:
+                chunk_results.append(self._chunk_hit_result(row, chunk_doc_responses))
+        return page_results, chunk_results
 
     def _search_equipment_data(self, db: Session, tags: List[str], data_types: List[str] = None,
                                limit: int = 10, project_id: int = None) -> List[SearchResult]:
@@ -1296,42 +2030,59 @@ class SearchService:
         Uses regex word-boundary matching to prevent false positives.
         """
         results = []
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return results
 
+        branches = []
         for tag in tags:
             boundary_pattern = self._tag_boundary_pattern(tag)
-            query = db.query(EquipmentData).join(SupplementaryDocument).filter(
+            branch = select(EquipmentData.id.label("entry_id"), literal(tag, String).label("tag")).join(
+                SupplementaryDocument, EquipmentData.document_id == SupplementaryDocument.id
+            ).where(
                 EquipmentData.equipment_tag.op("~*")(boundary_pattern)
             )
             if project_id is not None:
-                query = query.filter(SupplementaryDocument.project_id == project_id)
+                branch = branch.where(SupplementaryDocument.project_id == project_id)
             if data_types:
-                query = query.filter(EquipmentData.data_type.in_(data_types))
-
-            data_entries = query.limit(limit).all()
-
-            for entry in data_entries:
-                doc = entry.document
-                doc_response = DocumentResponse(
-                    id=doc.id,
-                    filename=doc.filename,
-                    original_filename=doc.original_filename,
-                    title=doc.original_filename,
-                    drawing_number=None,
-                    revision=None,
-                    system=None,
-                    area=None,
-                    file_size=doc.file_size,
-                    page_count=1,
-                    upload_date=doc.created_at,
-                    processed=doc.processed
+                branch = branch.where(EquipmentData.data_type.in_(data_types))
+            branches.append(branch.limit(limit))
+
+        hits = self._union_tag_hits(branches)
+        rows = db.query(
+            hits.c.tag,
+            EquipmentData.equipment_tag,
+            EquipmentData.equipment_id,
+            EquipmentData.match_confidence,
+            EquipmentData.data_type,
+            EquipmentData.snippet_preview,
+            EquipmentData.source_location,
+            SupplementaryDocument.id.label("document_id"),
+            SupplementaryDocument.filename,
+            SupplementaryDocument.original_filename,
+            SupplementaryDocument.created_at,
+            SupplementaryDocument.processed,
+            SupplementaryDocument.file_size
+        ).select_from(EquipmentData).join(hits, hits.c.entry_id == EquipmentData.id).join(
+            SupplementaryDocument, EquipmentData.document_id == SupplementaryDocument.id
+        )
+        entries_by_tag = defaultdict(list)
+        for entry in rows:
+            entries_by_tag[entry.tag].append(entry)
+
+        doc_responses = {}
+        for tag in tags:
+            for entry in entries_by_tag[tag]:
+                doc_response = _memo_doc_response(
+                    doc_responses, entry.document_id, DocumentResponse.from_supplementary,
+                    entry.document_id, entry.filename, entry.original_filename,
+                    upload_date=entry.created_at, processed=entry.processed, file_size=entry.file_size
                 )
 
-                # Build snippet from data_json
-                try:
-                    data = json.loads(entry.data_json)
-                    snippet = f"{entry.data_type}: " + ", ".join(f"{k}={v}" for k, v in list(data.items())[:5])
-                except (json.JSONDecodeError, TypeError) as e:
-                    logger.debug(f"Failed to parse equipment data JSON: {e}")
+                # Build snippet from the preview rendered at insert time
+                if entry.snippet_preview is not None:
+                    snippet = f"{entry.data_type}: {entry.snippet_preview}"
+                else:
                     snippet = f"{entry.data_type} data for {entry.equipment_tag}"
 
                 results.append(SearchResult(
@@ -0,0 +1,230 @@
+"""
+Semantic Result Cache
+
+In-process cache of search results keyed by query embedding similarity.
+A lookup hits when a previous query under the same key has cosine
+similarity >= threshold and has not expired. Entries are bounded in total:
+expired entries are purged on put, the least recently used keys are
+evicted past max_entries, and keys stored under a superseded project
+cache version are dropped as soon as the new version is stored.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.database import ProjectCacheVersion
+
+logger = logging.getLogger(__name__)
+
+# Cache defaults
+SIMILARITY_THRESHOLD = 0.95
+TTL_SECONDS = 300.0
+MAX_ENTRIES_PER_KEY = 1000
+MAX_ENTRIES = 4096
+
+# Cache keys are salted with the project's trigger-maintained cache version
+# (scripts/migrations/012); it is re-read at most this often per project
+PROJECT_VERSION_TTL_SECONDS = 5.0
+
+# project_id -> (fetched at, project cache version)
+_project_versions: Dict[Optional[int], Tuple[float, int]] = {}
+_project_versions_lock = threading.Lock()
+
+
+def project_cache_version(db: Session, project_id: Optional[int] = None) -> int:
+    """Return the project's cache version, re-read at most every PROJECT_VERSION_TTL_SECONDS.
+
+    The version is bumped by database triggers on writes to the project's
+    equipment, aliases, locations, equipment data and documents, so salting
+    cache keys with it invalidates them across all worker processes.
+    Without a project, the sum over all projects is used.
+    """
+    cache_key = project_id or None
+    now = time.monotonic()
+    with _project_versions_lock:
+        cached = _project_versions.get(cache_key)
+    if cached is not None and now - cached[0] <= PROJECT_VERSION_TTL_SECONDS:
+        return cached[1]
+
+    if cache_key is None:
+        version = db.query(func.coalesce(func.sum(ProjectCacheVersion.version), 0)).scalar()
+    else:
+        version = db.query(ProjectCacheVersion.version).filter(
+            ProjectCacheVersion.project_id == cache_key
+        ).scalar() or 0
+    version = int(version)
+
+    with _project_versions_lock:
+        _project_versions[cache_key] = (now, version)
+    return version
+
+
+def _normalize(embedding: Sequence[float]) -> Optional[np.ndarray]:
+    """L2-normalize an embedding so a dot product is cosine similarity."""
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        return None
+    return vec / norm
+
+
+class _Bucket:
+    """Embeddings and results stored under one cache key."""
+
+    __slots__ = ("vectors", "results", "created", "last_used", "project", "version")
+
+    def __init__(self, dim: int, project: Hashable = None, version: Optional[int] = None):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.results: List[List[Any]] = []
+        self.created: List[float] = []
+        self.last_used: List[float] = []
+        self.project = project
+        self.version = version
+
+    def remove(self, idx: int) -> None:
+        self.vectors = np.delete(self.vectors, idx, axis=0)
+        del self.results[idx]
+        del self.created[idx]
+        del self.last_used[idx]
+
+    def purge_expired(self, cutoff: float) -> int:
+        """Drop entries created before cutoff; returns how many were dropped."""
+        keep = [i for i, created in enumerate(self.created) if created >= cutoff]
+        dropped = len(self.created) - len(keep)
+        if dropped:
+            self.vectors = self.vectors[keep]
+            self.results = [self.results[i] for i in keep]
+            self.created = [self.created[i] for i in keep]
+            self.last_used = [self.last_used[i] for i in keep]
+        return dropped
+
+
+class SemanticResultCache:
+    """Caches result lists by query embedding, matched on cosine similarity."""
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl_seconds: float = TTL_SECONDS,
+        max_entries_per_key: int = MAX_ENTRIES_PER_KEY,
+        max_entries: int = MAX_ENTRIES
+    ):
+        self._threshold = threshold
+        self._ttl = ttl_seconds
+        self._max_entries_per_key = max_entries_per_key
+        self._max_entries = max_entries
+        # Least recently used key first
+        self._buckets: "OrderedDict[Hashable, _Bucket]" = OrderedDict()
+        self._total = 0
+        # project -> newest cache version stored for it
+        self._versions: Dict[Hashable, int] = {}
+        self._last_sweep = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, embedding: Sequence[float]) -> Optional[List[Any]]:
+        """Return cached results for a near-identical query under key, or None."""
+        vec = _normalize(embedding)
+        if vec is None:
+            return None
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or not bucket.results:
+                return None
+
+            scores = bucket.vectors @ vec
+            idx = int(np.argmax(scores))
+            if scores[idx] < self._threshold:
+                return None
+
+            now = time.monotonic()
+            if now - bucket.created[idx] > self._ttl:
+                bucket.remove(idx)
+                self._total -= 1
+                if not bucket.results:
+                    del self._buckets[key]
+                return None
+
+            bucket.last_used[idx] = now
+            self._buckets.move_to_end(key)
+            return list(bucket.results[idx])
+
+    def put(
+        self,
+        key: Hashable,
+        embedding: Sequence[float],
+        results: List[Any],
+        project: Hashable = None,
+        version: Optional[int] = None
+    ) -> None:
+        """Store results for a query embedding under key.
+
+        When key is salted with a project cache version, pass the project and
+        version too: storing a new version drops the project's keys under the
+        old one, which can never be looked up again.
+        """
+        vec = _normalize(embedding)
+        if vec is None:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if version is not None and self._versions.get(project, version) != version:
+                # The version moved (bumped, or the all-projects sum dropped
+                # after a delete): keys under the old one can never hit again
+                self._drop_where(lambda b: b.project == project and b.version not in (None, version))
+            if version is not None:
+                self._versions[project] = version
+
+            if now - self._last_sweep > self._ttl:
+                # Expired entries are otherwise only dropped when looked up
+                self._last_sweep = now
+                for bucket in self._buckets.values():
+                    self._total -= bucket.purge_expired(now - self._ttl)
+                self._drop_where(lambda b: not b.results)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(vec.shape[0], project, version)
+            else:
+                self._total -= bucket.purge_expired(now - self._ttl)
+            self._buckets.move_to_end(key)
+
+            if len(bucket.results) >= self._max_entries_per_key:
+                # Evict the least recently used entry
+                bucket.remove(int(np.argmin(bucket.last_used)))
+                self._total -= 1
+
+            bucket.vectors = np.vstack([bucket.vectors, vec])
+            bucket.results.append(list(results))
+            bucket.created.append(now)
+            bucket.last_used.append(now)
+            self._total += 1
+
+            # Past the total cap, evict whole least recently used keys
+            while self._total > self._max_entries and len(self._buckets) > 1:
+                _, evicted = self._buckets.popitem(last=False)
+                self._total -= len(evicted.results)
+
+    def _drop_where(self, predicate) -> None:
+        """Drop every key whose bucket matches predicate (lock held)."""
+        for key in [key for key, bucket in self._buckets.items() if predicate(bucket)]:
+            self._total -= len(self._buckets.pop(key).results)
+
+    def clear(self) -> None:
+        """Drop all cached entries (e.g. after new documents are ingested)."""
+        with self._lock:
+            self._buckets.clear()
+            self._versions.clear()
+            self._total = 0
+
+
+# Singleton instance, shared by all search agents
+semantic_cache = SemanticResultCache()
@@ -1,21 +1,27 @@
 import os
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional
 from sqlalchemy.orm import Session
 
 from app.models.database import (
     SupplementaryDocument, SupplementaryChunk, EquipmentData,
-    Equipment, EquipmentProfile
+    Equipment, EquipmentProfile, build_snippet_preview
 )
 from app.services.excel_processor import excel_processor
 from app.services.word_processor import word_processor
 from app.services.alias_service import alias_service
 from app.services.embedding_service import embedding_service
+from app.services.semantic_cache import semantic_cache
+from app.services.search_service import search_service
 
 logger = logging.getLogger(__name__)
 
+# Concurrent per-chunk embedding calls when the batch call fails
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "8"))
+
 
 class SupplementaryProcessor:
     """Orchestrate processing of supplementary documents (Excel, Word)"""
@@ -69,13 +75,22 @@ class SupplementaryProcessor:
                 Equipment.project_id == document.project_id
             ).all()
 
-            # Store structured equipment data with fuzzy matching
-            for data in structured_data:
-                self._store_equipment_data(db, document, data, equipment_list)
+            # Match structured equipment data (fuzzy matching)
+            data_rows = [
+                self._equipment_data_row(db, document, data, equipment_list)
+                for data in structured_data
+            ]
+
+            # Embed all chunks together
+            embeddings = self._embed_chunks(chunks)
+            chunk_rows = [
+                self._chunk_row(document, chunk, embedding)
+                for chunk, embedding in zip(chunks, embeddings)
+            ]
 
-            # Store and embed chunks
-            for chunk in chunks:
-                self._store_chunk(db, document, chunk)
+            # One bulk INSERT per table, committed with the status update below
+            db.bulk_insert_mappings(EquipmentData, data_rows)
+            db.bulk_insert_mappings(SupplementaryChunk, chunk_rows)
 
             # Store AI analysis summary if available
             if ai_results and not ai_results.get('error'):
@@ -87,6 +102,10 @@ class SupplementaryProcessor:
 
             logger.info(f"Successfully processed document {document.id}")
 
+            # New chunks/data can change agent and search results; drop cached ones
+            semantic_cache.clear()
+            search_service.clear_response_cache()
+
             # Rebuild profiles for affected equipment
             self._rebuild_affected_profiles(db, document)
 
@@ -94,6 +113,7 @@ class SupplementaryProcessor:
 
         except Exception as e:
             logger.error(f"Error processing document {document.id}: {e}")
+            db.rollback()  # A failed bulk insert leaves the transaction unusable
             document.processed = -1  # Error
             document.processing_error = str(e)
             db.commit()
@@ -134,7 +154,7 @@ class SupplementaryProcessor:
             structured_data.append({
                 'equipment_tag': tag,
                 'data_type': 'SPECIFICATION',
-                'data_json': json.dumps(data_json, default=str),
+                'data_json': data_json,
                 'source_location': f"AI:{document.original_filename}"
             })
 
@@ -157,7 +177,7 @@ class SupplementaryProcessor:
             structured_data.append({
                 'equipment_tag': tag,
                 'data_type': 'IO_POINT',
-                'data_json': json.dumps(data_json, default=str),
+                'data_json': data_json,
                 'source_location': f"AI:{document.original_filename}"
             })
 
@@ -181,7 +201,7 @@ class SupplementaryProcessor:
             structured_data.append({
                 'equipment_tag': tag,
                 'data_type': 'ALARM',
-                'data_json': json.dumps(data_json, default=str),
+                'data_json': data_json,
                 'source_location': f"AI:{document.original_filename}"
             })
 
@@ -202,7 +222,7 @@ class SupplementaryProcessor:
             structured_data.append({
                 'equipment_tag': tag,
                 'data_type': 'SEQUENCE',
-                'data_json': json.dumps(data_json, default=str),
+                'data_json': data_json,
                 'source_location': f"AI:{document.original_filename}"
             })
 
@@ -225,7 +245,7 @@ class SupplementaryProcessor:
             structured_data.append({
                 'equipment_tag': tag,
                 'data_type': 'SPECIFICATION',
-                'data_json': json.dumps(data_json, default=str),
+                'data_json': data_json,
                 'source_location': f"AI:{document.original_filename}"
             })
 
@@ -246,7 +266,7 @@ class SupplementaryProcessor:
             structured_data.append({
                 'equipment_tag': tag,
                 'data_type': 'SPECIFICATION',
-                'data_json': json.dumps(data_json, default=str),
+                'data_json': data_json,
                 'source_location': f"AI:{document.original_filename}"
             })
 
@@ -268,7 +288,7 @@ class SupplementaryProcessor:
             structured_data.append({
                 'equipment_tag': tag,
                 'data_type': 'SPECIFICATION',
-                'data_json': json.dumps(data_json, default=str),
+                'data_json': data_json,
                 'source_location': f"AI:{document.original_filename}"
             })
 
@@ -289,21 +309,24 @@ class SupplementaryProcessor:
             structured_data.append({
                 'equipment_tag': source,
                 'data_type': 'SPECIFICATION',
-                'data_json': json.dumps(data_json, default=str),
+                'data_json': data_json,
                 'source_location': f"AI:{document.original_filename}"
             })
 
         return structured_data
 
-    def _store_equipment_data(self, db: Session, document: SupplementaryDocument,
-                              data: dict, equipment_list: list) -> EquipmentData:
-        """Store equipment data entry with fuzzy matching
+    def _equipment_data_row(self, db: Session, document: SupplementaryDocument,
+                            data: dict, equipment_list: list) -> dict:
+        """Build an equipment data row for bulk insert, with fuzzy matching
 
         Args:
             db: Database session
             document: Parent document
             data: Dict with equipment_tag, data_type, data_json, source_location
             equipment_list: List of Equipment objects for fuzzy matching
+
+        Returns:
+            Column mapping for EquipmentData
         """
         equipment_tag = data['equipment_tag']
 
@@ -322,53 +345,72 @@ class SupplementaryProcessor:
                 confidence=confidence
             )
 
-        # Store the data entry
-        entry = EquipmentData(
-            document_id=document.id,
-            equipment_tag=equipment_tag,
-            equipment_id=equipment_id,
-            match_confidence=confidence if equipment else None,
-            data_type=data['data_type'],
-            data_json=data['data_json'],
-            source_location=data.get('source_location', '')
-        )
-        db.add(entry)
-        db.commit()
-
-        logger.debug(f"Stored equipment data for {equipment_tag} "
+        logger.debug(f"Matched equipment data for {equipment_tag} "
                     f"(matched: {equipment.tag if equipment else 'None'})")
 
-        return entry
+        # Bulk inserts skip the before_insert listener, so set the preview here
+        return {
+            'document_id': document.id,
+            'equipment_tag': equipment_tag,
+            'equipment_id': equipment_id,
+            'match_confidence': confidence if equipment else None,
+            'data_type': data['data_type'],
+            'data_json': data['data_json'],
+            'snippet_preview': build_snippet_preview(data['data_json']),
+            'source_location': data.get('source_location', '')
+        }
+
+    def _embed_chunks(self, chunks: list) -> list:
+        """Embed chunk contents in one batched model call
 
-    def _store_chunk(self, db: Session, document: SupplementaryDocument,
-                     chunk: dict) -> SupplementaryChunk:
-        """Store a text chunk with embedding
+        Falls back to one call per chunk (EMBED_CONCURRENCY at a time) if the
+        batch fails, so a single bad chunk only loses its own embedding (None).
 
         Args:
-            db: Database session
-            document: Parent document
-            chunk: Dict with chunk_index, content, source_location, equipment_tags
+            chunks: Dicts with content
+
+        Returns:
+            Embeddings (or None) in chunk order
         """
-        # Generate embedding for the content
-        content = chunk['content']
+        if not chunks:
+            return []
+
+        contents = [chunk['content'] for chunk in chunks]
         try:
-            embedding = embedding_service.generate_embedding(content)
+            return embedding_service.generate_embeddings_batch(contents)
         except Exception as e:
-            logger.warning(f"Failed to generate embedding: {e}")
-            embedding = None
-
-        chunk_record = SupplementaryChunk(
-            document_id=document.id,
-            chunk_index=chunk['chunk_index'],
-            content=content,
-            source_location=chunk.get('source_location', ''),
-            equipment_tags=chunk.get('equipment_tags'),
-            embedding=embedding
-        )
-        db.add(chunk_record)
-        db.commit()
+            logger.warning(f"Batch embedding failed, embedding chunks one by one: {e}")
+
+        def embed_one(content: str) -> Optional[list]:
+            try:
+                return embedding_service.generate_embedding(content)
+            except Exception as e:
+                logger.warning(f"Failed to generate embedding: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(EMBED_CONCURRENCY, len(contents)))) as executor:
+            return list(executor.map(embed_one, contents))
 
-        return chunk_record
+    def _chunk_row(self, document: SupplementaryDocument, chunk: dict,
+                   embedding: Optional[list]) -> dict:
+        """Build a text chunk row for bulk insert
+
+        Args:
+            document: Parent document
+            chunk: Dict with chunk_index, content, source_location, equipment_tags
+            embedding: Embedding from _embed_chunks, or None
+
+        Returns:
+            Column mapping for SupplementaryChunk
+        """
+        return {
+            'document_id': document.id,
+            'chunk_index': chunk['chunk_index'],
+            'content': chunk['content'],
+            'source_location': chunk.get('source_location', ''),
+            'equipment_tags': chunk.get('equipment_tags'),
+            'embedding': embedding
+        }
 
     def _rebuild_affected_profiles(self, db: Session, document: SupplementaryDocument) -> None:
         """Rebuild equipment profiles for equipment mentioned in document
@@ -427,10 +469,9 @@ class SupplementaryProcessor:
         seen_docs = set()
 
         for entry in data_entries:
-            try:
-                data = json.loads(entry.data_json)
-            except json.JSONDecodeError as e:
-                logger.warning(f"Invalid JSON in equipment data {entry.id}: {e}")
+            data = entry.data_json
+            if not isinstance(data, dict):
+                logger.warning(f"Invalid JSON object in equipment data {entry.id}")
                 continue
 
             # Track source documents
@@ -263,7 +263,7 @@ class WordProcessor:
                 structured_data.append({
                     'equipment_tag': equipment_tag.upper(),
                     'data_type': 'SCHEDULE_ENTRY',  # Default for table data
-                    'data_json': json.dumps(row_data, default=str),
+                    'data_json': row_data,
                     'source_location': f"Table {table_idx + 1}, Row {row_idx + 1}"
                 })
 
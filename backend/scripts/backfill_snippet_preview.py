@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Backfill equipment_data.snippet_preview
+
+One-time script for rows inserted before the snippet_preview column existed
+(see scripts/migrations/011_equipment_data_snippet_preview.sql). New rows get
+their preview from the EquipmentData before_insert listener.
+
+Usage:
+    cd backend
+    python scripts/backfill_snippet_preview.py --batch-size 1000
+
+Environment:
+    Needs DATABASE_URL.
+"""
+
+import sys
+import os
+import argparse
+import logging
+
+# Add app to path (same pattern as backend/scripts/reprocess.py)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def backfill(batch_size: int) -> int:
+    from app.db.session import SessionLocal
+    from app.models.database import EquipmentData, build_snippet_preview
+
+    db = SessionLocal()
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.query(EquipmentData.id, EquipmentData.data_json).filter(
+                EquipmentData.snippet_preview.is_(None),
+                EquipmentData.id > last_id
+            ).order_by(EquipmentData.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            mappings = []
+            for row in rows:
+                preview = build_snippet_preview(row.data_json)
+                if preview is not None:
+                    mappings.append({"id": row.id, "snippet_preview": preview})
+            if mappings:
+                db.bulk_update_mappings(EquipmentData, mappings)
+                db.commit()
+
+            updated += len(mappings)
+            last_id = rows[-1].id
+            logger.info(f"Backfilled {updated} rows (through id {last_id})")
+    finally:
+        db.close()
+
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill equipment_data.snippet_preview")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per commit (default: 1000)")
+    args = parser.parse_args()
+
+    updated = backfill(args.batch_size)
+    logger.info(f"Done: {updated} equipment_data rows backfilled")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from app.services.embedding_service import EmbeddingService
+
+
+def _service(lowercase=True):
+    """EmbeddingService over a fake model whose embedding encodes the text length"""
+    with patch("app.services.embedding_service.SentenceTransformer") as model_cls:
+        model = model_cls.return_value
+        model.tokenizer.do_lower_case = lowercase
+        model.encode.side_effect = lambda texts, convert_to_numpy=True: np.array(
+            [[float(len(text)), 1.0] for text in texts]
+        )
+        return EmbeddingService(), model
+
+
+def test_query_embeddings_batch_misses_in_one_call():
+    service, model = _service()
+
+    embeddings = service.generate_query_embeddings(["pump", "supply fan", "pump"])
+
+    assert embeddings == [(4.0, 1.0), (10.0, 1.0), (4.0, 1.0)]
+    model.encode.assert_called_once_with(["pump", "supply fan"], convert_to_numpy=True)
+
+
+def test_query_embeddings_cached_across_calls():
+    service, model = _service()
+    service.generate_query_embeddings(["pump", "supply fan"])
+
+    assert service.generate_query_embedding("supply fan") == (10.0, 1.0)
+    assert service.generate_query_embeddings(["pump", "chiller"]) == [(4.0, 1.0), (7.0, 1.0)]
+
+    assert model.encode.call_count == 2
+    model.encode.assert_called_with(["chiller"], convert_to_numpy=True)
+
+
+def test_query_key_normalizes_whitespace_and_case():
+    service, model = _service(lowercase=True)
+    service.generate_query_embedding("Supply  Fan")
+
+    assert service.generate_query_embedding(" supply fan ") == (10.0, 1.0)
+    model.encode.assert_called_once_with(["supply fan"], convert_to_numpy=True)
+
+
+def test_query_key_keeps_case_for_cased_models():
+    service, model = _service(lowercase=False)
+    service.generate_query_embeddings(["AHU-1", "ahu-1"])
+
+    model.encode.assert_called_once_with(["AHU-1", "ahu-1"], convert_to_numpy=True)
+
+
+def test_blank_query_embeds_as_zeros_without_the_model():
+    service, model = _service()
+
+    assert service.generate_query_embedding("   ") == (0.0,) * service.embedding_dim
+    model.encode.assert_not_called()
+
+
+def test_query_cache_evicts_least_recently_used():
+    service, model = _service()
+    with patch("app.services.embedding_service.QUERY_EMBEDDING_CACHE_SIZE", 2):
+        service.generate_query_embeddings(["a1", "b22"])
+        service.generate_query_embedding("a1")  # "a1" now more recent than "b22"
+        service.generate_query_embedding("c333")
+        model.encode.reset_mock()
+
+        service.generate_query_embeddings(["a1", "c333"])
+        model.encode.assert_not_called()
+        service.generate_query_embedding("b22")
+        model.encode.assert_called_once_with(["b22"], convert_to_numpy=True)
@@ -0,0 +1,236 @@
+import re
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.models.schemas import DocumentResponse, EquipmentBrief, QueryType, SearchResult
+from app.services.search_service import (
+    RRF_K,
+    _classify_query_lower,
+    _is_word_boundary,
+    search_service,
+)
+
+
+def _document(doc_id=1):
+    return DocumentResponse(
+        id=doc_id, filename=f"doc{doc_id}.pdf", original_filename=f"doc{doc_id}.pdf",
+        file_size=None, page_count=None, upload_date=datetime(2026, 1, 1), processed=1
+    )
+
+
+def _result(match_type, score, snippet=None, tag=None, doc_id=1, page=1, source_location=None):
+    return SearchResult(
+        equipment=EquipmentBrief(id=0, tag=tag, equipment_type=None) if tag else None,
+        document=_document(doc_id),
+        page_number=page,
+        relevance_score=score,
+        snippet=snippet,
+        match_type=match_type,
+        source_location=source_location,
+    )
+
+
+def _baseline_score(result, query, query_type, equipment_tags):
+    """The per-result scoring formula _calculate_relevance_scores replaced"""
+    data_type = None
+    if result.match_type == "equipment_data" and result.snippet:
+        for dt in ["SPECIFICATION", "IO_POINT", "ALARM", "SCHEDULE_ENTRY", "SEQUENCE"]:
+            if dt in result.snippet.upper():
+                data_type = dt
+                break
+    snippet = result.snippet
+    result_equipment_tag = result.equipment.tag if result.equipment else None
+
+    score = result.relevance_score
+    score *= {
+        "exact": 1.5, "text_search": 1.3, "semantic": 1.0, "keyword": 0.8,
+        "supplementary_semantic": 1.1, "equipment_data": 1.4, "graph_relationship": 1.35,
+    }.get(result.match_type, 1.0)
+
+    if result_equipment_tag and equipment_tags:
+        if any(result_equipment_tag.upper() == et.upper() for et in equipment_tags):
+            score *= 2.0
+
+    if data_type:
+        aligned_types = {
+            QueryType.EQUIPMENT_LOOKUP: ["SPECIFICATION", "SCHEDULE_ENTRY"],
+            QueryType.RELATIONSHIP: ["SPECIFICATION"],
+            QueryType.UPSTREAM_DOWNSTREAM: ["SPECIFICATION"],
+            QueryType.WIRE_TRACE: ["IO_POINT"],
+            QueryType.GENERAL: [],
+        }.get(query_type, [])
+        if data_type in aligned_types:
+            score *= 1.2
+
+    if query_type == QueryType.EQUIPMENT_LOOKUP and any(word in query.lower() for word in ["where", "locate", "room"]):
+        if re.search(r'\b\d-\d{3}\b', snippet or ""):
+            score *= 1.4
+
+    if snippet:
+        query_words = set(query.lower().split())
+        query_words -= {"what", "where", "is", "the", "a", "an", "and", "or", "for", "to", "of", "in", "on"}
+        matches = sum(1 for word in query_words if word in snippet.lower())
+        if matches > 0:
+            score *= min(1.0 + (matches * 0.1), 1.5)
+
+    if snippet:
+        if len(snippet) < 50:
+            score *= 0.8
+        elif len(snippet) > 200:
+            score *= 1.1
+
+    return min(score, 2.0)
+
+
+def _baseline_classify(query):
+    """The if-chain classify_query replaced"""
+    query_lower = query.lower()
+    if any(word in query_lower for word in ['where is', 'find', 'locate', 'which drawing', 'which page']):
+        return QueryType.EQUIPMENT_LOOKUP
+    if any(word in query_lower for word in ['control', 'controls', 'controlled by', 'what controls']):
+        return QueryType.RELATIONSHIP
+    if any(word in query_lower for word in ['upstream', 'downstream', 'feeds', 'powered by', 'powers']):
+        return QueryType.UPSTREAM_DOWNSTREAM
+    if any(word in query_lower for word in ['wire', 'cable', 'conductor', 'w-']):
+        return QueryType.WIRE_TRACE
+    if re.search(r'\b[A-Z]{2,4}-?\d{2,4}\b', query, re.IGNORECASE):
+        return QueryType.EQUIPMENT_LOOKUP
+    return QueryType.GENERAL
+
+
+def _baseline_aliases(query, aliases):
+    """The per-alias regex scan _find_aliases_in_query replaced"""
+    found_tags = []
+    query_upper = query.upper()
+    for alias, tag in aliases:
+        alias_upper = alias.upper()
+        if len(alias_upper) < 3:
+            continue
+        if len(alias_upper) <= 5:
+            matched = re.search(r'\b' + re.escape(alias_upper) + r'\b', query_upper)
+        else:
+            matched = alias_upper in query_upper
+        if matched and tag not in found_tags:
+            found_tags.append(tag)
+    return found_tags
+
+
+SCORING_QUERIES = [
+    ("where is P-101 located in room 1-117", QueryType.EQUIPMENT_LOOKUP, ["P-101"]),
+    ("what controls AHU-1", QueryType.RELATIONSHIP, ["AHU-1", "AHU1"]),
+    ("io points for the chiller", QueryType.WIRE_TRACE, []),
+    ("supply fan horsepower", QueryType.GENERAL, []),
+]
+
+
+@pytest.mark.parametrize("query,query_type,equipment_tags", SCORING_QUERIES)
+def test_relevance_scores_match_baseline_formula(query, query_type, equipment_tags):
+    results = [
+        _result("exact", 0.9, "P-101 pump in room 1-117 on the first floor plan", tag="P-101"),
+        _result("text_search", 0.7, "AHU-1 controlled by PLC-2 " * 12, tag="ahu-1"),
+        _result("semantic", 0.55, None),
+        _result("keyword", 0.4, "short"),
+        _result("supplementary_semantic", 0.8, "chiller IO points: AI supply temp, DO enable"),
+        _result("equipment_data", 0.95, "SPECIFICATION: hp=25, voltage=480", tag="P-101"),
+        _result("equipment_data", 0.95, "IO_POINT: signal=AI, point=supply fan status", tag="SF-1"),
+        _result("graph_relationship", 1.0, "AHU-1 feeds VAV-3", tag="AHU-1"),
+        _result("unknown_branch", 0.3, "room 2-204 where equipment is located"),
+        _result("exact", 1.9, "P-101 " * 60, tag="P-101"),
+    ]
+    expected = [_baseline_score(r, query, query_type, equipment_tags) for r in results]
+
+    scores = search_service._calculate_relevance_scores(results, query, query_type, equipment_tags)
+
+    assert scores.tolist() == pytest.approx(expected)
+
+
+def test_relevance_scores_empty():
+    assert search_service._calculate_relevance_scores([], "pump", QueryType.GENERAL, []).size == 0
+
+
+@pytest.mark.parametrize("query", [
+    "where is P-101",
+    "find the MCC that feeds AHU-1",
+    "what controls ahu-1",
+    "upstream of XFMR-2",
+    "powered by panel LP-1",
+    "wire W-101 to the VFD",
+    "cable schedule",
+    "VFD101 speed",
+    "vfd 101 speed",
+    "list all pumps",
+    "which page shows the controllers",
+    "downstream wire trace",
+    "",
+])
+def test_classify_query_matches_baseline(query):
+    assert _classify_query_lower(query.lower()) == _baseline_classify(query)
+
+
+@pytest.mark.parametrize("text,pos", [
+    ("AHU-1", 0), ("AHU-1", 3), ("AHU-1", 4), ("AHU-1", 5),
+    ("SF_1 ON", 2), ("SF_1 ON", 4), ("", 0), ("A", 1), ("(PLC)", 1), ("(PLC)", 4),
+])
+def test_is_word_boundary_matches_regex(text, pos):
+    expected = any(m.start() == pos for m in re.finditer(r"\b", text))
+    assert _is_word_boundary(text, pos) == expected
+
+
+ALIASES = [
+    ("SF", "SF-1"),  # too short, never matched
+    ("Fan", "SF-1"),
+    ("Supply Fan", "SF-1"),
+    ("AHU", "AHU-1"),
+    ("Air Handling Unit 1", "AHU-1"),
+    ("P101", "P-101"),
+    ("Pump", "P-101"),
+]
+
+
+@pytest.mark.parametrize("query", [
+    "supply fan for air handling unit 1",
+    "fans on the roof",
+    "ahu feeds",
+    "AHU1 status",
+    "where is p101",
+    "pumps and fan",
+    "pump and supply fan",
+    "nothing here",
+])
+def test_alias_automaton_matches_baseline(query):
+    db = MagicMock()
+    db.query.return_value.join.return_value = ALIASES
+    with patch("app.services.search_service.project_cache_version", return_value=object()):
+        found = search_service._find_aliases_in_query(db, [query])
+
+    # Tags come back in query order rather than alias table order
+    assert sorted(found) == sorted(_baseline_aliases(query, ALIASES))
+
+
+def test_rrf_scores_fuse_branch_ranks():
+    a = _result("exact", 0.9, page=1)
+    b = _result("semantic", 0.8, page=2)
+    c = _result("keyword", 0.7, page=3)
+    unranked = _result("keyword", 0.6, page=4)
+    branch_results = [
+        ("exact", [a]),
+        ("semantic", [b, a]),
+        ("keyword", [c, _result("keyword", 0.5, page=2)]),  # duplicate of b, dropped during merging
+    ]
+
+    scores = search_service._rrf_scores([a, b, c, unranked], branch_results)
+
+    fused = [
+        1.5 / (RRF_K + 1) + 1.0 / (RRF_K + 2),
+        1.0 / (RRF_K + 1) + 0.8 / (RRF_K + 2),
+        0.8 / (RRF_K + 1),
+        0.0,
+    ]
+    assert scores.tolist() == pytest.approx([2.0 * f / max(fused) for f in fused])
+
+
+def test_rrf_scores_without_branch_hits():
+    scores = search_service._rrf_scores([_result("keyword", 0.5)], [])
+    assert scores.tolist() == [0.0]
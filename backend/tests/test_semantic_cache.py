@@ -0,0 +1,89 @@
+from itertools import count
+from unittest.mock import MagicMock, patch
+
+from app.services import semantic_cache
+from app.services.semantic_cache import SemanticResultCache, project_cache_version
+
+
+def test_hit_on_near_identical_embedding():
+    cache = SemanticResultCache(threshold=0.95)
+    cache.put(("SequenceAgent", 1), [1.0, 0.0, 0.0], ["r1"])
+
+    assert cache.get(("SequenceAgent", 1), [0.99, 0.01, 0.0]) == ["r1"]
+    assert cache.get(("SequenceAgent", 1), [0.0, 1.0, 0.0]) is None
+
+
+def test_keys_are_isolated():
+    cache = SemanticResultCache()
+    cache.put(("SequenceAgent", 1), [1.0, 0.0], ["r1"])
+
+    assert cache.get(("SequenceAgent", 2), [1.0, 0.0]) is None
+    assert cache.get(("IOControlAgent", 1), [1.0, 0.0]) is None
+
+
+def test_expired_entries_miss():
+    cache = SemanticResultCache(ttl_seconds=10)
+    with patch("app.services.semantic_cache.time.monotonic", return_value=100.0):
+        cache.put("k", [1.0, 0.0], ["r1"])
+    with patch("app.services.semantic_cache.time.monotonic", return_value=111.0):
+        assert cache.get("k", [1.0, 0.0]) is None
+
+
+def test_evicts_least_recently_used():
+    cache = SemanticResultCache(max_entries_per_key=2)
+    with patch("app.services.semantic_cache.time.monotonic", side_effect=count(1.0)):
+        cache.put("k", [1.0, 0.0], ["a"])
+        cache.put("k", [0.0, 1.0], ["b"])
+        assert cache.get("k", [1.0, 0.0]) == ["a"]  # "a" now more recent than "b"
+        cache.put("k", [-1.0, 0.0], ["c"])
+
+        assert cache.get("k", [0.0, 1.0]) is None
+        assert cache.get("k", [1.0, 0.0]) == ["a"]
+        assert cache.get("k", [-1.0, 0.0]) == ["c"]
+
+
+def test_new_project_version_drops_stale_keys():
+    cache = SemanticResultCache()
+    cache.put(("SequenceAgent", 1, 7), [1.0, 0.0], ["old"], project=1, version=7)
+    cache.put(("SequenceAgent", 2, 3), [1.0, 0.0], ["other"], project=2, version=3)
+    cache.put(("SequenceAgent", 1, 8), [1.0, 0.0], ["new"], project=1, version=8)
+
+    assert cache.get(("SequenceAgent", 1, 7), [1.0, 0.0]) is None
+    assert cache.get(("SequenceAgent", 1, 8), [1.0, 0.0]) == ["new"]
+    assert cache.get(("SequenceAgent", 2, 3), [1.0, 0.0]) == ["other"]
+
+
+def test_total_entries_capped_by_least_recently_used_key():
+    cache = SemanticResultCache(max_entries=2)
+    cache.put("a", [1.0, 0.0], ["a"])
+    cache.put("b", [1.0, 0.0], ["b"])
+    assert cache.get("a", [1.0, 0.0]) == ["a"]  # "a" now more recent than "b"
+    cache.put("c", [1.0, 0.0], ["c"])
+
+    assert cache.get("b", [1.0, 0.0]) is None
+    assert cache.get("a", [1.0, 0.0]) == ["a"]
+    assert cache.get("c", [1.0, 0.0]) == ["c"]
+
+
+def test_put_purges_expired_keys():
+    cache = SemanticResultCache(ttl_seconds=10)
+    with patch("app.services.semantic_cache.time.monotonic", return_value=100.0):
+        cache.put("stale", [1.0, 0.0], ["r1"])
+    with patch("app.services.semantic_cache.time.monotonic", return_value=200.0):
+        cache.put("fresh", [1.0, 0.0], ["r2"])
+
+    assert "stale" not in cache._buckets
+    assert cache._total == 1
+
+
+def test_project_cache_version_reread_after_ttl():
+    db = MagicMock()
+    db.query.return_value.filter.return_value.scalar.side_effect = [3, 4]
+    with patch.dict(semantic_cache._project_versions, clear=True):
+        with patch("app.services.semantic_cache.time.monotonic", return_value=100.0):
+            assert project_cache_version(db, 7) == 3
+            assert project_cache_version(db, 7) == 3
+        with patch("app.services.semantic_cache.time.monotonic", return_value=106.0):
+            assert project_cache_version(db, 7) == 4
+
+    assert db.query.return_value.filter.return_value.scalar.call_count == 2
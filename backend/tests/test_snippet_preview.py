@@ -0,0 +1,23 @@
+from app.models.database import build_snippet_preview
+
+
+def _baseline_preview(data):
+    """The snippet body the search paths built from data_json before snippet_preview"""
+    return ", ".join(f"{k}={v}" for k, v in list(data.items())[:5])
+
+
+def test_preview_matches_baseline_snippet():
+    data = {"hp": 25, "voltage": 480, "phase": 3, "rpm": 1750, "enclosure": "TEFC", "frame": "284T"}
+
+    assert build_snippet_preview(data) == _baseline_preview(data)
+    assert build_snippet_preview(data) == "hp=25, voltage=480, phase=3, rpm=1750, enclosure=TEFC"
+
+
+def test_preview_of_short_and_empty_objects():
+    assert build_snippet_preview({"tag": "P-101"}) == "tag=P-101"
+    assert build_snippet_preview({}) == ""
+
+
+def test_preview_of_non_object_json():
+    assert build_snippet_preview(["P-101", "P-102"]) is None
+    assert build_snippet_preview(None) is None
@@ -0,0 +1,13 @@
+-- Migration: Binary-quantized ANN index for supplementary chunk embeddings
+-- Purpose: Cheap coarse candidate retrieval for two-stage chunk search
+-- Requires: pgvector >= 0.7 (binary_quantize, bit_hamming_ops)
+
+-- One bit per dimension (48 bytes per 384-dim vector). Chunk search pulls a
+-- candidate pool by Hamming distance on this index, then reranks the pool by
+-- exact cosine distance on the FP32 embedding column.
+-- Queries must ORDER BY the exact same expression to use this index:
+--   ORDER BY binary_quantize(sc.embedding)::bit(384) <~> binary_quantize(CAST(:embedding AS vector(384)))
+CREATE INDEX IF NOT EXISTS idx_supplementary_chunks_embedding_bit
+    ON supplementary_chunks
+    USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops)
+    WITH (m = 16, ef_construction = 64);
@@ -0,0 +1,19 @@
+-- Migration: Indexes for supplementary document keyword search
+-- Purpose: Serve the sequence-of-operation category filter and the
+--          ILIKE '%...%' predicates in the search agents from indexes
+
+-- Trigram operator classes let GIN indexes answer LIKE/ILIKE with leading wildcards
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Partial index: sequence documents per project (SequenceAgent document search)
+CREATE INDEX IF NOT EXISTS idx_supplementary_documents_seq_op_project
+    ON supplementary_documents(project_id)
+    WHERE content_category = 'SEQUENCE_OF_OPERATION';
+
+-- Trigram index for chunk content ILIKE filters (tag mentions, keyword OR chains)
+CREATE INDEX IF NOT EXISTS idx_supplementary_chunks_content_trgm
+    ON supplementary_chunks USING gin (content gin_trgm_ops);
+
+-- Trigram index for ILIKE '%TAG%' against the JSON tag list of each chunk
+CREATE INDEX IF NOT EXISTS idx_supplementary_chunks_equipment_tags_trgm
+    ON supplementary_chunks USING gin (equipment_tags gin_trgm_ops);
@@ -0,0 +1,11 @@
+-- Migration: Full-text search column for supplementary chunks
+-- Purpose: Replace chains of content ILIKE '%word%' keyword filters with a
+--          single tsquery match served by one GIN index
+
+-- Stored generated column, kept in sync by Postgres on insert/update
+ALTER TABLE supplementary_chunks
+    ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_supplementary_chunks_content_tsv
+    ON supplementary_chunks USING gin (content_tsv);
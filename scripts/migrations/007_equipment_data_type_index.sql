@@ -0,0 +1,7 @@
+-- Migration: Composite index for typed equipment data lookups
+-- Purpose: Agents always filter equipment_data by data_type (IO_POINT, ALARM,
+--          SEQUENCE, ...) together with an equipment_tag match; lead with
+--          data_type so each agent only touches its own slice of the table
+
+CREATE INDEX IF NOT EXISTS idx_equipment_data_type_tag
+    ON equipment_data(data_type, equipment_tag);
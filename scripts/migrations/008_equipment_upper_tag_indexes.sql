@@ -0,0 +1,10 @@
+-- Migration: Case-insensitive lookup indexes for equipment tags and aliases
+-- Purpose: Alias expansion matches upper(equipment.tag) and
+--          upper(equipment_aliases.alias) against the query's tags; expression
+--          indexes make those predicates index scans instead of table scans
+
+CREATE INDEX IF NOT EXISTS idx_equipment_upper_tag_project
+    ON equipment(upper(tag), project_id);
+
+CREATE INDEX IF NOT EXISTS idx_equipment_alias_upper_alias
+    ON equipment_aliases(upper(alias), equipment_id);
@@ -0,0 +1,8 @@
+-- Migration: Trigram index for equipment tag substring matches
+-- Purpose: "list all X" searches match equipment.tag ILIKE '%X%'; a leading
+--          wildcard cannot use a B-tree, so serve it from a trigram GIN index
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_equipment_tag_trgm
+    ON equipment USING gin (tag gin_trgm_ops);
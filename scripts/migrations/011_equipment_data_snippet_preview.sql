@@ -0,0 +1,6 @@
+-- Migration: Pre-rendered snippet preview for equipment data
+-- Purpose: Search built every equipment_data snippet by re-parsing data_json;
+--          store the first 5 key=value pairs at insert time instead.
+--          Existing rows are filled by backend/scripts/backfill_snippet_preview.py
+
+ALTER TABLE equipment_data ADD COLUMN IF NOT EXISTS snippet_preview TEXT;
@@ -0,0 +1,178 @@
+-- Migration: Per-project cache version counter
+-- Purpose: Search caches (responses, alias automata) are salted with a
+--          project's version, so any write to its equipment, aliases,
+--          locations, equipment data or documents invalidates them in every
+--          worker process without explicit purge calls.
+--          No foreign key to projects: cascading project deletes still fire
+--          the triggers below after the project row is gone. Project-less
+--          rows bump project 0, which only feeds the all-projects sum.
+
+CREATE TABLE IF NOT EXISTS project_cache_version (
+    project_id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Bumps each listed project once. Rows without a project (NULL project_id)
+-- bump project 0, so the all-projects sum used for project-less cache keys
+-- still moves. Sorted, so concurrent statements lock rows in the same order.
+CREATE OR REPLACE FUNCTION bump_project_cache_versions(p_project_ids INTEGER[]) RETURNS void AS $$
+BEGIN
+    INSERT INTO project_cache_version (project_id, version)
+    SELECT DISTINCT COALESCE(pid, 0), 1 FROM unnest(p_project_ids) AS pid
+    ORDER BY 1
+    ON CONFLICT (project_id) DO UPDATE SET version = project_cache_version.version + 1;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The triggers are per statement: a bulk insert of thousands of locations
+-- bumps its project once, not once per row. Each trigger function reads the
+-- statement's transition tables (new_rows / old_rows) for the projects hit.
+
+-- Tables that carry project_id directly (equipment, documents, supplementary_documents)
+CREATE OR REPLACE FUNCTION project_cache_version_direct() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_project_cache_versions(ARRAY(SELECT DISTINCT project_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM bump_project_cache_versions(ARRAY(SELECT DISTINCT project_id FROM old_rows));
+    ELSE
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT project_id FROM new_rows UNION SELECT project_id FROM old_rows
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tables that reach the project through equipment_id (equipment_aliases, equipment_locations)
+CREATE OR REPLACE FUNCTION project_cache_version_via_equipment() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT DISTINCT e.project_id FROM new_rows r JOIN equipment e ON e.id = r.equipment_id
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT DISTINCT e.project_id FROM old_rows r JOIN equipment e ON e.id = r.equipment_id
+        ));
+    ELSE
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT e.project_id FROM new_rows r JOIN equipment e ON e.id = r.equipment_id
+            UNION
+            SELECT e.project_id FROM old_rows r JOIN equipment e ON e.id = r.equipment_id
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- equipment_data reaches the project through its supplementary document
+CREATE OR REPLACE FUNCTION project_cache_version_via_supplementary_document() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT DISTINCT sd.project_id FROM new_rows r JOIN supplementary_documents sd ON sd.id = r.document_id
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT DISTINCT sd.project_id FROM old_rows r JOIN supplementary_documents sd ON sd.id = r.document_id
+        ));
+    ELSE
+        PERFORM bump_project_cache_versions(ARRAY(
+            SELECT sd.project_id FROM new_rows r JOIN supplementary_documents sd ON sd.id = r.document_id
+            UNION
+            SELECT sd.project_id FROM old_rows r JOIN supplementary_documents sd ON sd.id = r.document_id
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow only one event per trigger, hence three per table.
+-- The DROPs also remove the earlier per-row triggers (trg_<table>_cache_version).
+
+DROP TRIGGER IF EXISTS trg_equipment_cache_version ON equipment;
+DROP TRIGGER IF EXISTS trg_equipment_cache_version_ins ON equipment;
+CREATE TRIGGER trg_equipment_cache_version_ins
+    AFTER INSERT ON equipment REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_equipment_cache_version_upd ON equipment;
+CREATE TRIGGER trg_equipment_cache_version_upd
+    AFTER UPDATE ON equipment REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_equipment_cache_version_del ON equipment;
+CREATE TRIGGER trg_equipment_cache_version_del
+    AFTER DELETE ON equipment REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+
+DROP TRIGGER IF EXISTS trg_documents_cache_version ON documents;
+DROP TRIGGER IF EXISTS trg_documents_cache_version_ins ON documents;
+CREATE TRIGGER trg_documents_cache_version_ins
+    AFTER INSERT ON documents REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_documents_cache_version_upd ON documents;
+CREATE TRIGGER trg_documents_cache_version_upd
+    AFTER UPDATE ON documents REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_documents_cache_version_del ON documents;
+CREATE TRIGGER trg_documents_cache_version_del
+    AFTER DELETE ON documents REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+
+DROP TRIGGER IF EXISTS trg_supplementary_documents_cache_version ON supplementary_documents;
+DROP TRIGGER IF EXISTS trg_supplementary_documents_cache_version_ins ON supplementary_documents;
+CREATE TRIGGER trg_supplementary_documents_cache_version_ins
+    AFTER INSERT ON supplementary_documents REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_supplementary_documents_cache_version_upd ON supplementary_documents;
+CREATE TRIGGER trg_supplementary_documents_cache_version_upd
+    AFTER UPDATE ON supplementary_documents REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+DROP TRIGGER IF EXISTS trg_supplementary_documents_cache_version_del ON supplementary_documents;
+CREATE TRIGGER trg_supplementary_documents_cache_version_del
+    AFTER DELETE ON supplementary_documents REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_direct();
+
+DROP TRIGGER IF EXISTS trg_equipment_aliases_cache_version ON equipment_aliases;
+DROP TRIGGER IF EXISTS trg_equipment_aliases_cache_version_ins ON equipment_aliases;
+CREATE TRIGGER trg_equipment_aliases_cache_version_ins
+    AFTER INSERT ON equipment_aliases REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+DROP TRIGGER IF EXISTS trg_equipment_aliases_cache_version_upd ON equipment_aliases;
+CREATE TRIGGER trg_equipment_aliases_cache_version_upd
+    AFTER UPDATE ON equipment_aliases REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+DROP TRIGGER IF EXISTS trg_equipment_aliases_cache_version_del ON equipment_aliases;
+CREATE TRIGGER trg_equipment_aliases_cache_version_del
+    AFTER DELETE ON equipment_aliases REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+
+DROP TRIGGER IF EXISTS trg_equipment_locations_cache_version ON equipment_locations;
+DROP TRIGGER IF EXISTS trg_equipment_locations_cache_version_ins ON equipment_locations;
+CREATE TRIGGER trg_equipment_locations_cache_version_ins
+    AFTER INSERT ON equipment_locations REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+DROP TRIGGER IF EXISTS trg_equipment_locations_cache_version_upd ON equipment_locations;
+CREATE TRIGGER trg_equipment_locations_cache_version_upd
+    AFTER UPDATE ON equipment_locations REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+DROP TRIGGER IF EXISTS trg_equipment_locations_cache_version_del ON equipment_locations;
+CREATE TRIGGER trg_equipment_locations_cache_version_del
+    AFTER DELETE ON equipment_locations REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_equipment();
+
+DROP TRIGGER IF EXISTS trg_equipment_data_cache_version ON equipment_data;
+DROP TRIGGER IF EXISTS trg_equipment_data_cache_version_ins ON equipment_data;
+CREATE TRIGGER trg_equipment_data_cache_version_ins
+    AFTER INSERT ON equipment_data REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_supplementary_document();
+DROP TRIGGER IF EXISTS trg_equipment_data_cache_version_upd ON equipment_data;
+CREATE TRIGGER trg_equipment_data_cache_version_upd
+    AFTER UPDATE ON equipment_data REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_supplementary_document();
+DROP TRIGGER IF EXISTS trg_equipment_data_cache_version_del ON equipment_data;
+CREATE TRIGGER trg_equipment_data_cache_version_del
+    AFTER DELETE ON equipment_data REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION project_cache_version_via_supplementary_document();
+
+DROP FUNCTION IF EXISTS bump_project_cache_version(INTEGER);
@@ -0,0 +1,23 @@
+-- Migration: Trigram indexes for drawing page text search
+-- Purpose: Keyword search ILIKE '%kw%' over page OCR text, AI analysis and AI
+--          equipment list (plus document title / drawing number), and the
+--          text search's word-boundary regex (~*) over the page columns, were
+--          sequential scans of pages; pg_trgm GIN indexes serve both LIKE and
+--          regex matches whose literal part has 3+ characters
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_pages_ocr_trgm
+    ON pages USING gin (ocr_text gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_pages_ai_analysis_trgm
+    ON pages USING gin (ai_analysis gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_pages_ai_equipment_list_trgm
+    ON pages USING gin (ai_equipment_list gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_documents_title_trgm
+    ON documents USING gin (title gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_documents_drawing_number_trgm
+    ON documents USING gin (drawing_number gin_trgm_ops);
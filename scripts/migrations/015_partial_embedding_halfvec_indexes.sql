@@ -0,0 +1,26 @@
+-- Migration: Partial half-precision ANN indexes for page and chunk embeddings
+-- Purpose: Serve the page and supplementary chunk semantic searches from HNSW
+--          indexes instead of sequential scans. The graphs are built over a
+--          halfvec (FP16) expression, halving the bytes read per distance
+--          evaluation, while the embedding columns stay vector(384) (FP32)
+--          for scoring the results. The "embedding IS NOT NULL" predicate
+--          matches the semantic queries, so the planner uses the index without
+--          rechecking it and unprocessed pages never enter the index.
+-- Requires: pgvector >= 0.7 (halfvec)
+
+-- Queries must keep both the predicate and the ORDER BY expression:
+--   WHERE p.embedding IS NOT NULL
+--   ORDER BY p.embedding::halfvec(384) <=> CAST(:embedding AS halfvec(384))
+-- HNSW indexes do not support INCLUDE columns, so document_id/page_number
+-- are still read from the heap for each candidate.
+CREATE INDEX IF NOT EXISTS idx_pages_embedding_halfvec_nn
+    ON pages
+    USING hnsw ((embedding::halfvec(384)) halfvec_cosine_ops)
+    WITH (m = 16, ef_construction = 64)
+    WHERE embedding IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_supplementary_chunks_embedding_halfvec_nn
+    ON supplementary_chunks
+    USING hnsw ((embedding::halfvec(384)) halfvec_cosine_ops)
+    WITH (m = 16, ef_construction = 64)
+    WHERE embedding IS NOT NULL;
@@ -0,0 +1,12 @@
+-- Migration: Case-insensitive lookup indexes for detailed connection tags
+-- Purpose: Graph traversal and the search agents match
+--          upper(detailed_connections.source_tag / target_tag) against a tag;
+--          the plain b-tree indexes on the raw columns cannot serve those
+--          predicates, so each hop was a sequential scan. Same pattern as the
+--          equipment upper(tag) index (migration 008).
+
+CREATE INDEX IF NOT EXISTS idx_detailed_conn_upper_source
+    ON detailed_connections(upper(source_tag));
+
+CREATE INDEX IF NOT EXISTS idx_detailed_conn_upper_target
+    ON detailed_connections(upper(target_tag));
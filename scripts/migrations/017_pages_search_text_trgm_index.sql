@@ -0,0 +1,13 @@
+-- Migration: Combined trigram index for the equipment text search
+-- Purpose: The text search matched its word-boundary regex (~*) against
+--          ocr_text, ai_analysis and ai_equipment_list separately, i.e. a
+--          BitmapOr of three trigram index scans per tag. It now matches one
+--          newline-joined expression, served by a single GIN index.
+-- Requires: pg_trgm (migration 013)
+
+-- Queries must use this exact expression (PAGE_SEARCH_TEXT_SQL in
+-- app/models/database.py) for the planner to pick the index
+CREATE INDEX IF NOT EXISTS idx_pages_search_text_trgm
+    ON pages USING gin ((
+        coalesce(ocr_text, '') || E'\n' || coalesce(ai_analysis, '') || E'\n' || coalesce(ai_equipment_list, '')
+    ) gin_trgm_ops);
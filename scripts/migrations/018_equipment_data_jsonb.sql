@@ -0,0 +1,8 @@
+-- Migration: Store equipment_data.data_json as JSONB
+-- Purpose: The search agents and profile builder json.loads'ed data_json for
+--          every row they read. As JSONB the driver returns a dict directly.
+--          supplementary_chunks.equipment_tags stays TEXT: it backs the
+--          trigram index from 005 and the regex tag filters.
+
+ALTER TABLE equipment_data
+    ALTER COLUMN data_json TYPE JSONB USING data_json::jsonb;